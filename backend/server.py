@@ -1,26 +1,77 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument, UpdateMany, UpdateOne, monitoring
+import asyncio
+import bisect
+import contextlib
+import csv
 import os
+import random
+import re
+import time
+import gzip
+import json
+import hashlib
+import io
+import socket
+import tempfile
+from collections import OrderedDict
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter, ValidationError, create_model, model_serializer
+from typing import List, Optional, Set
+from functools import lru_cache, partial
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
 from jwt.exceptions import ExpiredSignatureError, PyJWTError
 from passlib.context import CryptContext
+from gridfs.errors import NoFile
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # optional, clients fall back to JSON
+    msgpack = None
+
+try:
+    import zstandard as zstd
+except ImportError:  # optional, archive blocks are stored uncompressed
+    zstd = None
+
+try:
+    import openpyxl
+except ImportError:  # optional, XLSX reports are unavailable
+    openpyxl = None
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+except ImportError:  # optional, PDF reports are unavailable
+    SimpleDocTemplate = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Analytics reads may go to secondaries lagging at most this far behind
+ANALYTICS_READ_PREFERENCE = os.environ.get('ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+ANALYTICS_MAX_STALENESS_SECONDS = int(os.environ.get('ANALYTICS_MAX_STALENESS_SECONDS', '90'))
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -28,6 +79,290 @@ security = HTTPBearer()
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'dims-secret-key-change-in-production')
 ALGORITHM = "HS256"
 
+# Bulk maintenance
+EMAIL_DOMAIN_CHUNK_SIZE = int(os.environ.get('EMAIL_DOMAIN_CHUNK_SIZE', '5000'))
+LOG_DELETE_CHUNK_SIZE = int(os.environ.get('LOG_DELETE_CHUNK_SIZE', '500'))
+
+# Response encoding
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+ENCODED_BODY_CACHE_SIZE = int(os.environ.get('ENCODED_BODY_CACHE_SIZE', '256'))
+
+# Cooperative stats
+STATS_WINDOW_DAYS = int(os.environ.get('STATS_WINDOW_DAYS', '30'))
+STATS_BASELINE_LOGS = int(os.environ.get('STATS_BASELINE_LOGS', '3'))
+STATS_CACHE_TTL_SECONDS = int(os.environ.get('STATS_CACHE_TTL_SECONDS', '300'))
+
+# Single-flight KPI results are reused for this long (0 only coalesces concurrent requests)
+KPI_RESULT_TTL_SECONDS = float(os.environ.get('KPI_RESULT_TTL_SECONDS', '2'))
+
+# Anomaly detection
+ANOMALY_Z_THRESHOLD = float(os.environ.get('ANOMALY_Z_THRESHOLD', '3.0'))
+ANOMALY_MIN_SAMPLES = int(os.environ.get('ANOMALY_MIN_SAMPLES', '5'))
+ANOMALY_EWMA_ALPHA = float(os.environ.get('ANOMALY_EWMA_ALPHA', '0.3'))
+ANOMALY_AUTO_NONCONFORMITY = os.environ.get('ANOMALY_AUTO_NONCONFORMITY', 'false').lower() in ('1', 'true', 'yes')
+
+# Forecasting
+FORECAST_SEASON_LENGTH = int(os.environ.get('FORECAST_SEASON_LENGTH', '4'))
+FORECAST_HISTORY = int(os.environ.get('FORECAST_HISTORY', '52'))
+FORECAST_MAX_PERIODS = int(os.environ.get('FORECAST_MAX_PERIODS', '26'))
+FORECAST_CACHE_TTL_SECONDS = int(os.environ.get('FORECAST_CACHE_TTL_SECONDS', '300'))
+
+# Log tiering
+LOG_HOT_DAYS = int(os.environ.get('LOG_HOT_DAYS', '365'))
+LOG_TIERING_CRON = os.environ.get('LOG_TIERING_CRON', '0 3 * * *')
+LOG_ARCHIVE_COMPRESSION = os.environ.get('LOG_ARCHIVE_COMPRESSION', 'zstd')  # "zstd" or "none"
+LOG_ARCHIVE_ZSTD_LEVEL = int(os.environ.get('LOG_ARCHIVE_ZSTD_LEVEL', '10'))
+
+# Columnar log store (in-process NumPy copy of the hot logs for analytics)
+COLUMNAR_STORE_ENABLED = os.environ.get('COLUMNAR_STORE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+COLUMNAR_STORE_MAX_BYTES = int(os.environ.get('COLUMNAR_STORE_MAX_MB', '256')) * 1024 * 1024
+COLUMNAR_STORE_CHANGE_STREAM = os.environ.get('COLUMNAR_STORE_CHANGE_STREAM', 'true').lower() in ('1', 'true', 'yes')
+
+# Delta sync
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', '500'))
+SYNC_MAX_UPLOAD = int(os.environ.get('SYNC_MAX_UPLOAD', '500'))
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', '2'))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', '30'))
+SYNC_TOMBSTONE_PURGE_CRON = os.environ.get('SYNC_TOMBSTONE_PURGE_CRON', '15 3 * * *')
+
+# Admission control: RATE_LIMITS is "role:tokens_per_second/burst,..." and
+# ROUTE_CONCURRENCY_LIMITS is "/api/path:max_concurrent,..."
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMITS_SPEC = os.environ.get('RATE_LIMITS', 'officer:20/60,manager:10/40,farmer:5/20,anonymous:2/10,auth:5/20')
+# Behind a reverse proxy every connection comes from the proxy; name the header
+# it records the client address in (e.g. X-Forwarded-For) and how many proxies
+# append to it, so anonymous callers are told apart by their own address
+ADMISSION_CLIENT_IP_HEADER = os.environ.get('ADMISSION_CLIENT_IP_HEADER', '')
+ADMISSION_TRUSTED_PROXIES = int(os.environ.get('ADMISSION_TRUSTED_PROXIES', '1'))
+ROUTE_CONCURRENCY_LIMITS = os.environ.get(
+    'ROUTE_CONCURRENCY_LIMITS',
+    '/api/kpis/overview:4,/api/reinit-data:1,/api/anomalies/backfill:1,/api/benchmarks/rebuild:1,'
+    '/api/production-logs/bulk-delete:2,/api/update-email-domains:1,/api/forecast:8,/api/users/bulk:1'
+)
+ROUTE_QUEUE_DEPTH = int(os.environ.get('ROUTE_QUEUE_DEPTH', '8'))
+ROUTE_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('ROUTE_QUEUE_TIMEOUT_SECONDS', '2'))
+MAX_IN_FLIGHT_REQUESTS = int(os.environ.get('MAX_IN_FLIGHT_REQUESTS', '512'))
+SHED_RETRY_AFTER_SECONDS = int(os.environ.get('SHED_RETRY_AFTER_SECONDS', '1'))
+ROLE_CACHE_TTL_SECONDS = int(os.environ.get('ROLE_CACHE_TTL_SECONDS', '60'))
+ADMISSION_TRACKED_KEYS = int(os.environ.get('ADMISSION_TRACKED_KEYS', '10000'))
+
+# User provisioning
+BULK_USER_MAX_ROWS = int(os.environ.get('BULK_USER_MAX_ROWS', '1000'))
+
+# Peer benchmarking
+PEER_BENCHMARK_INTERVAL_SECONDS = int(os.environ.get('PEER_BENCHMARK_INTERVAL_SECONDS', '3600'))
+
+# Resolution metrics (nonconformity time-to-close SLAs)
+RESOLUTION_SLA_DAYS = os.environ.get('RESOLUTION_SLA_DAYS', 'critical:2,high:7,medium:14,low:30')
+RESOLUTION_METRICS_CRON = os.environ.get('RESOLUTION_METRICS_CRON', '45 2 * * *')
+RESOLUTION_JOURNAL_TTL_SECONDS = int(os.environ.get('RESOLUTION_JOURNAL_TTL_SECONDS', '86400'))
+
+# Job scheduler
+JOBS_ENABLED = os.environ.get('JOBS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '300'))
+JOB_MAX_SLEEP_SECONDS = float(os.environ.get('JOB_MAX_SLEEP_SECONDS', '60'))
+JOB_PROCESS_POOL_WORKERS = int(os.environ.get('JOB_PROCESS_POOL_WORKERS', '2'))
+ANOMALY_BACKFILL_CRON = os.environ.get('ANOMALY_BACKFILL_CRON', '30 2 * * *')
+ANOMALY_POOL_MIN_LOGS = int(os.environ.get('ANOMALY_POOL_MIN_LOGS', '50000'))
+
+# Reports
+REPORT_CURSOR_BATCH_SIZE = int(os.environ.get('REPORT_CURSOR_BATCH_SIZE', '1000'))
+REPORT_STALE_SECONDS = int(os.environ.get('REPORT_STALE_SECONDS', '600'))
+REPORT_STAGING_DIR = os.environ.get('REPORT_STAGING_DIR') or None  # system temp dir by default
+
+# Request tracing (spans are written as OpenTelemetry-shaped JSON lines)
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', '1.0'))
+TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'file')  # "file" or "console"
+TRACING_FILE = os.environ.get('TRACING_FILE', str(ROOT_DIR / 'traces.jsonl'))
+TRACING_MAX_SPANS = int(os.environ.get('TRACING_MAX_SPANS', '1000'))
+
+# ============= TRACING =============
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+tracing_logger = logging.getLogger("dims.tracing")
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_untraced = contextlib.nullcontext()
+
+class Trace:
+    """The finished child spans of one sampled request, exported together with its root span"""
+    
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.root = None
+        self.spans = []
+        self.dropped = 0
+
+class Span:
+    """
+    A timed operation in a trace; also a context manager that makes itself
+    the current span, so spans opened inside it become its children.
+    """
+    __slots__ = ("trace", "name", "span_id", "parent_id", "attributes", "start_ns", "end_ns", "error", "_token")
+    
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+    
+    def child(self, name: str, attributes: dict) -> "Span":
+        return Span(self.trace, name, self.span_id, attributes)
+    
+    def end(self, error: Optional[str] = None, end_ns: Optional[int] = None):
+        self.end_ns = end_ns or time.time_ns()
+        if error is not None:
+            self.error = error
+        if self is self.trace.root:
+            return
+        if len(self.trace.spans) < TRACING_MAX_SPANS:
+            self.trace.spans.append(self)
+        else:
+            self.trace.dropped += 1
+    
+    def __enter__(self) -> "Span":
+        self._token = current_span.set(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        current_span.reset(self._token)
+        self.end(error=repr(exc) if exc is not None else None)
+    
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "UNSET"},
+        }
+
+def trace_span(name: str, **attributes):
+    """Child span of the current one; a no-op context when the request is not being traced"""
+    parent = current_span.get()
+    if parent is None:
+        return _untraced
+    return parent.child(name, attributes)
+
+def start_trace(name: str, traceparent: Optional[str], attributes: dict) -> Optional[Span]:
+    """
+    Root span for a request, or None when it is not sampled.
+    
+    A valid W3C `traceparent` header continues the caller's trace and follows
+    its sampling decision; otherwise TRACING_SAMPLE_RATE decides.
+    """
+    match = TRACEPARENT_RE.match(traceparent or "")
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        if not int(flags, 16) & 1:
+            return None
+        trace = Trace(trace_id)
+    elif random.random() < TRACING_SAMPLE_RATE:
+        trace, parent_id = Trace(), None
+    else:
+        return None
+    trace.root = Span(trace, name, parent_id, attributes)
+    return trace.root
+
+def export_trace(root: Span):
+    """Write a finished request's spans, root last, to the configured exporter"""
+    trace = root.trace
+    spans = [span.to_dict() for span in trace.spans] + [root.to_dict()]
+    if trace.dropped:
+        spans[-1]["attributes"]["dims.dropped_spans"] = trace.dropped
+    try:
+        if TRACING_EXPORTER == "console":
+            tracing_logger.info(
+                "trace %s %s %.1fms%s", trace.trace_id, root.name, spans[-1]["duration_ms"],
+                "".join(f"\n  {span['duration_ms']:9.3f}ms  {span['name']}" for span in spans[:-1])
+            )
+        else:
+            with open(TRACING_FILE, "a") as trace_file:
+                trace_file.write("".join(json.dumps(span, default=str) + "\n" for span in spans))
+    except OSError as exc:
+        tracing_logger.warning("Could not export trace %s: %s", trace.trace_id, exc)
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """
+    One span per MongoDB command, parented to the span that issued it.
+    
+    Motor runs commands on executor threads with a copy of the caller's
+    context, so current_span still names the issuing span here.
+    """
+    
+    def __init__(self):
+        self._in_flight = {}
+    
+    def started(self, event):
+        parent = current_span.get()
+        if parent is None:
+            return
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else event.command.get("collection")
+        host, port = event.connection_id
+        self._in_flight[(event.request_id, event.connection_id)] = parent.child(f"mongodb.{event.command_name}", {
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "db.mongodb.collection": collection,
+            "net.peer.name": host,
+            "net.peer.port": port,
+        })
+    
+    def _finish(self, event, error=None):
+        span = self._in_flight.pop((event.request_id, event.connection_id), None)
+        if span is not None:
+            span.end(error=error, end_ns=span.start_ns + event.duration_micros * 1000)
+    
+    def succeeded(self, event):
+        self._finish(event)
+    
+    def failed(self, event):
+        self._finish(event, error=str(event.failure.get("errmsg", event.failure)))
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """
+    Root span for each sampled request, named after the matched route
+    template. It ends once the response headers are ready, so a streamed
+    body is not included; the trace id is returned in X-Trace-Id.
+    """
+    
+    async def dispatch(self, request, call_next):
+        root = start_trace(f"{request.method} {request.url.path}", request.headers.get('traceparent'), {
+            "http.method": request.method,
+            "http.target": request.url.path,
+        })
+        if root is None:
+            return await call_next(request)
+        try:
+            with root:
+                response = await call_next(request)
+                route = request.scope.get('route')
+                if route is not None:
+                    root.name = f"{request.method} {route.path}"
+                    root.attributes["http.route"] = route.path
+                root.attributes["http.status_code"] = response.status_code
+                if response.status_code >= 500:
+                    root.error = f"HTTP {response.status_code}"
+        finally:
+            export_trace(root)
+        response.headers['X-Trace-Id'] = root.trace.trace_id
+        return response
+
+# MongoDB connection
+mongo_url = os.environ['MONGO_URL']
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandTracer()] if TRACING_ENABLED else [])
+db = client[os.environ['DB_NAME']]
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -83,6 +418,7 @@ class ProductionLog(BaseModel):
     has_nonconformity: bool
     nonconformity_description: Optional[str] = None
     corrective_action: Optional[str] = None
+    anomaly_flags: List[str] = Field(default_factory=list)  # set by the server
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Nonconformity(BaseModel):
@@ -119,10 +455,16 @@ class ScenarioResponse(BaseModel):
 # ============= HELPER FUNCTIONS =============
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    with trace_span("bcrypt.hash"):
+        return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with trace_span("bcrypt.verify"):
+        return pwd_context.verify(plain_password, hashed_password)
+
+def user_search_fields(email: str, name: str) -> dict:
+    """Lowercased copies of email and name, indexed for case-insensitive prefix search"""
+    return {"email_lower": email.lower(), "name_lower": name.lower()}
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -149,6 +491,188 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except Exception:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+def production_log_write_filter(log_id: str, current_user: dict) -> dict:
+    """Filter matching a production log the current user is allowed to modify"""
+    log_filter = {"id": log_id}
+    if current_user['role'] == 'manager':
+        log_filter['cooperative_id'] = current_user.get('cooperative_id')
+    return log_filter
+
+def parse_fields(fields: Optional[str], model: type) -> Optional[Set[str]]:
+    """Parse a comma-separated ?fields= value into the set of model fields to return"""
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add('id')
+    return requested
+
+def fields_projection(fields: Set[str], *stored_fields: str) -> dict:
+    """Mongo projection reading only the requested fields (plus any they are derived from)"""
+    projection = {"_id": 0}
+    for name in (*fields, *stored_fields):
+        projection[name] = 1
+    return projection
+
+@lru_cache(maxsize=256)
+def sparse_list_adapter(model: type, fields: frozenset) -> TypeAdapter:
+    """List adapter for a copy of `model` that declares only `fields`"""
+    sparse_model = create_model(
+        f"{model.__name__}Fields",
+        __config__=ConfigDict(extra="ignore"),
+        **{name: (info.annotation, info) for name, info in model.model_fields.items() if name in fields}
+    )
+    return TypeAdapter(List[sparse_model])
+
+def sparse_response(docs: List[dict], model: type, fields: Set[str]) -> Response:
+    """Validate and serialise documents against only the requested fields"""
+    adapter = sparse_list_adapter(model, frozenset(fields))
+    with trace_span("pydantic.validate", model=model.__name__, count=len(docs)):
+        items = adapter.validate_python(docs)
+    with trace_span("pydantic.serialize", model=model.__name__, count=len(docs)):
+        return Response(content=adapter.dump_json(items), media_type="application/json")
+
+def to_utc_iso(value: datetime) -> str:
+    """Serialise a datetime the way stored dates are written, for range queries"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+_transactions_supported: Optional[bool] = None
+
+async def supports_transactions() -> bool:
+    """Whether the connected deployment is a replica set (or sharded) and can run transactions"""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions_supported = False
+    return _transactions_supported
+
+# ----- Delta sync bookkeeping -----
+# Every write to a synced collection takes the next value of one global
+# sequence; deletions leave a tombstone carrying their own sequence number.
+
+SYNC_COLLECTIONS = ("cooperatives", "production_logs", "nonconformities")
+
+def new_sync_epoch() -> str:
+    return uuid.uuid4().hex[:12]
+
+async def next_sync_seq(count: int = 1) -> int:
+    """Reserve `count` sequence numbers and return the last one"""
+    state = await db.counters.find_one_and_update(
+        {"_id": "sync"},
+        {"$inc": {"seq": count}, "$setOnInsert": {"epoch": new_sync_epoch(), "purged_through": 0}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return state['seq']
+
+async def sync_stamp() -> dict:
+    return {"updated_seq": await next_sync_seq(), "updated_at": datetime.now(timezone.utc).isoformat()}
+
+async def record_sync_deletions(collection: str, docs: List[dict], session=None):
+    if not docs:
+        return
+    last = await next_sync_seq(len(docs))
+    deleted_at = datetime.now(timezone.utc).isoformat()
+    await db.sync_tombstones.insert_many([
+        {
+            "collection": collection,
+            "id": doc['id'],
+            "cooperative_id": doc.get('cooperative_id'),
+            "updated_seq": last - len(docs) + 1 + i,
+            "updated_at": deleted_at
+        }
+        for i, doc in enumerate(docs)
+    ], session=session)
+
+async def delete_synced(collection: str, query: dict, session=None) -> int:
+    """delete_many that leaves tombstones for syncing clients"""
+    projection = {"_id": 0, "id": 1, "cooperative_id": 1}
+    if collection == "nonconformities":
+        projection.update(RESOLUTION_PROJECTION)
+    docs = await db[collection].find(query, projection, session=session).to_list(None)
+    if not docs:
+        return 0
+    result = await db[collection].delete_many({"id": {"$in": [doc['id'] for doc in docs]}}, session=session)
+    await record_sync_deletions(collection, docs, session=session)
+    if collection == "nonconformities":
+        await record_resolution_changes([(doc, None) for doc in docs], session=session)
+    return result.deleted_count
+
+async def stamp_missing_sync_seq() -> int:
+    """Give documents written without a sequence (seed data, older releases) one"""
+    stamped = 0
+    for collection in SYNC_COLLECTIONS:
+        while True:
+            docs = await db[collection].find(
+                {"updated_seq": {"$exists": False}}, {"_id": 1}
+            ).limit(LOG_DELETE_CHUNK_SIZE).to_list(LOG_DELETE_CHUNK_SIZE)
+            if not docs:
+                break
+            last = await next_sync_seq(len(docs))
+            updated_at = datetime.now(timezone.utc).isoformat()
+            await db[collection].bulk_write([
+                UpdateOne({"_id": doc['_id']}, {"$set": {"updated_seq": last - len(docs) + 1 + i, "updated_at": updated_at}})
+                for i, doc in enumerate(docs)
+            ])
+            stamped += len(docs)
+    return stamped
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def check_read_preference(mode: str) -> str:
+    """Reject an unknown ANALYTICS_READ_PREFERENCE at startup rather than on every analytics request"""
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"ANALYTICS_READ_PREFERENCE must be one of: {', '.join(READ_PREFERENCES)} (got {mode!r})")
+    return mode
+
+ANALYTICS_READ_PREFERENCE = check_read_preference(ANALYTICS_READ_PREFERENCE)
+
+# Set per request from the X-Read-Preference header, for debugging
+read_preference_override: ContextVar[Optional[str]] = ContextVar("read_preference_override", default=None)
+
+def analytics_read_mode() -> str:
+    return read_preference_override.get() or ANALYTICS_READ_PREFERENCE
+
+def analytics_db():
+    """
+    Handle for heavy read-only aggregations that tolerate bounded staleness.
+    
+    Auth, writes, read-after-write paths and anything cached until the next
+    write keep using `db`, which always reads from the primary.
+    """
+    mode = analytics_read_mode()
+    if mode == "primary":
+        return db.with_options(read_preference=Primary())
+    return db.with_options(read_preference=READ_PREFERENCES[mode](max_staleness=ANALYTICS_MAX_STALENESS_SECONDS))
+
+async def raise_production_log_write_error(log_id: str, forbidden_detail: str, archived_detail: Optional[str] = None):
+    """
+    Explain why a permission-filtered write on a production log matched nothing.
+    
+    Archived logs exist too: pass `archived_detail` for writes that cannot
+    apply to them at all, otherwise they are reported as forbidden.
+    """
+    if await db.production_logs.count_documents({"id": log_id}, limit=1):
+        raise HTTPException(status_code=403, detail=forbidden_detail)
+    if await db.production_log_archive.count_documents({"log_ids": log_id}, limit=1):
+        if archived_detail:
+            raise HTTPException(status_code=409, detail=archived_detail)
+        raise HTTPException(status_code=403, detail=forbidden_detail)
+    raise HTTPException(status_code=404, detail="Production log not found")
+
 # ============= AUTHENTICATION ROUTES =============
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -167,8 +691,14 @@ async def register(user_data: UserRegister):
     user_doc = user.model_dump()
     user_doc['timestamp'] = user_doc['created_at'].isoformat()
     user_doc['password'] = hash_password(user_data.password)
+    user_doc.update(user_search_fields(user.email, user.name))
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Registered concurrently since the check above
+        raise HTTPException(status_code=400, detail="Email already registered")
+    invalidate_cooperative_stats(user.cooperative_id)
     
     access_token = create_access_token(data={"sub": user.id, "email": user.email})
     
@@ -201,18 +731,90 @@ async def login(credentials: UserLogin):
 
 # ============= USER MANAGEMENT ROUTES =============
 
+async def stamp_missing_user_search_fields() -> int:
+    """Fill email_lower/name_lower on users written before they existed"""
+    result = await db.users.update_many(
+        {"$or": [{"email_lower": {"$exists": False}}, {"name_lower": {"$exists": False}}]},
+        [{"$set": {"email_lower": {"$toLower": "$email"}, "name_lower": {"$toLower": "$name"}}}]
+    )
+    return result.modified_count
+
+def parse_user_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """"<name_lower>:<id>" of the last user on the previous page"""
+    if not cursor:
+        return None
+    name_lower, _, user_id = cursor.rpartition(':')
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return name_lower, user_id
+
 @api_router.get("/users", response_model=List[User])
-async def get_users(current_user: dict = Depends(get_current_user)):
-    """Get all users (officer only)"""
+async def get_users(
+    response: Response,
+    role: Optional[str] = None,
+    cooperative_id: Optional[str] = None,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get users (officer only), ordered by name, one keyset page at a time.
+    
+    `q` is a case-insensitive prefix of the name, or of the email when it
+    contains "@", matched as an anchored regex on the lowercased
+    name_lower/email_lower fields. A name prefix is a range of the
+    (name_lower, id) indexes the page is sorted on, so rare prefixes read only
+    their matches; an email prefix narrows to a handful of users on email_lower
+    that are then sorted. When more users match, the cursor for the next page
+    is returned in X-Next-Cursor.
+    """
     if current_user['role'] != 'officer':
         raise HTTPException(status_code=403, detail="Only officers can view all users")
     
-    users = await db.users.find({}, {"_id": 0, "password": 0, "hashed_password": 0}).to_list(1000)
+    limit = max(1, min(limit, 1000))
+    clauses = []
+    if role:
+        clauses.append({"role": role})
+    if cooperative_id:
+        clauses.append({"cooperative_id": cooperative_id})
+    if q and q.strip():
+        prefix = {"$regex": f"^{re.escape(q.strip().lower())}"}
+        clauses.append({"email_lower" if "@" in q else "name_lower": prefix})
+    after = parse_user_cursor(cursor)
+    if after:
+        name_lower, user_id = after
+        clauses.append({"$or": [
+            {"name_lower": {"$gt": name_lower}},
+            {"name_lower": name_lower, "id": {"$gt": user_id}}
+        ]})
+    query = clauses[0] if len(clauses) == 1 else {"$and": clauses} if clauses else {}
+    
+    selected = parse_fields(fields, User)
+    if selected is None:
+        projection = {"_id": 0, "password": 0, "hashed_password": 0, "email_lower": 0}
+    else:
+        # created_at is derived from the stored timestamp; name_lower feeds the cursor
+        projection = fields_projection(selected, 'name_lower', *(['timestamp'] if 'created_at' in selected else []))
+    
+    users = await db.users.find(query, projection).sort([("name_lower", 1), ("id", 1)]).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = f"{users[-1].get('name_lower', '')}:{users[-1]['id']}"
     for user in users:
         if isinstance(user.get('timestamp'), str):
             user['created_at'] = datetime.fromisoformat(user['timestamp'])
-        elif not user.get('created_at'):
+        elif not user.get('created_at') and (selected is None or 'created_at' in selected):
             user['created_at'] = datetime.now(timezone.utc)
+    
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if selected is not None:
+        sparse = sparse_response(users, User, selected)
+        sparse.headers.update(headers)
+        return sparse
+    response.headers.update(headers)
     return users
 
 @api_router.put("/users/{user_id}", response_model=User)
@@ -228,12 +830,15 @@ async def update_user(
     update_data = {}
     if 'name' in user_data:
         update_data['name'] = user_data['name']
+        update_data['name_lower'] = user_data['name'].lower()
     if 'email' in user_data:
-        # Check if email already exists for a different user
+        # The unique email index is the authority; this check only avoids a
+        # failed write in the common case
         existing = await db.users.find_one({"email": user_data['email'], "id": {"$ne": user_id}})
         if existing:
             raise HTTPException(status_code=400, detail="Email already in use")
         update_data['email'] = user_data['email']
+        update_data['email_lower'] = user_data['email'].lower()
     if 'role' in user_data:
         update_data['role'] = user_data['role']
     if 'cooperative_id' in user_data:
@@ -244,16 +849,24 @@ async def update_user(
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided")
     
-    result = await db.users.update_one(
-        {"id": user_id},
-        {"$set": update_data}
-    )
+    # Apply the update and fetch the result in a single round trip
+    try:
+        updated_user = await db.users.find_one_and_update(
+            {"id": user_id},
+            {"$set": update_data},
+            projection={"_id": 0, "password": 0, "hashed_password": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another user took the address after the check above
+        raise HTTPException(status_code=400, detail="Email already in use")
     
-    if result.matched_count == 0:
+    if updated_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Fetch and return updated user
-    updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0, "hashed_password": 0})
+    # Role or cooperative may have moved, which changes farmer counts
+    invalidate_cooperative_stats()
+    
     if isinstance(updated_user.get('timestamp'), str):
         updated_user['created_at'] = datetime.fromisoformat(updated_user['timestamp'])
     return User(**updated_user)
@@ -276,8 +889,122 @@ async def delete_user(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    invalidate_cooperative_stats()
+    
     return {"message": "User deleted successfully"}
 
+USER_ROLES = ("officer", "manager", "farmer")
+BULK_USER_CSV_COLUMNS = ("email", "name", "role", "cooperative_id", "password")
+
+class BulkUserRequest(BaseModel):
+    users: List[dict] = Field(default_factory=list)
+    csv: Optional[str] = None  # header row with BULK_USER_CSV_COLUMNS, in any order
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    return [hash_password(password) for password in passwords]
+
+def parse_bulk_user_csv(text: str) -> List[dict]:
+    reader = csv.DictReader(io.StringIO(text.strip()))
+    missing = {"email", "name", "role", "password"} - set(reader.fieldnames or ())
+    if missing:
+        raise HTTPException(status_code=400, detail=f"CSV is missing columns: {', '.join(sorted(missing))}")
+    return [
+        {column: (row.get(column) or "").strip() or None for column in BULK_USER_CSV_COLUMNS}
+        for row in reader
+    ]
+
+@api_router.post("/users/bulk")
+async def bulk_create_users(
+    request: BulkUserRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Create many users at once (officer only), from a JSON list and/or CSV text.
+    
+    Rows are validated individually; emails that already exist, appear
+    earlier in the same upload or are registered concurrently (caught by the
+    unique email index) are reported as duplicates. Passwords are hashed in parallel
+    on the process pool, existing emails are found with one query and all new
+    users are written with one insert_many.
+    """
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can create users in bulk")
+    
+    rows = list(request.users) + (parse_bulk_user_csv(request.csv) if request.csv else [])
+    if not rows:
+        raise HTTPException(status_code=400, detail="No users provided")
+    if len(rows) > BULK_USER_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_USER_MAX_ROWS} users per request")
+    
+    results = []
+    valid = []
+    with trace_span("pydantic.validate", model="UserRegister", count=len(rows)):
+        for index, row in enumerate(rows):
+            try:
+                user_data = UserRegister(**{key: value for key, value in row.items() if value is not None})
+            except ValidationError as exc:
+                error = exc.errors()[0]
+                detail = f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                results.append({"row": index, "email": row.get('email'), "status": "invalid", "detail": detail})
+                continue
+            if user_data.role not in USER_ROLES:
+                results.append({"row": index, "email": user_data.email, "status": "invalid",
+                                "detail": f"role must be one of: {', '.join(USER_ROLES)}"})
+                continue
+            results.append({"row": index, "email": user_data.email, "status": "pending"})
+            valid.append((results[-1], user_data))
+    
+    emails = [user_data.email for _, user_data in valid]
+    existing = set(await db.users.distinct("email", {"email": {"$in": emails}})) if emails else set()
+    seen = set()
+    to_create = []
+    for result, user_data in valid:
+        if user_data.email in existing:
+            result.update(status="duplicate", detail="Email already registered")
+        elif user_data.email in seen:
+            result.update(status="duplicate", detail="Email appears earlier in this upload")
+        else:
+            seen.add(user_data.email)
+            to_create.append((result, user_data))
+    
+    if to_create:
+        # One pool task per worker keeps the pickling overhead per batch, not per password
+        passwords = [user_data.password for _, user_data in to_create]
+        chunk = -(-len(passwords) // JOB_PROCESS_POOL_WORKERS)
+        with trace_span("bcrypt.hash_batch", count=len(passwords), chunks=-(-len(passwords) // chunk)):
+            hashed = [
+                password_hash
+                for chunk_hashes in await asyncio.gather(*(
+                    job_scheduler.run_in_process_pool(hash_passwords, passwords[start:start + chunk])
+                    for start in range(0, len(passwords), chunk)
+                ))
+                for password_hash in chunk_hashes
+            ]
+        
+        user_docs = []
+        for (result, user_data), password_hash in zip(to_create, hashed):
+            user = User(email=user_data.email, name=user_data.name, role=user_data.role, cooperative_id=user_data.cooperative_id)
+            user_doc = user.model_dump()
+            user_doc['timestamp'] = user_doc['created_at'].isoformat()
+            user_doc['password'] = password_hash
+            user_doc.update(user_search_fields(user.email, user.name))
+            user_docs.append(user_doc)
+            result.update(status="created", id=user.id)
+        try:
+            await db.users.insert_many(user_docs, ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get('writeErrors', [])
+            if any(error['code'] != 11000 for error in errors):
+                raise
+            # Unordered, so every other row was still written
+            for error in errors:
+                to_create[error['index']][0].update(status="duplicate", detail="Email already registered")
+                to_create[error['index']][0].pop('id', None)
+        invalidate_cooperative_stats()
+    
+    summary = {status: sum(result['status'] == status for result in results) for status in ("created", "duplicate", "invalid")}
+    return {**summary, "results": results}
+
 @api_router.get("/auth/me", response_model=User)
 async def get_me(current_user: dict = Depends(get_current_user)):
     if isinstance(current_user.get('timestamp'), str):
@@ -287,11 +1014,20 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 # ============= COOPERATIVE ROUTES =============
 
 @api_router.get("/cooperatives", response_model=List[Cooperative])
-async def get_cooperatives(current_user: dict = Depends(get_current_user)):
-    cooperatives = await db.cooperatives.find({}, {"_id": 0}).to_list(1000)
+async def get_cooperatives(
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    selected = parse_fields(fields, Cooperative)
+    projection = {"_id": 0} if selected is None else fields_projection(selected)
+    
+    cooperatives = await db.cooperatives.find({}, projection).to_list(1000)
     for coop in cooperatives:
         if isinstance(coop.get('created_at'), str):
             coop['created_at'] = datetime.fromisoformat(coop['created_at'])
+    
+    if selected is not None:
+        return sparse_response(cooperatives, Cooperative, selected)
     return cooperatives
 
 @api_router.get("/cooperatives/{coop_id}", response_model=Cooperative)
@@ -307,14 +1043,322 @@ async def get_cooperative(coop_id: str, current_user: dict = Depends(get_current
 async def create_cooperative(coop: Cooperative, current_user: dict = Depends(get_current_user)):
     coop_doc = coop.model_dump()
     coop_doc['created_at'] = coop_doc['created_at'].isoformat()
+    coop_doc.update(await sync_stamp())
     await db.cooperatives.insert_one(coop_doc)
     return coop
 
+# ============= ANOMALY DETECTION =============
+
+# Metrics watched for bad batches, with the direction that is bad:
+# +1 means a spike is bad, -1 means a collapse is bad
+ANOMALY_METRICS = {
+    "post_harvest_loss_percent": 1,
+    "grade_a_percent": -1,
+}
+
+def empty_metric_state() -> dict:
+    return {"n": 0, "mean": 0.0, "m2": 0.0, "ewma": None, "ewm_var": 0.0}
+
+def metric_state_add(state: dict, x: float) -> dict:
+    """Welford mean/variance and EWMA update for one new observation"""
+    n = state['n'] + 1
+    delta = x - state['mean']
+    mean = state['mean'] + delta / n
+    m2 = state['m2'] + delta * (x - mean)
+    if state['ewma'] is None:
+        ewma, ewm_var = x, 0.0
+    else:
+        ewma_delta = x - state['ewma']
+        ewma = state['ewma'] + ANOMALY_EWMA_ALPHA * ewma_delta
+        ewm_var = (1 - ANOMALY_EWMA_ALPHA) * (state['ewm_var'] + ANOMALY_EWMA_ALPHA * ewma_delta * ewma_delta)
+    return {"n": n, "mean": mean, "m2": m2, "ewma": ewma, "ewm_var": ewm_var}
+
+def metric_state_remove(state: dict, x: float) -> dict:
+    """Inverse Welford update; the EWMA cannot forget and is left as is"""
+    n = state['n'] - 1
+    if n <= 0:
+        return {**state, "n": 0, "mean": 0.0, "m2": 0.0}
+    mean = (state['n'] * state['mean'] - x) / n
+    m2 = max(state['m2'] - (x - mean) * (x - state['mean']), 0.0)
+    return {**state, "n": n, "mean": mean, "m2": m2}
+
+def metric_z_scores(state: dict, x: float) -> dict:
+    """z-scores of x against the long-run mean and the EWMA"""
+    z = ewma_z = None
+    if state['n'] >= 2 and state['m2'] > 0:
+        z = (x - state['mean']) / (state['m2'] / (state['n'] - 1)) ** 0.5
+    if state['ewma'] is not None and state['ewm_var'] > 0:
+        ewma_z = (x - state['ewma']) / state['ewm_var'] ** 0.5
+    return {"z": z, "ewma_z": ewma_z}
+
+def anomaly_flags_for(states: dict, values: dict) -> tuple:
+    """Score new metric values against the prior state; returns (flags, scores)"""
+    flags = []
+    scores = {}
+    for metric, direction in ANOMALY_METRICS.items():
+        if values.get(metric) is None:
+            continue
+        state = states.get(metric) or empty_metric_state()
+        scores[metric] = metric_z_scores(state, values[metric])
+        if state['n'] < ANOMALY_MIN_SAMPLES:
+            continue
+        if any(
+            score is not None and score * direction >= ANOMALY_Z_THRESHOLD
+            for score in scores[metric].values()
+        ):
+            flags.append(metric)
+    return flags, scores
+
+async def record_anomaly_observation(coop_id: str, new_values: dict, old_values: Optional[dict] = None) -> tuple:
+    """Fold a new (or edited) log's metrics into the cooperative's streaming state.
+
+    O(1) per call: one read and one compare-and-set write of the
+    cooperative's `production_stats` document, retried on conflict.
+    """
+    for _ in range(5):
+        doc = await db.production_stats.find_one({"cooperative_id": coop_id}, {"_id": 0})
+        states = dict((doc or {}).get('metrics', {}))
+        
+        if old_values:
+            for metric in ANOMALY_METRICS:
+                if old_values.get(metric) is not None and metric in states:
+                    states[metric] = metric_state_remove(states[metric], old_values[metric])
+        
+        flags, scores = anomaly_flags_for(states, new_values)
+        
+        for metric in ANOMALY_METRICS:
+            if new_values.get(metric) is not None:
+                states[metric] = metric_state_add(states.get(metric) or empty_metric_state(), new_values[metric])
+        
+        version = (doc or {}).get('version', 0)
+        try:
+            result = await db.production_stats.update_one(
+                {"cooperative_id": coop_id, "version": version if doc else {"$exists": False}},
+                {"$set": {"metrics": states, "version": version + 1}},
+                upsert=doc is None
+            )
+        except DuplicateKeyError:
+            continue
+        if result.matched_count or result.upserted_id is not None:
+            return flags, scores
+    
+    logger.warning("Gave up updating anomaly state for cooperative %s after repeated conflicts", coop_id)
+    return [], {}
+
+async def forget_anomaly_observation(coop_id: str, old_values: dict):
+    """Remove a deleted log's metrics from the cooperative's long-run state, retried on conflict"""
+    for _ in range(5):
+        doc = await db.production_stats.find_one({"cooperative_id": coop_id}, {"_id": 0})
+        if not doc:
+            return
+        states = dict(doc['metrics'])
+        for metric in ANOMALY_METRICS:
+            if old_values.get(metric) is not None and metric in states:
+                states[metric] = metric_state_remove(states[metric], old_values[metric])
+        result = await db.production_stats.update_one(
+            {"cooperative_id": coop_id, "version": doc['version']},
+            {"$set": {"metrics": states, "version": doc['version'] + 1}}
+        )
+        if result.matched_count:
+            return
+    
+    logger.warning("Gave up updating anomaly state for cooperative %s after repeated conflicts", coop_id)
+
+async def refresh_anomaly_ewma(coop_id: str):
+    """Recompute the cooperative's EWMA after a past log was edited or deleted.
+
+    The incremental path can only append, so edits and deletes would leave the
+    EWMA following a history that no longer exists. Only the last
+    ewma_window() logs carry weight, so at most that many are read; when the
+    hot tier holds fewer and months are archived, the full backfill runs instead.
+    """
+    window = ewma_window()
+    projection = {"_id": 0, "created_at": 1, **{metric: 1 for metric in ANOMALY_METRICS}}
+    logs = await db.production_logs.find({"cooperative_id": coop_id}, projection).sort("created_at", -1).limit(window).to_list(window)
+    if len(logs) < window and await db.production_log_archive.count_documents({"cooperative_id": coop_id}, limit=1):
+        await backfill_anomaly_state(coop_id)
+        return
+    logs.reverse()
+    
+    recent = {}
+    for metric in ANOMALY_METRICS:
+        values = np.array([float(log.get(metric) or 0) for log in logs])
+        recent[metric] = compute_metric_states(values, np.zeros(len(logs), dtype=np.int64), 1)[0]
+    
+    for _ in range(5):
+        doc = await db.production_stats.find_one({"cooperative_id": coop_id}, {"_id": 0})
+        if not doc:
+            return
+        states = {
+            metric: {**state, "ewma": recent[metric]['ewma'], "ewm_var": recent[metric]['ewm_var']}
+            if metric in recent else state
+            for metric, state in doc['metrics'].items()
+        }
+        result = await db.production_stats.update_one(
+            {"cooperative_id": coop_id, "version": doc['version']},
+            {"$set": {"metrics": states, "version": doc['version'] + 1}}
+        )
+        if result.matched_count:
+            return
+    
+    logger.warning("Gave up updating anomaly state for cooperative %s after repeated conflicts", coop_id)
+
+async def open_anomaly_nonconformity(log: dict, flags: List[str], scores: dict):
+    """Auto-open a quality issue for a flagged batch"""
+    details = ", ".join(
+        f"{metric.replace('_', ' ')} {log[metric]} (z={scores[metric]['z'] or scores[metric]['ewma_z']:.1f})"
+        for metric in flags
+    )
+    nonconformity = Nonconformity(
+        cooperative_id=log['cooperative_id'],
+        production_log_id=log['id'],
+        date=log['date'],
+        category="quality",
+        severity="high",
+        description=f"Anomalous batch {log['batch_period']}: {details}",
+        corrective_action="Pending investigation",
+        status="open"
+    )
+    nc_doc = nonconformity.model_dump()
+    nc_doc['date'] = nc_doc['date'].isoformat()
+    nc_doc['created_at'] = nc_doc['created_at'].isoformat()
+    nc_doc['severity_rank'] = SEVERITY_RANKS.get(nc_doc['severity'], 0)
+    nc_doc.update(await sync_stamp())
+    await db.nonconformities.insert_one(nc_doc)
+    await record_resolution_changes([(None, nc_doc)])
+
+def ewma_window() -> int:
+    """Most recent observations that still carry weight in the EWMA; older ones decay below float precision"""
+    alpha = ANOMALY_EWMA_ALPHA
+    return int(np.ceil(np.log(1e-17) / np.log(1 - alpha))) if 0 < alpha < 1 else 1
+
+def compute_metric_states(values: np.ndarray, coop_index: np.ndarray, n_coops: int) -> List[dict]:
+    """Streaming state for every cooperative in one vectorised pass.
+
+    `values` must be ordered by cooperative, then by insertion time, with
+    `coop_index` giving each row's cooperative. Produces the same state that
+    calling metric_state_add once per log in that order would.
+    """
+    alpha = ANOMALY_EWMA_ALPHA
+    counts = np.bincount(coop_index, minlength=n_coops)
+    sums = np.bincount(coop_index, weights=values, minlength=n_coops)
+    means = np.divide(sums, counts, out=np.zeros(n_coops), where=counts > 0)
+    m2 = np.bincount(coop_index, weights=(values - means[coop_index]) ** 2, minlength=n_coops)
+    
+    # Position of each row within its cooperative's series
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    position = np.arange(len(values)) - starts[coop_index]
+    last = position == counts[coop_index] - 1
+    
+    # Prefix EWMAs: ewma_k = sum_i a(1-a)^(k-i) y_i with y_0 = x_0 / a, done as
+    # a convolution per cooperative with the kernel truncated once it vanishes
+    y = np.where(position == 0, values / alpha, values)
+    kernel = alpha * (1 - alpha) ** np.arange(ewma_window())
+    ewma = np.empty_like(values)
+    for coop in np.flatnonzero(counts):
+        segment = slice(starts[coop], starts[coop] + counts[coop])
+        ewma[segment] = np.convolve(y[segment], kernel)[:counts[coop]]
+    
+    # ewm_var_n = sum_k a(1-a)^(n-k) d_k^2 with d_k = x_k - ewma_(k-1)
+    previous_ewma = np.roll(ewma, 1)
+    d2 = np.where(position > 0, (values - previous_ewma) ** 2, 0.0)
+    steps_from_end = counts[coop_index] - 1 - position
+    ewm_var = np.bincount(
+        coop_index,
+        weights=alpha * (1 - alpha) ** (steps_from_end + 1) * d2,
+        minlength=n_coops
+    )
+    
+    final_ewma = np.full(n_coops, np.nan)
+    final_ewma[coop_index[last]] = ewma[last]
+    return [
+        {
+            "n": int(counts[i]),
+            "mean": float(means[i]),
+            "m2": float(m2[i]),
+            "ewma": None if counts[i] == 0 else float(final_ewma[i]),
+            "ewm_var": float(ewm_var[i])
+        }
+        for i in range(n_coops)
+    ]
+
+async def backfill_anomaly_state(coop_id: Optional[str] = None) -> dict:
+    """Rebuild streaming state from history, for one cooperative or all of them"""
+    query = {"cooperative_id": coop_id} if coop_id else {}
+    projection = {"_id": 0, "cooperative_id": 1, "created_at": 1, **{metric: 1 for metric in ANOMALY_METRICS}}
+    logs = await db.production_logs.find(query, projection).to_list(None)
+    logs += await load_archived_logs(coop_id)
+    
+    coop_ids = sorted({log['cooperative_id'] for log in logs})
+    if coop_id and coop_id not in coop_ids:
+        coop_ids.append(coop_id)
+    logs.sort(key=lambda log: (log['cooperative_id'], str(log.get('created_at', ''))))
+    position_of = {cid: i for i, cid in enumerate(coop_ids)}
+    coop_index = np.array([position_of[log['cooperative_id']] for log in logs], dtype=np.int64)
+    
+    per_coop = {cid: {} for cid in coop_ids}
+    for metric in ANOMALY_METRICS:
+        values = np.array([float(log.get(metric) or 0) for log in logs])
+        if len(logs) >= ANOMALY_POOL_MIN_LOGS:
+            # Large histories are folded in a worker process to keep the event loop responsive
+            states = await job_scheduler.run_in_process_pool(compute_metric_states, values, coop_index, len(coop_ids))
+        else:
+            states = compute_metric_states(values, coop_index, len(coop_ids))
+        for cid, state in zip(coop_ids, states):
+            per_coop[cid][metric] = state
+    
+    for cid, states in per_coop.items():
+        await db.production_stats.update_one(
+            {"cooperative_id": cid},
+            {"$set": {"metrics": states}, "$inc": {"version": 1}},
+            upsert=True
+        )
+    
+    return {cid: states[next(iter(ANOMALY_METRICS))]['n'] for cid, states in per_coop.items()}
+
+@api_router.post("/anomalies/backfill")
+async def backfill_anomalies(
+    cooperative_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Rebuild anomaly detection state from existing logs (officer only)"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can backfill anomaly state")
+    
+    started = time.perf_counter()
+    logs_per_cooperative = await backfill_anomaly_state(cooperative_id)
+    return {
+        "message": f"Rebuilt anomaly state for {len(logs_per_cooperative)} cooperatives",
+        "logs_per_cooperative": logs_per_cooperative,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+@api_router.get("/anomalies/cooperative/{coop_id}")
+async def get_anomaly_state(coop_id: str, current_user: dict = Depends(get_current_user)):
+    """Current baseline each new log of the cooperative is scored against"""
+    doc = await db.production_stats.find_one({"cooperative_id": coop_id}, {"_id": 0})
+    metrics = {}
+    for metric, state in ((doc or {}).get('metrics') or {}).items():
+        metrics[metric] = {
+            "samples": state['n'],
+            "mean": round(state['mean'], 3),
+            "std": round((state['m2'] / (state['n'] - 1)) ** 0.5, 3) if state['n'] > 1 else None,
+            "ewma": round(state['ewma'], 3) if state['ewma'] is not None else None,
+            "ewma_std": round(state['ewm_var'] ** 0.5, 3)
+        }
+    return {
+        "cooperative_id": coop_id,
+        "z_threshold": ANOMALY_Z_THRESHOLD,
+        "min_samples": ANOMALY_MIN_SAMPLES,
+        "metrics": metrics
+    }
+
 # ============= PRODUCTION LOG ROUTES =============
 
 @api_router.get("/production-logs", response_model=List[ProductionLog])
 async def get_production_logs(
     cooperative_id: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -323,25 +1367,180 @@ async def get_production_logs(
     elif cooperative_id:
         query['cooperative_id'] = cooperative_id
     
-    logs = await db.production_logs.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
+    selected = parse_fields(fields, ProductionLog)
+    projection = {"_id": 0} if selected is None else fields_projection(selected)
+    
+    logs = await db.production_logs.find(query, projection).sort("date", -1).to_list(1000)
     for log in logs:
         if isinstance(log.get('date'), str):
             log['date'] = datetime.fromisoformat(log['date'])
         if isinstance(log.get('created_at'), str):
             log['created_at'] = datetime.fromisoformat(log['created_at'])
+    
+    if selected is not None:
+        return sparse_response(logs, ProductionLog, selected)
     return logs
 
+SEVERITY_LEVELS = ("low", "medium", "high", "critical")
+# Stored on nonconformities as severity_rank so work queues can sort by severity from an index
+SEVERITY_RANKS = {level: rank for rank, level in enumerate(SEVERITY_LEVELS, 1)}
+ENERGY_BANDS = ("Low", "Medium", "High")
+
+@api_router.get("/production-logs/issues")
+async def get_production_log_issues(
+    cooperative_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    min_loss_percent: Optional[float] = None,
+    max_grade_a_percent: Optional[float] = None,
+    energy_use: Optional[str] = None,
+    match: str = "all",
+    with_issues_only: bool = False,
+    limit: int = 100,
+    offset: int = 0,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Per-batch nonconformity counts and severities, joined server-side.
+    
+    Batch filters (loss, grade, energy band) combine with AND, or with OR when
+    match=any, e.g. "High energy use or more than 15% loss". The page is cut
+    on the indexed date before its nonconformities are joined (through the
+    production_log_id index); the summary is a separate $group over
+    severities only. Only logs in the hot tier are joined.
+    """
+    if match not in ("all", "any"):
+        raise HTTPException(status_code=400, detail="match must be 'all' or 'any'")
+    
+    query = {}
+    if current_user['role'] == 'manager' and current_user.get('cooperative_id'):
+        query['cooperative_id'] = current_user['cooperative_id']
+    elif cooperative_id:
+        query['cooperative_id'] = cooperative_id
+    if start_date or end_date:
+        query['date'] = {}
+        if start_date:
+            query['date']['$gte'] = to_utc_iso(start_date)
+        if end_date:
+            query['date']['$lt'] = to_utc_iso(end_date)
+    
+    batch_filters = []
+    if min_loss_percent is not None:
+        batch_filters.append({"post_harvest_loss_percent": {"$gt": min_loss_percent}})
+    if max_grade_a_percent is not None:
+        batch_filters.append({"grade_a_percent": {"$lt": max_grade_a_percent}})
+    if energy_use:
+        bands = [band.strip().capitalize() for band in energy_use.split(',') if band.strip()]
+        if not set(bands) <= set(ENERGY_BANDS):
+            raise HTTPException(status_code=400, detail=f"energy_use must be one of: {', '.join(ENERGY_BANDS)}")
+        batch_filters.append({"energy_use": {"$in": bands}})
+    if len(batch_filters) == 1:
+        query.update(batch_filters[0])
+    elif batch_filters:
+        query["$and" if match == "all" else "$or"] = batch_filters
+    
+    def join_issues(*fields) -> dict:
+        return {"$lookup": {
+            "from": "nonconformities",
+            "localField": "id",
+            "foreignField": "production_log_id",
+            "pipeline": [{"$project": {"_id": 0, **{field: 1 for field in fields}}}],
+            "as": "issues"
+        }}
+    
+    issue_figures = {
+        "issue_count": {"$size": "$issues"},
+        "severities": {
+            level: {"$size": {"$filter": {"input": "$issues", "cond": {"$eq": ["$$this.severity", level]}}}}
+            for level in SEVERITY_LEVELS
+        }
+    }
+    
+    # The page is sorted and cut on the indexed date before anything is joined;
+    # with_issues_only only needs an existence probe per log to do that
+    page = [{"$match": query}]
+    if with_issues_only:
+        page += [
+            {"$lookup": {
+                "from": "nonconformities",
+                "localField": "id",
+                "foreignField": "production_log_id",
+                "pipeline": [{"$limit": 1}, {"$project": {"_id": 1}}],
+                "as": "linked"
+            }},
+            {"$match": {"linked": {"$ne": []}}}
+        ]
+    page += [
+        {"$sort": {"date": -1}},
+        {"$skip": max(offset, 0)},
+        {"$limit": max(1, min(limit, 1000))},
+        join_issues("id", "category", "severity", "status"),
+        {"$project": {
+            "_id": 0, "id": 1, "cooperative_id": 1, "date": 1, "batch_period": 1, "total_production": 1,
+            "post_harvest_loss_percent": 1, "grade_a_percent": 1, "energy_use": 1,
+            "issue_count": issue_figures['issue_count'],
+            "open_issues": {"$size": {"$filter": {"input": "$issues", "cond": {"$ne": ["$$this.status", "closed"]}}}},
+            "severities": issue_figures['severities'],
+            "issues": 1
+        }}
+    ]
+    
+    # The summary covers every matching batch but only joins severities
+    totals = [
+        {"$match": query},
+        join_issues("severity"),
+        {"$project": {"_id": 0, **issue_figures}}
+    ]
+    if with_issues_only:
+        totals.append({"$match": {"issue_count": {"$gt": 0}}})
+    totals.append({"$group": {
+        "_id": None,
+        "batches": {"$sum": 1},
+        "batches_with_issues": {"$sum": {"$cond": [{"$gt": ["$issue_count", 0]}, 1, 0]}},
+        "issues": {"$sum": "$issue_count"},
+        **{level: {"$sum": f"$severities.{level}"} for level in SEVERITY_LEVELS}
+    }})
+    
+    logs = analytics_db().production_logs
+    batches, summaries = await asyncio.gather(logs.aggregate(page).to_list(None), logs.aggregate(totals).to_list(1))
+    summary = summaries[0] if summaries else {"batches": 0, "batches_with_issues": 0, "issues": 0}
+    return {
+        "summary": {
+            "batches": summary['batches'],
+            "batches_with_issues": summary['batches_with_issues'],
+            "issue_rate": round(summary['batches_with_issues'] / summary['batches'] * 100, 2) if summary['batches'] else None,
+            "issues": summary['issues'],
+            "severities": {level: summary.get(level, 0) for level in SEVERITY_LEVELS}
+        },
+        "batches": batches
+    }
+
 @api_router.post("/production-logs", response_model=ProductionLog)
 async def create_production_log(log: ProductionLog, current_user: dict = Depends(get_current_user)):
     if current_user['role'] == 'manager':
         if not current_user.get('cooperative_id') or log.cooperative_id != current_user['cooperative_id']:
             raise HTTPException(status_code=403, detail="Cannot create log for other cooperatives")
     
+    flags, scores = await record_anomaly_observation(
+        log.cooperative_id,
+        {metric: getattr(log, metric) for metric in ANOMALY_METRICS}
+    )
+    log.anomaly_flags = flags
+    
     log_doc = log.model_dump()
     log_doc['date'] = log_doc['date'].isoformat()
     log_doc['created_at'] = log_doc['created_at'].isoformat()
+    log_doc.update(await sync_stamp())
+    
+    try:
+        await db.production_logs.insert_one(log_doc)
+    except DuplicateKeyError:
+        # Client-generated id sent twice (e.g. a retried upload)
+        await forget_anomaly_observation(log.cooperative_id, log_doc)
+        raise HTTPException(status_code=409, detail="Production log already exists")
     
-    await db.production_logs.insert_one(log_doc)
+    if flags and ANOMALY_AUTO_NONCONFORMITY:
+        await open_anomaly_nonconformity(log.model_dump(), flags, scores)
     
     # If has nonconformity, create a nonconformity record
     if log.has_nonconformity and log.nonconformity_description:
@@ -358,52 +1557,82 @@ async def create_production_log(log: ProductionLog, current_user: dict = Depends
         nc_doc = nonconformity.model_dump()
         nc_doc['date'] = nc_doc['date'].isoformat()
         nc_doc['created_at'] = nc_doc['created_at'].isoformat()
+        nc_doc['severity_rank'] = SEVERITY_RANKS.get(nc_doc['severity'], 0)
+        nc_doc.update(await sync_stamp())
         await db.nonconformities.insert_one(nc_doc)
+        await record_resolution_changes([(None, nc_doc)])
+    
+    invalidate_cooperative_stats(log.cooperative_id)
+    invalidate_forecast(log.cooperative_id)
+    columnar_store.upsert(log_doc)
     
     return log
 
+class ProductionLogUpdate(BaseModel):
+    total_production: Optional[float] = None
+    grade_a_percent: Optional[float] = None
+    grade_b_percent: Optional[float] = None
+    post_harvest_loss_percent: Optional[float] = None
+    post_harvest_loss_kg: Optional[float] = None
+    energy_use: Optional[str] = None
+    has_nonconformity: Optional[bool] = None
+    nonconformity_description: Optional[str] = None
+    corrective_action: Optional[str] = None
+
 @api_router.put("/production-logs/{log_id}", response_model=ProductionLog)
 async def update_production_log(
     log_id: str,
-    log_data: dict,
+    log_data: ProductionLogUpdate,
     current_user: dict = Depends(get_current_user)
 ):
     """Update a production log"""
-    # Get existing log
-    existing_log = await db.production_logs.find_one({"id": log_id}, {"_id": 0})
-    if not existing_log:
-        raise HTTPException(status_code=404, detail="Production log not found")
-    
-    # Check permissions
-    if current_user['role'] == 'manager':
-        if existing_log['cooperative_id'] != current_user.get('cooperative_id'):
-            raise HTTPException(status_code=403, detail="Cannot update log for other cooperatives")
-    
-    # Update fields
-    update_data = {}
-    allowed_fields = [
-        'total_production', 'grade_a_percent', 'grade_b_percent',
-        'post_harvest_loss_percent', 'post_harvest_loss_kg', 'energy_use',
-        'has_nonconformity', 'nonconformity_description', 'corrective_action'
-    ]
-    
-    for field in allowed_fields:
-        if field in log_data:
-            update_data[field] = log_data[field]
+    # Fields are validated and coerced before anything is written, so the
+    # anomaly statistics only ever see numbers; null clears the free-text
+    # fields and is ignored for the required ones
+    update_data = {
+        field: value for field, value in log_data.model_dump(exclude_unset=True).items()
+        if value is not None or field in ('nonconformity_description', 'corrective_action')
+    }
     
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided")
     
-    result = await db.production_logs.update_one(
-        {"id": log_id},
-        {"$set": update_data}
+    # Managers may only touch their own cooperative's logs; the permission
+    # check is part of the filter so the update is a single round trip
+    log_filter = production_log_write_filter(log_id, current_user)
+    previous_log = await db.production_logs.find_one_and_update(
+        log_filter,
+        {"$set": {**update_data, **await sync_stamp()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Production log not found or no changes")
+    if previous_log is None:
+        await raise_production_log_write_error(
+            log_id, "Cannot update log for other cooperatives",
+            archived_detail="Production log is archived and can no longer be edited"
+        )
+    
+    updated_log = {**previous_log, **update_data}
+    
+    # Re-score the batch only when a watched metric actually changed
+    if any(metric in update_data and update_data[metric] != previous_log.get(metric) for metric in ANOMALY_METRICS):
+        flags, scores = await record_anomaly_observation(
+            updated_log['cooperative_id'],
+            {metric: updated_log.get(metric) for metric in ANOMALY_METRICS},
+            old_values={metric: previous_log.get(metric) for metric in ANOMALY_METRICS}
+        )
+        if flags != previous_log.get('anomaly_flags', []):
+            await db.production_logs.update_one({"id": log_id}, {"$set": {"anomaly_flags": flags, **await sync_stamp()}})
+            updated_log['anomaly_flags'] = flags
+            if flags and ANOMALY_AUTO_NONCONFORMITY:
+                await open_anomaly_nonconformity(updated_log, flags, scores)
+        await refresh_anomaly_ewma(updated_log['cooperative_id'])
+    
+    invalidate_cooperative_stats(updated_log['cooperative_id'])
+    invalidate_forecast(updated_log['cooperative_id'])
+    columnar_store.upsert(updated_log)
     
-    # Fetch and return updated log
-    updated_log = await db.production_logs.find_one({"id": log_id}, {"_id": 0})
     if isinstance(updated_log.get('date'), str):
         updated_log['date'] = datetime.fromisoformat(updated_log['date'])
     if isinstance(updated_log.get('created_at'), str):
@@ -417,29 +1646,122 @@ async def delete_production_log(
     current_user: dict = Depends(get_current_user)
 ):
     """Delete a production log"""
-    # Get existing log
-    existing_log = await db.production_logs.find_one({"id": log_id}, {"_id": 0})
-    if not existing_log:
-        raise HTTPException(status_code=404, detail="Production log not found")
-    
-    # Check permissions
-    if current_user['role'] == 'manager':
-        if existing_log['cooperative_id'] != current_user.get('cooperative_id'):
-            raise HTTPException(status_code=403, detail="Cannot delete log for other cooperatives")
+    log_filter = production_log_write_filter(log_id, current_user)
+    # Remove issues raised against the batch before the batch itself, as the
+    # range delete does, so an interrupted delete never leaves issues pointing
+    # at a deleted log. They share the log's cooperative, so scoping them like
+    # the log keeps managers to their own issues.
+    await delete_synced("nonconformities", {
+        "production_log_id": log_id, **{key: value for key, value in log_filter.items() if key != 'id'}
+    })
+    deleted_log = await db.production_logs.find_one_and_delete(
+        log_filter,
+        projection={"_id": 0, "id": 1, "cooperative_id": 1, **{metric: 1 for metric in ANOMALY_METRICS}}
+    )
     
-    result = await db.production_logs.delete_one({"id": log_id})
+    if deleted_log is not None:
+        await record_sync_deletions("production_logs", [deleted_log])
+    else:
+        # Older logs live in archive blocks, counted in their monthly summary
+        archived, _ = await remove_archived_logs(
+            {"log_ids": log_id, **{key: value for key, value in log_filter.items() if key != 'id'}},
+            lambda log: log['id'] == log_id
+        )
+        if not archived:
+            await raise_production_log_write_error(log_id, "Cannot delete log for other cooperatives")
+        deleted_log = archived[0]
     
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Production log not found")
+    await forget_anomaly_observation(deleted_log['cooperative_id'], deleted_log)
+    await refresh_anomaly_ewma(deleted_log['cooperative_id'])
+    invalidate_cooperative_stats(deleted_log['cooperative_id'])
+    invalidate_forecast(deleted_log['cooperative_id'])
+    columnar_store.remove(deleted_log['cooperative_id'], [log_id])
     
     return {"message": "Production log deleted successfully"}
 
+class ProductionLogRangeDelete(BaseModel):
+    cooperative_id: str
+    start_date: datetime
+    end_date: datetime
+
+@api_router.post("/production-logs/bulk-delete")
+async def bulk_delete_production_logs(
+    range_data: ProductionLogRangeDelete,
+    current_user: dict = Depends(get_current_user)
+):
+    """Delete a cooperative's production logs in [start_date, end_date) and their nonconformities (officer only)"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can bulk delete production logs")
+    
+    start_date = to_utc_iso(range_data.start_date)
+    end_date = to_utc_iso(range_data.end_date)
+    if end_date <= start_date:
+        raise HTTPException(status_code=400, detail="end_date must be after start_date")
+    
+    log_filter = {
+        "cooperative_id": range_data.cooperative_id,
+        "date": {"$gte": start_date, "$lt": end_date}
+    }
+    transactional = await supports_transactions()
+    
+    deleted_logs = 0
+    deleted_ncs = 0
+    chunks = 0
+    # Work in bounded chunks so no single delete holds locks for long
+    while True:
+        chunk = await db.production_logs.find(log_filter, {"_id": 0, "id": 1}).limit(LOG_DELETE_CHUNK_SIZE).to_list(LOG_DELETE_CHUNK_SIZE)
+        if not chunk:
+            break
+        log_ids = [log['id'] for log in chunk]
+        
+        if transactional:
+            async with await client.start_session() as session:
+                async with session.start_transaction():
+                    chunk_ncs = await delete_synced("nonconformities", {"production_log_id": {"$in": log_ids}}, session=session)
+                    chunk_logs = await delete_synced("production_logs", {"id": {"$in": log_ids}}, session=session)
+        else:
+            # Standalone servers have no transactions; deleting issues before
+            # their logs means an interrupted run never leaves issues pointing
+            # at a deleted log, and re-running the request finds the remaining
+            # logs (and any issues still attached) again
+            chunk_ncs = await delete_synced("nonconformities", {"production_log_id": {"$in": log_ids}})
+            chunk_logs = await delete_synced("production_logs", {"id": {"$in": log_ids}})
+        
+        deleted_logs += chunk_logs
+        deleted_ncs += chunk_ncs
+        chunks += 1
+    
+    # Months already moved to the archive tier
+    archived_logs, archived_ncs = await remove_archived_logs(
+        {"cooperative_id": range_data.cooperative_id, "month": {"$gte": start_date[:7], "$lte": end_date[:7]}},
+        lambda log: start_date <= log_date_iso(log['date']) < end_date
+    )
+    deleted_logs += len(archived_logs)
+    deleted_ncs += archived_ncs
+    
+    invalidate_cooperative_stats(range_data.cooperative_id)
+    invalidate_forecast(range_data.cooperative_id)
+    columnar_store.invalidate(range_data.cooperative_id)
+    if deleted_logs:
+        await backfill_anomaly_state(range_data.cooperative_id)
+    
+    return {
+        "message": f"Deleted {deleted_logs} production logs",
+        "cooperative_id": range_data.cooperative_id,
+        "deleted_logs": deleted_logs,
+        "deleted_nonconformities": deleted_ncs,
+        "archived_logs": len(archived_logs),
+        "chunks": chunks,
+        "transactional": transactional
+    }
+
 # ============= NONCONFORMITY ROUTES =============
 
 @api_router.get("/nonconformities", response_model=List[Nonconformity])
 async def get_nonconformities(
     cooperative_id: Optional[str] = None,
     status: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -451,7 +1773,10 @@ async def get_nonconformities(
     if status:
         query['status'] = status
     
-    ncs = await db.nonconformities.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
+    selected = parse_fields(fields, Nonconformity)
+    projection = {"_id": 0} if selected is None else fields_projection(selected)
+    
+    ncs = await db.nonconformities.find(query, projection).sort("date", -1).to_list(1000)
     for nc in ncs:
         if isinstance(nc.get('date'), str):
             nc['date'] = datetime.fromisoformat(nc['date'])
@@ -459,9 +1784,13 @@ async def get_nonconformities(
             nc['created_at'] = datetime.fromisoformat(nc['created_at'])
         if nc.get('closed_date') and isinstance(nc['closed_date'], str):
             nc['closed_date'] = datetime.fromisoformat(nc['closed_date'])
+    
+    if selected is not None:
+        return sparse_response(ncs, Nonconformity, selected)
     return ncs
 
 class NonconformityCreate(BaseModel):
+    id: Optional[str] = None  # client-generated ids make offline uploads idempotent
     cooperative_id: str
     date: datetime
     category: str
@@ -486,7 +1815,7 @@ async def create_nonconformity(
 ):
     """Create a new nonconformity/issue"""
     nc = Nonconformity(
-        id=str(uuid.uuid4()),
+        id=nc_data.id or str(uuid.uuid4()),
         cooperative_id=nc_data.cooperative_id,
         date=nc_data.date,
         category=nc_data.category,
@@ -501,8 +1830,15 @@ async def create_nonconformity(
     nc_doc = nc.model_dump()
     nc_doc['date'] = nc_doc['date'].isoformat()
     nc_doc['created_at'] = nc_doc['created_at'].isoformat()
+    nc_doc['severity_rank'] = SEVERITY_RANKS.get(nc_doc['severity'], 0)
+    nc_doc.update(await sync_stamp())
     
-    await db.nonconformities.insert_one(nc_doc)
+    try:
+        await db.nonconformities.insert_one(nc_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Nonconformity already exists")
+    await record_resolution_changes([(None, nc_doc)])
+    invalidate_cooperative_stats(nc.cooperative_id)
     
     return nc
 
@@ -519,6 +1855,7 @@ async def update_nonconformity_full(
         update_data["category"] = nc_data.category
     if nc_data.severity is not None:
         update_data["severity"] = nc_data.severity
+        update_data["severity_rank"] = SEVERITY_RANKS.get(nc_data.severity, 0)
     if nc_data.description is not None:
         update_data["description"] = nc_data.description
     if nc_data.corrective_action is not None:
@@ -535,18 +1872,19 @@ async def update_nonconformity_full(
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided")
     
-    result = await db.nonconformities.update_one(
+    stamp = await sync_stamp()
+    previous_nc = await db.nonconformities.find_one_and_update(
         {"id": nc_id},
-        {"$set": update_data}
+        {"$set": {**update_data, **stamp}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
     )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Nonconformity not found or no changes")
-    
-    # Fetch and return the updated document
-    updated_nc = await db.nonconformities.find_one({"id": nc_id}, {"_id": 0})
-    if not updated_nc:
+    if not previous_nc:
         raise HTTPException(status_code=404, detail="Nonconformity not found")
+    updated_nc = {**previous_nc, **update_data, **stamp}
+    
+    await record_resolution_changes([(previous_nc, updated_nc)])
+    invalidate_cooperative_stats(updated_nc['cooperative_id'])
     
     # Convert date fields
     if isinstance(updated_nc.get('date'), str):
@@ -580,27 +1918,1215 @@ async def update_nonconformity(
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided")
     
-    result = await db.nonconformities.update_one(
+    stamp = await sync_stamp()
+    previous_nc = await db.nonconformities.find_one_and_update(
         {"id": nc_id},
-        {"$set": update_data}
+        {"$set": {**update_data, **stamp}},
+        projection=RESOLUTION_PROJECTION
     )
     
-    if result.modified_count == 0:
+    if previous_nc is None:
         raise HTTPException(status_code=404, detail="Nonconformity not found")
     
+    await record_resolution_changes([(previous_nc, {**previous_nc, **update_data, **stamp})])
+    invalidate_cooperative_stats(previous_nc['cooperative_id'])
+    
     return {"message": "Updated successfully"}
 
+async def stamp_missing_severity_rank() -> int:
+    """Give nonconformities written without a severity_rank (seed data, older releases) one"""
+    stamped = 0
+    for severity, rank in SEVERITY_RANKS.items():
+        result = await db.nonconformities.update_many(
+            {"severity": severity, "severity_rank": {"$exists": False}}, {"$set": {"severity_rank": rank}}
+        )
+        stamped += result.modified_count
+    result = await db.nonconformities.update_many({"severity_rank": {"$exists": False}}, {"$set": {"severity_rank": 0}})
+    return stamped + result.modified_count
+
+def parse_queue_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """"<severity_rank>:<date>:<id>" of the last item on the previous page"""
+    if not cursor:
+        return None
+    rank, _, rest = cursor.partition(':')
+    date, _, nc_id = rest.rpartition(':')
+    if not rank.isdigit() or not date or not nc_id:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return int(rank), date, nc_id
+
+async def get_work_queue(assignee: str, status: str, cursor: Optional[str], limit: int) -> dict:
+    """
+    Issues assigned to `assignee`, most severe first and oldest first within a
+    severity, one keyset page at a time.
+    
+    Served in index order from (assigned_to, status, severity_rank, date, id);
+    several statuses are merged from their index ranges without a sort stage.
+    """
+    statuses = [value.strip() for value in status.split(',') if value.strip()]
+    limit = max(1, min(limit, 200))
+    query = {"assigned_to": assignee, "status": {"$in": statuses}}
+    after = parse_queue_cursor(cursor)
+    if after:
+        rank, date, nc_id = after
+        query["$or"] = [
+            {"severity_rank": {"$lt": rank}},
+            {"severity_rank": rank, "date": {"$gt": date}},
+            {"severity_rank": rank, "date": date, "id": {"$gt": nc_id}},
+        ]
+    
+    ncs = await db.nonconformities.find(query, {"_id": 0}).sort(
+        [("severity_rank", -1), ("date", 1), ("id", 1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    has_more = len(ncs) > limit
+    ncs = ncs[:limit]
+    next_cursor = f"{ncs[-1]['severity_rank']}:{ncs[-1]['date']}:{ncs[-1]['id']}" if has_more else None
+    return {"items": [Nonconformity(**nc) for nc in ncs], "next_cursor": next_cursor}
+
+@api_router.get("/nonconformities/mine")
+async def get_my_nonconformities(
+    status: str = "open,in_progress",
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    current_user: dict = Depends(get_current_user)
+):
+    """The current user's work queue: assigned issues by severity, then age"""
+    return await get_work_queue(current_user['email'], status, cursor, limit)
+
+@api_router.get("/nonconformities/assigned/{assignee}")
+async def get_assignee_nonconformities(
+    assignee: str,
+    status: str = "open,in_progress",
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    current_user: dict = Depends(get_current_user)
+):
+    """Any assignee's work queue (officers only)"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can view other users' work queues")
+    return await get_work_queue(assignee, status, cursor, limit)
+
+# ============= RESOLUTION METRICS =============
+
+# Upper bounds (days) of the time-to-close histogram buckets; one more bucket holds the rest
+RESOLUTION_BUCKET_DAYS = (1, 2, 3, 5, 7, 10, 14, 21, 30, 45, 60, 90, 180, 365)
+RESOLUTION_FIELDS = ("cooperative_id", "category", "severity", "status", "date", "closed_date")
+# id and updated_seq let a rebuild tell which version of an issue its scan saw
+RESOLUTION_PROJECTION = {"_id": 0, "id": 1, "updated_seq": 1, **{field: 1 for field in RESOLUTION_FIELDS}}
+RESOLUTION_GROUPS = ("cooperative", "category", "severity")
+
+def parse_sla_days(spec: str) -> dict:
+    """"critical:2,high:7,..." -> {severity: days}"""
+    targets = {}
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        severity, _, days = entry.partition(':')
+        targets[severity.strip()] = float(days)
+    return targets
+
+RESOLUTION_SLA = parse_sla_days(RESOLUTION_SLA_DAYS)
+
+def as_utc_datetime(value) -> datetime:
+    value = datetime.fromisoformat(value) if isinstance(value, str) else value
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def resolution_bucket(days: float) -> int:
+    return bisect.bisect_left(RESOLUTION_BUCKET_DAYS, days)
+
+def resolution_contribution(nc: dict) -> tuple:
+    """The metrics key and counters one nonconformity adds to `resolution_metrics`"""
+    key = {"cooperative_id": nc['cooperative_id'], "category": nc.get('category'), "severity": nc.get('severity')}
+    opened = as_utc_datetime(nc['date'])
+    if nc.get('status') != 'closed':
+        return key, {"open": 1, f"open_by_day.{opened.date().isoformat()}": 1}
+    if not nc.get('closed_date'):
+        return key, {}  # closed before close dates were recorded
+    closed = as_utc_datetime(nc['closed_date'])
+    days = max((closed - opened).total_seconds() / 86400, 0.0)
+    return key, {"closed": 1, "closed_days_sum": days, f"buckets.{resolution_bucket(days)}": 1}
+
+# A rebuild is written here and renamed over resolution_metrics
+RESOLUTION_METRICS_STAGING = "resolution_metrics_rebuild"
+
+def resolution_journal_entry(before: Optional[dict], after: Optional[dict], recorded_at: datetime) -> dict:
+    slim = lambda nc: None if nc is None else {field: nc.get(field) for field in RESOLUTION_PROJECTION if field != "_id"}
+    return {"nc_id": (after or before).get('id'), "before": slim(before), "after": slim(after), "recorded_at": recorded_at}
+
+async def record_resolution_changes(changes: List[tuple], session=None):
+    """
+    Apply (before, after) nonconformity transitions to the resolution metrics.
+    
+    The old state's contribution is subtracted and the new one added, so a
+    close, a reopen-after-close, a re-close or a change of category/severity
+    all move the right counters. Pass None for a side that does not exist
+    (creation, deletion). Every transition is also kept in
+    `resolution_journal` for a day so a concurrent rebuild can replay it.
+    """
+    deltas = {}
+    for before, after in changes:
+        for nc, sign in ((before, -1), (after, 1)):
+            if nc is None:
+                continue
+            key, counters = resolution_contribution(nc)
+            merged = deltas.setdefault(tuple(key.values()), {"key": key, "inc": {}})['inc']
+            for counter, value in counters.items():
+                merged[counter] = merged.get(counter, 0) + sign * value
+    updates = [
+        UpdateOne(delta['key'], {"$inc": {counter: value for counter, value in delta['inc'].items() if value}}, upsert=True)
+        for delta in deltas.values() if any(delta['inc'].values())
+    ]
+    if updates:
+        await db.resolution_metrics.bulk_write(updates, ordered=False, session=session)
+        recorded_at = datetime.now(timezone.utc)
+        await db.resolution_journal.insert_many(
+            [resolution_journal_entry(before, after, recorded_at) for before, after in changes], session=session
+        )
+
+def add_resolution_contribution(metrics: dict, nc: dict, sign: int = 1):
+    """Fold one nonconformity into the in-memory metrics documents of a rebuild"""
+    key, counters = resolution_contribution(nc)
+    doc = metrics.setdefault(tuple(key.values()), {
+        **key, "open": 0, "closed": 0, "closed_days_sum": 0.0, "buckets": {}, "open_by_day": {}
+    })
+    for counter, value in counters.items():
+        field, _, sub = counter.partition('.')
+        if sub:
+            doc[field][sub] = doc[field].get(sub, 0) + sign * value
+        else:
+            doc[field] += sign * value
+
+def replay_resolution_journal(metrics: dict, seen: dict, entries: List[dict]) -> int:
+    """
+    Apply the journaled transitions a rebuild's scan did not see.
+    
+    `seen` maps each scanned issue to the updated_seq it was read at. Every
+    write bumps that sequence, so a transition is missing from the scan
+    exactly when it starts at or after the version the scan read; an issue
+    the scan never saw is replayed from its creation, if that was journaled.
+    """
+    created = {entry['nc_id'] for entry in entries if entry['before'] is None}
+    replayed = 0
+    for entry in entries:
+        if entry['nc_id'] in seen:
+            missed = entry['before'] is not None and seen[entry['nc_id']] <= (entry['before'].get('updated_seq') or 0)
+        else:
+            missed = entry['nc_id'] in created
+        if not missed:
+            continue
+        for nc, sign in ((entry['before'], -1), (entry['after'], 1)):
+            if nc is not None:
+                add_resolution_contribution(metrics, nc, sign)
+        replayed += 1
+    return replayed
+
+async def rebuild_resolution_metrics() -> dict:
+    """
+    Recompute every histogram and open counter from the nonconformities in one pass.
+    
+    The counters are written to a staging collection that is then renamed over
+    `resolution_metrics`, so readers switch from the old set to the new one in
+    one step. Increments that reached the live collection while the scan ran
+    are replayed from `resolution_journal` first; only a change journaled in
+    the moment between that read and the rename can still be lost, and the
+    next rebuild restores it.
+    """
+    started = datetime.now(timezone.utc)
+    metrics = {}
+    seen = {}
+    async for nc in db.nonconformities.find({}, RESOLUTION_PROJECTION).batch_size(5000):
+        seen[nc.get('id')] = nc.get('updated_seq') or 0
+        add_resolution_contribution(metrics, nc)
+    
+    # Older entries are skipped by the sequence check, so the margin only has
+    # to cover clock skew between replicas
+    entries = await db.resolution_journal.find(
+        {"recorded_at": {"$gte": started - timedelta(minutes=5)}}, {"_id": 0}
+    ).to_list(None)
+    replayed = replay_resolution_journal(metrics, seen, entries)
+    
+    rebuilt_at = datetime.now(timezone.utc).isoformat()
+    staging = db[RESOLUTION_METRICS_STAGING]
+    await staging.drop()
+    # Indexes travel with the collection on rename; this also creates it when there is nothing to write
+    await staging.create_index([("cooperative_id", 1), ("category", 1), ("severity", 1)], unique=True)
+    if metrics:
+        await staging.insert_many([{**doc, "rebuilt_at": rebuilt_at} for doc in metrics.values()], ordered=False)
+    replaced = await db.resolution_metrics.estimated_document_count()
+    await staging.rename("resolution_metrics", dropTarget=True)
+    return {"keys": len(metrics), "replaced": replaced, "replayed": replayed}
+
+def histogram_percentile(buckets: List[int], fraction: float) -> Optional[float]:
+    """Approximate percentile (days), interpolating linearly inside the bucket it falls in"""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for index, count in enumerate(buckets):
+        if count and seen + count >= rank:
+            lower = RESOLUTION_BUCKET_DAYS[index - 1] if index else 0
+            if index == len(RESOLUTION_BUCKET_DAYS):
+                return float(lower)  # open-ended last bucket
+            return round(lower + (RESOLUTION_BUCKET_DAYS[index] - lower) * (rank - seen) / count, 2)
+        seen += count
+    return float(RESOLUTION_BUCKET_DAYS[-1])
+
+def histogram_count_within(buckets: List[int], days: float) -> float:
+    """How many closes took at most `days`, interpolating inside a partial bucket"""
+    within = 0.0
+    lower = 0
+    for index, count in enumerate(buckets[:len(RESOLUTION_BUCKET_DAYS)]):
+        upper = RESOLUTION_BUCKET_DAYS[index]
+        if days >= upper:
+            within += count
+        elif days > lower:
+            within += count * (days - lower) / (upper - lower)
+        lower = upper
+    return within
+
+@api_router.get("/nonconformities/sla")
+async def get_resolution_sla(
+    group_by: str = "category",
+    cooperative_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Time-to-close statistics and open-issue ages per category, severity and/or cooperative.
+    
+    Served from the incrementally maintained `resolution_metrics` documents,
+    one per cooperative/category/severity, so the cost does not grow with the
+    number of nonconformities.
+    """
+    dimensions = [part.strip() for part in group_by.split(',') if part.strip()]
+    if not dimensions or not set(dimensions) <= set(RESOLUTION_GROUPS):
+        raise HTTPException(status_code=400, detail=f"group_by must be a comma-separated subset of: {', '.join(RESOLUTION_GROUPS)}")
+    
+    query = {}
+    if current_user['role'] == 'manager' and current_user.get('cooperative_id'):
+        query['cooperative_id'] = current_user['cooperative_id']
+    elif cooperative_id:
+        query['cooperative_id'] = cooperative_id
+    
+    today = datetime.now(timezone.utc).date()
+    groups = {}
+    for doc in await db.resolution_metrics.find(query, {"_id": 0}).to_list(None):
+        key = {dimension: doc['cooperative_id' if dimension == 'cooperative' else dimension] for dimension in dimensions}
+        group = groups.setdefault(tuple(key.values()), {
+            "key": key, "closed": 0, "closed_days_sum": 0.0, "sla_closed": 0, "within_sla": 0.0,
+            "buckets": [0] * (len(RESOLUTION_BUCKET_DAYS) + 1),
+            "open": 0, "open_age_days_sum": 0, "oldest_open_days": None, "overdue": 0
+        })
+        buckets = [doc.get('buckets', {}).get(str(index), 0) for index in range(len(RESOLUTION_BUCKET_DAYS) + 1)]
+        sla = RESOLUTION_SLA.get(doc['severity'])
+        group['closed'] += doc.get('closed', 0)
+        group['closed_days_sum'] += doc.get('closed_days_sum', 0.0)
+        group['buckets'] = [a + b for a, b in zip(group['buckets'], buckets)]
+        if sla is not None:
+            group['sla_closed'] += sum(buckets)
+            group['within_sla'] += histogram_count_within(buckets, sla)
+        group['open'] += doc.get('open', 0)
+        for day, count in doc.get('open_by_day', {}).items():
+            if count <= 0:
+                continue
+            age = (today - datetime.fromisoformat(day).date()).days
+            group['open_age_days_sum'] += age * count
+            group['oldest_open_days'] = max(group['oldest_open_days'] or 0, age)
+            if sla is not None and age > sla:
+                group['overdue'] += count
+    
+    results = []
+    for group in groups.values():
+        closed = group['closed']
+        results.append({
+            "key": group['key'],
+            "closed": closed,
+            "mean_days": round(group['closed_days_sum'] / closed, 2) if closed else None,
+            "p50_days": histogram_percentile(group['buckets'], 0.5),
+            "p90_days": histogram_percentile(group['buckets'], 0.9),
+            "p95_days": histogram_percentile(group['buckets'], 0.95),
+            "within_sla_percent": round(group['within_sla'] / group['sla_closed'] * 100, 1) if group['sla_closed'] else None,
+            "histogram": group['buckets'],
+            "open": group['open'],
+            "mean_open_age_days": round(group['open_age_days_sum'] / group['open'], 1) if group['open'] else None,
+            "oldest_open_days": group['oldest_open_days'],
+            "overdue": group['overdue']
+        })
+    results.sort(key=lambda result: [str(value) for value in result['key'].values()])
+    return {"bucket_bounds_days": list(RESOLUTION_BUCKET_DAYS), "sla_days": RESOLUTION_SLA, "groups": results}
+
+# ============= DELTA SYNC =============
+
+class SyncRequest(BaseModel):
+    cursor: Optional[str] = None  # as returned by the previous sync; omit for a full download
+    download: bool = True  # False only uploads, leaving the client's cursor where it was
+    production_logs: List[ProductionLog] = Field(default_factory=list)
+    nonconformities: List[NonconformityCreate] = Field(default_factory=list)
+
+def parse_sync_cursor(cursor: Optional[str]) -> tuple:
+    if not cursor:
+        return None, 0
+    epoch, _, seq = cursor.rpartition(':')
+    if not epoch or not seq.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+    return epoch, int(seq)
+
+async def apply_sync_uploads(items: list, collection: str, create, current_user: dict) -> dict:
+    """Create each item once; ids seen before (or deleted or archived since) are acknowledged, not re-created"""
+    if not items:
+        return {"created": [], "existing": [], "rejected": []}
+    ids = [item.id for item in items]
+    known = set(await db[collection].distinct("id", {"id": {"$in": ids}}))
+    known.update(await db.sync_tombstones.distinct("id", {"collection": collection, "id": {"$in": ids}}))
+    if collection == "production_logs":
+        known.update(await db.production_log_archive.distinct("log_ids", {"log_ids": {"$in": ids}}))
+    
+    result = {"created": [], "existing": [], "rejected": []}
+    for item in items:
+        if item.id in known:
+            result["existing"].append(item.id)
+            continue
+        known.add(item.id)
+        try:
+            await create(item, current_user)
+            result["created"].append(item.id)
+        except HTTPException as exc:
+            if exc.status_code == 409:
+                result["existing"].append(item.id)
+            else:
+                result["rejected"].append({"id": item.id, "status": exc.status_code, "detail": exc.detail})
+    return result
+
+async def collect_sync_changes(after_seq: int, coop_scope: Optional[str], limit: int) -> tuple:
+    """The next `limit` changes after `after_seq` across all synced collections, in sequence order"""
+    scoped = {"cooperative_id": coop_scope} if coop_scope else {}
+    after = {"updated_seq": {"$gt": after_seq}}
+    queries = [
+        ("cooperatives", "changed", db.cooperatives.find(after, {"_id": 0})),
+        ("production_logs", "changed", db.production_logs.find({**after, **scoped}, {"_id": 0})),
+        ("nonconformities", "changed", db.nonconformities.find({**after, **scoped}, {"_id": 0})),
+    ]
+    if after_seq:
+        queries.append((None, "deleted", db.sync_tombstones.find({**after, **scoped}, {"_id": 0})))
+    
+    batches = await asyncio.gather(*(
+        cursor.sort("updated_seq", 1).limit(limit + 1).to_list(limit + 1) for _, _, cursor in queries
+    ))
+    merged = sorted(
+        ((doc['updated_seq'], collection or doc['collection'], kind, doc)
+         for (collection, kind, _), docs in zip(queries, batches) for doc in docs),
+        key=lambda change: change[0]
+    )
+    
+    # Sequence numbers are taken just before the write lands, so a very recent
+    # change may still have an unwritten predecessor; stop short of those
+    settled = (datetime.now(timezone.utc) - timedelta(seconds=SYNC_SETTLE_SECONDS)).isoformat()
+    changes = []
+    has_more = len(merged) > limit
+    for change in merged[:limit]:
+        if change[3].get('updated_at', '') > settled:
+            has_more = True
+            break
+        changes.append(change)
+    return changes, has_more
+
+@api_router.post("/sync")
+async def sync(request: SyncRequest, current_user: dict = Depends(get_current_user)):
+    """Upload offline entries, then (unless `download` is false) return what changed since the client's cursor"""
+    if len(request.production_logs) + len(request.nonconformities) > SYNC_MAX_UPLOAD:
+        raise HTTPException(status_code=400, detail=f"At most {SYNC_MAX_UPLOAD} records per sync upload")
+    
+    uploaded = {
+        "production_logs": await apply_sync_uploads(
+            request.production_logs, "production_logs", create_production_log, current_user
+        ),
+        "nonconformities": await apply_sync_uploads(
+            request.nonconformities, "nonconformities", create_nonconformity, current_user
+        )
+    }
+    if not request.download:
+        return {"uploaded": uploaded}
+    
+    state = await db.counters.find_one_and_update(
+        {"_id": "sync"},
+        {"$setOnInsert": {"seq": 0, "epoch": new_sync_epoch(), "purged_through": 0}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    epoch = state['epoch']
+    client_epoch, after_seq = parse_sync_cursor(request.cursor)
+    # Unknown epochs (data was reinitialised) and cursors older than the
+    # retained tombstones cannot be caught up incrementally
+    reset = client_epoch != epoch or after_seq < state['purged_through']
+    if reset:
+        after_seq = 0
+    
+    coop_scope = current_user.get('cooperative_id') if current_user['role'] == 'manager' else None
+    changes, has_more = await collect_sync_changes(after_seq, coop_scope, SYNC_PAGE_SIZE)
+    
+    changed = {collection: [] for collection in SYNC_COLLECTIONS}
+    deleted = {collection: [] for collection in SYNC_COLLECTIONS}
+    for _, collection, kind, doc in changes:
+        if kind == "changed":
+            changed[collection].append(doc)
+        else:
+            deleted[collection].append(doc['id'])
+    
+    return {
+        "cursor": f"{epoch}:{changes[-1][0] if changes else after_seq}",
+        "reset": reset,
+        "has_more": has_more,
+        "uploaded": uploaded,
+        "changed": changed,
+        "deleted": deleted
+    }
+
+async def purge_sync_tombstones() -> dict:
+    """Drop old tombstones; clients with older cursors get a full resync instead"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=SYNC_TOMBSTONE_DAYS)).isoformat()
+    newest = await db.sync_tombstones.find_one(
+        {"updated_at": {"$lt": cutoff}}, {"_id": 0, "updated_seq": 1}, sort=[("updated_seq", -1)]
+    )
+    if not newest:
+        return {"purged": 0}
+    await db.counters.update_one({"_id": "sync"}, {"$max": {"purged_through": newest['updated_seq']}})
+    result = await db.sync_tombstones.delete_many({"updated_seq": {"$lte": newest['updated_seq']}})
+    return {"purged": result.deleted_count, "purged_through": newest['updated_seq']}
+
+# ============= LOG TIERING =============
+
+# Additive production totals shared by raw-log aggregations and monthly summaries
+PRODUCTION_TOTAL_FIELDS = (
+    "logs", "total_production", "loss_kg", "grade_a_kg", "grade_b_kg", "loss_percent_sum", "grade_a_percent_sum"
+)
+
+def hot_tier_start(now: Optional[datetime] = None) -> datetime:
+    """Logs dated before this month boundary are moved to the archive tier"""
+    horizon = (now or datetime.now(timezone.utc)) - timedelta(days=max(LOG_HOT_DAYS, STATS_WINDOW_DAYS))
+    return horizon.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def log_date_iso(date) -> str:
+    return to_utc_iso(datetime.fromisoformat(date) if isinstance(date, str) else date)
+
+def log_month(date) -> str:
+    return log_date_iso(date)[:7]
+
+def add_totals(*parts: dict) -> dict:
+    return {field: sum(part.get(field) or 0 for part in parts) for field in PRODUCTION_TOTAL_FIELDS}
+
+def production_totals(logs: list) -> dict:
+    totals = dict.fromkeys(PRODUCTION_TOTAL_FIELDS, 0)
+    for log in logs:
+        production = log.get('total_production') or 0
+        totals['logs'] += 1
+        totals['total_production'] += production
+        totals['loss_kg'] += log.get('post_harvest_loss_kg') or 0
+        totals['grade_a_kg'] += production * (log.get('grade_a_percent') or 0) / 100
+        totals['grade_b_kg'] += production * (log.get('grade_b_percent') or 0) / 100
+        totals['loss_percent_sum'] += log.get('post_harvest_loss_percent') or 0
+        totals['grade_a_percent_sum'] += log.get('grade_a_percent') or 0
+    return totals
+
+def monthly_figures(totals: dict) -> dict:
+    """Readable per-month numbers derived from additive totals"""
+    logs = totals['logs']
+    production = totals['total_production']
+    return {
+        "logs": logs,
+        "total_production": round(production, 2),
+        "loss_kg": round(totals['loss_kg'], 2),
+        "avg_loss_percent": round(totals['loss_percent_sum'] / logs, 2) if logs else None,
+        "grade_mix": {
+            "a": round(totals['grade_a_kg'] / production * 100, 2),
+            "b": round(totals['grade_b_kg'] / production * 100, 2)
+        } if production else None
+    }
+
+def encode_archive_block(logs: list) -> dict:
+    if LOG_ARCHIVE_COMPRESSION == 'zstd' and zstd is not None:
+        payload = json.dumps(logs, separators=(',', ':'), default=str).encode()
+        return {"codec": "zstd", "data": zstd.ZstdCompressor(level=LOG_ARCHIVE_ZSTD_LEVEL).compress(payload)}
+    return {"codec": "none", "logs": logs}
+
+def decode_archive_block(block: dict) -> list:
+    if block['codec'] == 'zstd':
+        if zstd is None:
+            raise RuntimeError("zstandard is required to read compressed archive blocks")
+        return json.loads(zstd.ZstdDecompressor().decompress(block['data']))
+    return block['logs']
+
+async def load_archived_logs(coop_id: Optional[str] = None) -> list:
+    query = {"cooperative_id": coop_id} if coop_id else {}
+    blocks = await db.production_log_archive.find(query, {"_id": 0}).to_list(None)
+    return [log for block in blocks for log in decode_archive_block(block)]
+
+async def get_monthly_summaries(coop_ids: Optional[List[str]] = None, source=None) -> list:
+    query = {"cooperative_id": {"$in": coop_ids}} if coop_ids is not None else {}
+    return await (source or db).production_log_monthly.find(query, {"_id": 0}).sort("month", 1).to_list(None)
+
+async def archive_log_month(coop_id: str, month: str, logs: list) -> int:
+    """Move one cooperative-month of raw logs into an archive block and fold it into the summary"""
+    log_ids = [log['id'] for log in logs]
+    # A run interrupted between archiving and deleting leaves logs in both
+    # tiers; those are only deleted here, never counted twice
+    already = await db.production_log_archive.distinct("log_ids", {"log_ids": {"$in": log_ids}})
+    if already:
+        await db.production_logs.delete_many({"id": {"$in": already}})
+        already = set(already)
+        logs = [log for log in logs if log['id'] not in already]
+        log_ids = [log['id'] for log in logs]
+    if not logs:
+        return 0
+    
+    block = {
+        "id": str(uuid.uuid4()),
+        "cooperative_id": coop_id,
+        "month": month,
+        "count": len(logs),
+        "log_ids": log_ids,
+        "archived_at": datetime.now(timezone.utc).isoformat(),
+        **encode_archive_block(logs)
+    }
+    totals = production_totals(logs)
+    
+    async def move(session=None):
+        await db.production_log_archive.insert_one(block, session=session)
+        summary = await db.production_log_monthly.find_one_and_update(
+            {"cooperative_id": coop_id, "month": month},
+            {
+                "$inc": totals,
+                # Earliest losses of the month, so the stats baseline survives archiving
+                "$push": {"baseline_logs": {
+                    "$each": [{"date": log['date'], "loss_percent": log.get('post_harvest_loss_percent') or 0} for log in logs],
+                    "$sort": {"date": 1},
+                    "$slice": STATS_BASELINE_LOGS
+                }}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        await db.production_log_monthly.update_one(
+            {"cooperative_id": coop_id, "month": month},
+            {"$set": {**monthly_figures(summary), "updated_at": datetime.now(timezone.utc).isoformat()}},
+            session=session
+        )
+        await db.production_logs.delete_many({"id": {"$in": log_ids}}, session=session)
+    
+    if await supports_transactions():
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                await move(session)
+    else:
+        await move()
+    return len(logs)
+
+def archived_month_summary(logs: list) -> dict:
+    """Monthly summary fields for all of a cooperative-month's archived logs, as archive_log_month accumulates them"""
+    totals = production_totals(logs)
+    baseline = sorted(
+        ({"date": log['date'], "loss_percent": log.get('post_harvest_loss_percent') or 0} for log in logs),
+        key=lambda entry: entry['date']
+    )
+    return {**totals, **monthly_figures(totals), "baseline_logs": baseline[:STATS_BASELINE_LOGS]}
+
+async def remove_archived_logs(block_query: dict, remove) -> tuple:
+    """
+    Delete the archived logs in blocks matching `block_query` for which
+    `remove(log)` is true, with their nonconformities.
+    
+    Blocks are rewritten without them and each affected monthly summary is
+    recomputed from the month's remaining archived logs. Without transactions
+    the summaries are written before the blocks, so repeating an interrupted
+    delete finds the same logs again and ends up consistent.
+    Returns (removed logs, nonconformities deleted).
+    """
+    affected = set()
+    for block in await db.production_log_archive.find(block_query, {"_id": 0}).to_list(None):
+        if any(remove(log) for log in decode_archive_block(block)):
+            affected.add((block['cooperative_id'], block['month']))
+    if not affected:
+        return [], 0
+    
+    removed = []
+    kept_by_month = {key: [] for key in affected}
+    rewrites = []
+    month_blocks = await db.production_log_archive.find(
+        {"$or": [{"cooperative_id": coop_id, "month": month} for coop_id, month in sorted(affected)]}, {"_id": 0}
+    ).to_list(None)
+    for block in month_blocks:
+        kept = []
+        for log in decode_archive_block(block):
+            (removed if remove(log) else kept).append(log)
+        kept_by_month[(block['cooperative_id'], block['month'])] += kept
+        if len(kept) < block['count']:
+            rewrites.append((block, kept))
+    
+    async def write(session=None) -> int:
+        deleted_ncs = await delete_synced(
+            "nonconformities", {"production_log_id": {"$in": [log['id'] for log in removed]}}, session=session
+        )
+        updated_at = datetime.now(timezone.utc).isoformat()
+        for (coop_id, month), kept in kept_by_month.items():
+            month_filter = {"cooperative_id": coop_id, "month": month}
+            if kept:
+                await db.production_log_monthly.update_one(
+                    month_filter, {"$set": {**archived_month_summary(kept), "updated_at": updated_at}}, session=session
+                )
+            else:
+                await db.production_log_monthly.delete_one(month_filter, session=session)
+        for block, kept in rewrites:
+            if kept:
+                replacement = {key: value for key, value in block.items() if key not in ("data", "logs")}
+                replacement.update(count=len(kept), log_ids=[log['id'] for log in kept], **encode_archive_block(kept))
+                await db.production_log_archive.replace_one({"id": block['id']}, replacement, session=session)
+            else:
+                await db.production_log_archive.delete_one({"id": block['id']}, session=session)
+        await record_sync_deletions("production_logs", removed, session=session)
+        return deleted_ncs
+    
+    if await supports_transactions():
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                deleted_ncs = await write(session)
+    else:
+        deleted_ncs = await write()
+    return removed, deleted_ncs
+
+async def tier_production_logs() -> dict:
+    """Archive every complete month older than the hot window, one cooperative-month at a time"""
+    cutoff = hot_tier_start()
+    cursor = db.production_logs.find(
+        {"date": {"$lt": to_utc_iso(cutoff)}}, {"_id": 0}
+    ).sort([("cooperative_id", 1), ("date", 1)])
+    
+    archived = 0
+    months = 0
+    pending_key, pending = None, []
+    async for log in cursor:
+        key = (log['cooperative_id'], log_month(log['date']))
+        if key != pending_key and pending:
+            archived += await archive_log_month(*pending_key, pending)
+            months += 1
+            pending = []
+        pending_key = key
+        pending.append(log)
+    if pending:
+        archived += await archive_log_month(*pending_key, pending)
+        months += 1
+    
+    if archived:
+        invalidate_cooperative_stats()
+        invalidate_forecast()
+        columnar_store.invalidate()
+    return {"hot_tier_start": cutoff.isoformat(), "archived_logs": archived, "months": months}
+
+@api_router.get("/cooperatives/{coop_id}/monthly")
+async def get_cooperative_monthly(coop_id: str, current_user: dict = Depends(get_current_user)):
+    """Monthly production series: archived summaries for old months, raw logs for the hot window"""
+    projection = {"_id": 0, "date": 1, "total_production": 1, "post_harvest_loss_kg": 1,
+                  "post_harvest_loss_percent": 1, "grade_a_percent": 1, "grade_b_percent": 1}
+    source = analytics_db()
+    summaries, hot_logs = await asyncio.gather(
+        get_monthly_summaries([coop_id], source),
+        source.production_logs.find({"cooperative_id": coop_id}, projection).to_list(None)
+    )
+    
+    by_month = {}
+    for log in hot_logs:
+        by_month.setdefault(log_month(log['date']), []).append(log)
+    months = {summary['month']: add_totals(summary) for summary in summaries}
+    archived_months = set(months)
+    for month, logs in by_month.items():
+        # A month can straddle tiers when late logs arrive for an archived month
+        months[month] = add_totals(months.get(month, {}), production_totals(logs))
+    
+    return [
+        {"month": month, "archived": month in archived_months, **monthly_figures(totals)}
+        for month, totals in sorted(months.items())
+    ]
+
+# ============= COLUMNAR LOG STORE =============
+
+COLUMNAR_FLOAT_FIELDS = (
+    "total_production", "grade_a_percent", "grade_b_percent", "post_harvest_loss_percent", "post_harvest_loss_kg"
+)
+COLUMNAR_PROJECTION = {"_id": 1, "id": 1, "date": 1, "energy_use": 1, **{field: 1 for field in COLUMNAR_FLOAT_FIELDS}}
+# Log ids, their row index and the ObjectId map, per row, on top of the arrays
+COLUMNAR_ROW_OVERHEAD_BYTES = 250
+BREAKDOWN_GROUPS = ("energy_use", "month", "cooperative")
+
+def to_utc_datetime64(date) -> np.datetime64:
+    value = datetime.fromisoformat(date) if isinstance(date, str) else date
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "us")
+
+class LogColumns:
+    """One cooperative's production logs as parallel NumPy arrays (row order is arbitrary)"""
+    
+    def __init__(self, capacity: int = 64):
+        self.size = 0
+        self.ids: List[str] = []
+        self.rows: dict = {}  # log id -> row
+        self.date = np.empty(capacity, dtype="datetime64[us]")
+        self.energy = np.empty(capacity, dtype=np.uint8)  # codes into ColumnarLogStore.energy_labels
+        self.values = {field: np.empty(capacity) for field in COLUMNAR_FLOAT_FIELDS}
+    
+    @property
+    def nbytes(self) -> int:
+        arrays = self.date.nbytes + self.energy.nbytes + sum(column.nbytes for column in self.values.values())
+        return arrays + self.size * COLUMNAR_ROW_OVERHEAD_BYTES
+    
+    def _grow(self):
+        capacity = len(self.date) * 2
+        self.date = np.resize(self.date, capacity)
+        self.energy = np.resize(self.energy, capacity)
+        self.values = {field: np.resize(column, capacity) for field, column in self.values.items()}
+    
+    def upsert(self, log: dict, energy_code: int):
+        row = self.rows.get(log['id'])
+        if row is None:
+            if self.size == len(self.date):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.ids.append(log['id'])
+            self.rows[log['id']] = row
+        self.date[row] = to_utc_datetime64(log['date'])
+        self.energy[row] = energy_code
+        for field, column in self.values.items():
+            column[row] = log.get(field) or 0.0
+    
+    def remove(self, log_id: str) -> bool:
+        """Swap the last row into the removed one so the arrays stay dense"""
+        row = self.rows.pop(log_id, None)
+        if row is None:
+            return False
+        last = self.size - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+            self.date[row] = self.date[last]
+            self.energy[row] = self.energy[last]
+            for column in self.values.values():
+                column[row] = column[last]
+        self.ids.pop()
+        self.size = last
+        return True
+    
+    def column(self, field: str) -> np.ndarray:
+        if field == "date":
+            return self.date[:self.size]
+        if field == "energy_use":
+            return self.energy[:self.size]
+        return self.values[field][:self.size]
+    
+    def latest(self, n: int) -> np.ndarray:
+        """Rows of the `n` most recent logs, newest first"""
+        dates = self.column("date")
+        if len(dates) > n:
+            rows = np.argpartition(dates, len(dates) - n)[-n:]
+        else:
+            rows = np.arange(len(dates))
+        return rows[np.argsort(dates[rows])[::-1]]
+
+class ColumnarLogStore:
+    """
+    In-process columnar copy of the hot production logs, for vectorised analytics.
+    
+    Cooperatives are loaded lazily on first use and kept in LRU order within
+    COLUMNAR_STORE_MAX_BYTES; a cooperative that alone exceeds the budget is
+    never cached and its queries go to Mongo. Writes made by this worker are
+    applied directly; with COLUMNAR_STORE_CHANGE_STREAM a change stream also
+    applies writes from other workers (replica sets only).
+    """
+    
+    def __init__(self, enabled: bool, max_bytes: int):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._columns: "OrderedDict[str, LogColumns]" = OrderedDict()
+        self._versions: dict = {}  # coop_id -> bumped on every change, so racing loads are not cached
+        self._object_ids: dict = {}  # Mongo _id -> (coop_id, log id), to apply change-stream deletes
+        self.energy_labels: List[str] = list(ENERGY_BANDS)
+        self._energy_codes = {label: code for code, label in enumerate(self.energy_labels)}
+        self._watch_task: Optional[asyncio.Task] = None
+        self.watching = False
+        self.loads = 0
+        self.evictions = 0
+        self.oversized = 0
+        self.changes_applied = 0
+    
+    def energy_code(self, label: Optional[str]) -> int:
+        label = label or "Unknown"
+        code = self._energy_codes.get(label)
+        if code is None:
+            code = len(self.energy_labels)
+            self.energy_labels.append(label)
+            self._energy_codes[label] = code
+        return code
+    
+    async def columns(self, coop_id: str) -> Optional[LogColumns]:
+        """The cooperative's columns, loading them if needed; None when disabled or over budget"""
+        if not self.enabled:
+            return None
+        columns = self._columns.get(coop_id)
+        if columns is not None:
+            self._columns.move_to_end(coop_id)
+            return columns
+        return await single_flight.do(("columnar/load", coop_id), partial(self._load, coop_id))
+    
+    async def _load(self, coop_id: str) -> Optional[LogColumns]:
+        version = self._versions.get(coop_id, 0)
+        ids, object_ids, dates, energy = [], [], [], []
+        values = {field: [] for field in COLUMNAR_FLOAT_FIELDS}
+        async for log in db.production_logs.find({"cooperative_id": coop_id}, COLUMNAR_PROJECTION).batch_size(5000):
+            ids.append(log['id'])
+            object_ids.append(log['_id'])
+            dates.append(to_utc_datetime64(log['date']))
+            energy.append(self.energy_code(log.get('energy_use')))
+            for field, column in values.items():
+                column.append(log.get(field) or 0.0)
+        self.loads += 1
+        
+        columns = LogColumns(capacity=max(len(ids), 64))
+        columns.size = len(ids)
+        columns.ids = ids
+        columns.rows = {log_id: row for row, log_id in enumerate(ids)}
+        columns.date[:len(ids)] = dates
+        columns.energy[:len(ids)] = energy
+        for field, column in values.items():
+            columns.values[field][:len(ids)] = column
+        
+        if columns.nbytes > self.max_bytes:
+            self.oversized += 1
+            return None
+        if self._versions.get(coop_id, 0) == version:
+            self._columns[coop_id] = columns
+            self._object_ids.update((object_id, (coop_id, log_id)) for object_id, log_id in zip(object_ids, ids))
+            self._enforce_budget()
+        return columns
+    
+    def _enforce_budget(self):
+        while len(self._columns) > 1 and sum(columns.nbytes for columns in self._columns.values()) > self.max_bytes:
+            self._columns.popitem(last=False)
+            self.evictions += 1
+    
+    def upsert(self, log: dict):
+        coop_id = log['cooperative_id']
+        self._versions[coop_id] = self._versions.get(coop_id, 0) + 1
+        columns = self._columns.get(coop_id)
+        if columns is None:
+            return
+        columns.upsert(log, self.energy_code(log.get('energy_use')))
+        if '_id' in log:
+            self._object_ids[log['_id']] = (coop_id, log['id'])
+        self._enforce_budget()
+    
+    def remove(self, coop_id: str, log_ids: List[str]):
+        self._versions[coop_id] = self._versions.get(coop_id, 0) + 1
+        columns = self._columns.get(coop_id)
+        if columns is not None:
+            for log_id in log_ids:
+                columns.remove(log_id)
+    
+    def invalidate(self, coop_id: Optional[str] = None):
+        """Drop cached columns (all of them when no id is given); they reload on next use"""
+        if coop_id is None:
+            for known in set(self._versions) | set(self._columns):
+                self._versions[known] = self._versions.get(known, 0) + 1
+            self._columns.clear()
+            self._object_ids.clear()
+        else:
+            self._versions[coop_id] = self._versions.get(coop_id, 0) + 1
+            self._columns.pop(coop_id, None)
+    
+    def apply_change(self, change: dict):
+        operation = change['operationType']
+        if operation in ('insert', 'update', 'replace'):
+            if change.get('fullDocument'):
+                self.upsert(change['fullDocument'])
+        elif operation == 'delete':
+            known = self._object_ids.pop(change['documentKey']['_id'], None)
+            if known:
+                self.remove(known[0], [known[1]])
+        else:  # drop, rename, invalidate
+            self.invalidate()
+        self.changes_applied += 1
+    
+    async def _watch(self):
+        resume_after = None
+        while True:
+            try:
+                async with db.production_logs.watch(full_document='updateLookup', resume_after=resume_after) as stream:
+                    self.watching = True
+                    async for change in stream:
+                        self.apply_change(change)
+                        resume_after = stream.resume_token
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as exc:
+                self.watching = False
+                if exc.code == 40573:  # change streams need a replica set
+                    logger.warning("Columnar store: change streams unavailable, applying this worker's writes only")
+                    return
+                # Resume point lost (e.g. oplog rolled over); start over from fresh loads
+                logger.warning("Columnar store change stream failed, reloading: %s", exc)
+                resume_after = None
+                self.invalidate()
+            except Exception:
+                self.watching = False
+                logger.exception("Columnar store change stream error, retrying")
+            await asyncio.sleep(5)
+    
+    def start(self):
+        if self.enabled and COLUMNAR_STORE_CHANGE_STREAM:
+            self._watch_task = asyncio.create_task(self._watch())
+    
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+            self.watching = False
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "watching": self.watching,
+            "cooperatives": len(self._columns),
+            "rows": sum(columns.size for columns in self._columns.values()),
+            "bytes": sum(columns.nbytes for columns in self._columns.values()),
+            "max_bytes": self.max_bytes,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "oversized": self.oversized,
+            "changes_applied": self.changes_applied,
+            "energy_labels": self.energy_labels
+        }
+
+columnar_store = ColumnarLogStore(COLUMNAR_STORE_ENABLED, COLUMNAR_STORE_MAX_BYTES)
+
+def breakdown_groups(keys: list, counts, total_production, loss_kg, loss_percent_sum, grade_a_sum) -> list:
+    groups = [
+        {
+            "key": key,
+            "logs": int(count),
+            "total_production": round(float(production), 2),
+            "loss_kg": round(float(loss), 2),
+            "avg_loss_percent": round(float(loss_percent) / count, 2),
+            "avg_grade_a_percent": round(float(grade_a) / count, 2)
+        }
+        for key, count, production, loss, loss_percent, grade_a
+        in zip(keys, counts, total_production, loss_kg, loss_percent_sum, grade_a_sum)
+    ]
+    return sorted(groups, key=lambda group: group['key'])
+
+def columnar_breakdown(columns_by_coop: dict, group_by: str, start: Optional[str], end: Optional[str],
+                       min_loss_percent: Optional[float], max_grade_a_percent: Optional[float],
+                       energy_bands: Optional[List[str]]) -> list:
+    """Filter and group already-loaded columns without touching individual rows in Python"""
+    energy_codes = [columnar_store.energy_code(band) for band in energy_bands] if energy_bands else None
+    start_at = to_utc_datetime64(start) if start else None
+    end_at = to_utc_datetime64(end) if end else None
+    
+    keys, selected = [], {field: [] for field in COLUMNAR_FLOAT_FIELDS}
+    for coop_id, columns in columns_by_coop.items():
+        mask = np.ones(columns.size, dtype=bool)
+        if start_at is not None:
+            mask &= columns.column("date") >= start_at
+        if end_at is not None:
+            mask &= columns.column("date") < end_at
+        if min_loss_percent is not None:
+            mask &= columns.column("post_harvest_loss_percent") > min_loss_percent
+        if max_grade_a_percent is not None:
+            mask &= columns.column("grade_a_percent") < max_grade_a_percent
+        if energy_codes is not None:
+            mask &= np.isin(columns.column("energy_use"), energy_codes)
+        
+        if group_by == "energy_use":
+            keys.append(columns.column("energy_use")[mask])
+        elif group_by == "month":
+            keys.append(columns.column("date")[mask].astype("datetime64[M]"))
+        else:
+            keys.append(np.full(int(mask.sum()), coop_id, dtype=object))
+        for field in COLUMNAR_FLOAT_FIELDS:
+            selected[field].append(columns.column(field)[mask])
+    
+    if not keys or not sum(len(part) for part in keys):
+        return []
+    unique, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    
+    def total(field):
+        return np.bincount(inverse, weights=np.concatenate(selected[field]), minlength=len(unique))
+    
+    if group_by == "energy_use":
+        labels = [columnar_store.energy_labels[code] for code in unique]
+    elif group_by == "month":
+        labels = list(np.datetime_as_string(unique, unit="M"))
+    else:
+        labels = list(unique)
+    return breakdown_groups(
+        labels, np.bincount(inverse, minlength=len(unique)), total("total_production"),
+        total("post_harvest_loss_kg"), total("post_harvest_loss_percent"), total("grade_a_percent")
+    )
+
+async def mongo_breakdown(query: dict, group_by: str) -> list:
+    """The same breakdown as columnar_breakdown, as a Mongo aggregation"""
+    key = {"energy_use": {"$ifNull": ["$energy_use", "Unknown"]}, "month": {"$substrCP": ["$date", 0, 7]}, "cooperative": "$cooperative_id"}[group_by]
+    rows = await analytics_db().production_logs.aggregate([
+        {"$match": query},
+        {"$group": {
+            "_id": key,
+            "logs": {"$sum": 1},
+            "total_production": {"$sum": "$total_production"},
+            "loss_kg": {"$sum": "$post_harvest_loss_kg"},
+            "loss_percent_sum": {"$sum": "$post_harvest_loss_percent"},
+            "grade_a_sum": {"$sum": "$grade_a_percent"}
+        }}
+    ]).to_list(None)
+    return breakdown_groups(
+        [row['_id'] for row in rows],
+        [row['logs'] for row in rows],
+        [row['total_production'] for row in rows],
+        [row['loss_kg'] for row in rows],
+        [row['loss_percent_sum'] for row in rows],
+        [row['grade_a_sum'] for row in rows]
+    )
+
+@api_router.get("/production-logs/breakdown")
+async def get_production_breakdown(
+    group_by: str = "energy_use",
+    cooperative_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    min_loss_percent: Optional[float] = None,
+    max_grade_a_percent: Optional[float] = None,
+    energy_use: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Production, loss and grade totals per energy band, month or cooperative over the hot logs"""
+    if group_by not in BREAKDOWN_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(BREAKDOWN_GROUPS)}")
+    energy_bands = None
+    if energy_use:
+        energy_bands = [band.strip().capitalize() for band in energy_use.split(',') if band.strip()]
+        if not set(energy_bands) <= set(ENERGY_BANDS):
+            raise HTTPException(status_code=400, detail=f"energy_use must be one of: {', '.join(ENERGY_BANDS)}")
+    
+    if current_user['role'] == 'manager' and current_user.get('cooperative_id'):
+        cooperative_id = current_user['cooperative_id']
+    start = to_utc_iso(start_date) if start_date else None
+    end = to_utc_iso(end_date) if end_date else None
+    
+    if columnar_store.enabled:
+        coop_ids = [cooperative_id] if cooperative_id else await db.cooperatives.distinct("id")
+        loaded = await asyncio.gather(*(columnar_store.columns(coop_id) for coop_id in coop_ids))
+        if all(columns is not None for columns in loaded):
+            groups = columnar_breakdown(
+                dict(zip(coop_ids, loaded)), group_by, start, end, min_loss_percent, max_grade_a_percent, energy_bands
+            )
+            return {"group_by": group_by, "source": "columnar", "groups": groups}
+    
+    query = {}
+    if cooperative_id:
+        query['cooperative_id'] = cooperative_id
+    if start or end:
+        query['date'] = {**({"$gte": start} if start else {}), **({"$lt": end} if end else {})}
+    if min_loss_percent is not None:
+        query['post_harvest_loss_percent'] = {"$gt": min_loss_percent}
+    if max_grade_a_percent is not None:
+        query['grade_a_percent'] = {"$lt": max_grade_a_percent}
+    if energy_bands:
+        query['energy_use'] = {"$in": energy_bands}
+    return {"group_by": group_by, "source": "mongo", "groups": await mongo_breakdown(query, group_by)}
+
+@api_router.get("/columnar-store")
+async def get_columnar_store_stats(current_user: dict = Depends(get_current_user)):
+    """Memory use and hit counters of the in-process columnar store (officer only)"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can view the columnar store")
+    return columnar_store.stats()
+
 # ============= KPI & STATS ROUTES =============
 
+# ----- Single-flight -----
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical computations.
+    
+    The first caller for a key starts the computation as its own task and
+    every caller arriving before it finishes awaits that same task, so a burst
+    of identical requests costs one set of queries. A disconnecting caller
+    does not cancel the shared work. With a `ttl` the result is also served
+    to later callers for that many seconds.
+    """
+    
+    def __init__(self):
+        self._in_flight: dict = {}
+        self._results: dict = {}  # key -> (expires_at_monotonic, result)
+        self.computed = 0
+        self.coalesced = 0
+        self.cached = 0
+    
+    async def do(self, key: tuple, factory, ttl: float = 0.0):
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.cached += 1
+                return cached[1]
+            del self._results[key]
+        
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(partial(self._finished, key, ttl))
+            self.computed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+    
+    def _finished(self, key: tuple, ttl: float, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if ttl > 0 and not task.cancelled() and task.exception() is None:
+            self._results[key] = (time.monotonic() + ttl, task.result())
+    
+    def forget_results(self):
+        self._results.clear()
+
+single_flight = SingleFlight()
+
 @api_router.get("/kpis/cooperative/{coop_id}")
 async def get_cooperative_kpis(coop_id: str, current_user: dict = Depends(get_current_user)):
-    # Get recent production logs
-    logs = await db.production_logs.find(
-        {"cooperative_id": coop_id},
-        {"_id": 0}
-    ).sort("date", -1).limit(10).to_list(10)
+    return await cooperative_kpis(coop_id)
+
+async def cooperative_kpis(coop_id: str) -> dict:
+    # KPIs are the same for every role, so the cooperative alone is the key
+    return await single_flight.do(
+        ("kpis/cooperative", coop_id, analytics_read_mode()),
+        partial(compute_cooperative_kpis, coop_id),
+        KPI_RESULT_TTL_SECONDS
+    )
+
+async def compute_cooperative_kpis(coop_id: str) -> dict:
+    source = analytics_db()
+    columns = await columnar_store.columns(coop_id)
+    if columns is not None:
+        recent = columns.latest(10)
+        production = columns.column("total_production")[recent]
+        loss_percent = columns.column("post_harvest_loss_percent")[recent]
+        grade_a = columns.column("grade_a_percent")[recent]
+    else:
+        # Get recent production logs
+        logs = await source.production_logs.find(
+            {"cooperative_id": coop_id},
+            {"_id": 0}
+        ).sort("date", -1).limit(10).to_list(10)
+        production = [log['total_production'] for log in logs]
+        loss_percent = [log['post_harvest_loss_percent'] for log in logs]
+        grade_a = [log['grade_a_percent'] for log in logs]
     
-    if not logs:
+    if not len(production):
         return {
             "cooperative_id": coop_id,
             "total_production_last_week": 0,
@@ -609,40 +3135,550 @@ async def get_cooperative_kpis(coop_id: str, current_user: dict = Depends(get_cu
             "avg_quality_a": 0
         }
     
-    total_production = sum(log['total_production'] for log in logs)
-    avg_loss = sum(log['post_harvest_loss_percent'] for log in logs) / len(logs)
-    avg_quality_a = sum(log['grade_a_percent'] for log in logs) / len(logs)
+    total_production = sum(production)
+    avg_loss = sum(loss_percent) / len(loss_percent)
+    avg_quality_a = sum(grade_a) / len(grade_a)
     
     # Count open nonconformities
-    open_issues = await db.nonconformities.count_documents({
+    open_issues = await source.nonconformities.count_documents({
         "cooperative_id": coop_id,
         "status": {"$in": ["open", "in_progress"]}
     })
     
     return {
-        "cooperative_id": coop_id,
-        "total_production_last_week": total_production,
-        "avg_loss_percent": round(avg_loss, 2),
-        "open_issues": open_issues,
-        "avg_quality_a": round(avg_quality_a, 2)
+        "cooperative_id": coop_id,
+        "total_production_last_week": total_production,
+        "avg_loss_percent": round(avg_loss, 2),
+        "open_issues": open_issues,
+        "avg_quality_a": round(avg_quality_a, 2)
+    }
+
+@api_router.get("/kpis/overview")
+async def get_overview_kpis(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can view overview")
+    
+    # Officers all see the same overview
+    return await single_flight.do(
+        ("kpis/overview", "officer", analytics_read_mode()), compute_overview_kpis, KPI_RESULT_TTL_SECONDS
+    )
+
+async def compute_overview_kpis() -> list:
+    cooperatives = await analytics_db().cooperatives.find({}, {"_id": 0}).to_list(1000)
+    
+    # Per-cooperative KPI queries are independent, so issue them together
+    all_kpis = await asyncio.gather(*(cooperative_kpis(coop['id']) for coop in cooperatives))
+    
+    overview = []
+    for coop, kpis in zip(cooperatives, all_kpis):
+        overview.append({
+            "cooperative": coop,
+            "kpis": kpis
+        })
+    
+    return overview
+
+# Per-cooperative stats cache: {coop_id: (computed_at_monotonic, stats)}.
+# Entries are dropped whenever a write touches the cooperative's logs, issues
+# or members; the TTL bounds staleness of the trailing window and of writes
+# made through other worker processes.
+_cooperative_stats_cache: dict = {}
+
+def invalidate_cooperative_stats(coop_id: Optional[str] = None):
+    """Drop cached stats for one cooperative, or for all when no id is given"""
+    # Short-lived KPI results come from the same data
+    single_flight.forget_results()
+    if coop_id is None:
+        _cooperative_stats_cache.clear()
+    else:
+        _cooperative_stats_cache.pop(coop_id, None)
+
+def _production_totals_group(key=None) -> dict:
+    """Raw-log counterpart of the monthly summaries: one document of PRODUCTION_TOTAL_FIELDS per key"""
+    return {
+        "$group": {
+            "_id": key,
+            "logs": {"$sum": 1},
+            "total_production": {"$sum": "$total_production"},
+            "loss_kg": {"$sum": "$post_harvest_loss_kg"},
+            "grade_a_kg": {"$sum": {"$multiply": ["$total_production", {"$divide": ["$grade_a_percent", 100]}]}},
+            "grade_b_kg": {"$sum": {"$multiply": ["$total_production", {"$divide": ["$grade_b_percent", 100]}]}},
+            "loss_percent_sum": {"$sum": "$post_harvest_loss_percent"},
+            "grade_a_percent_sum": {"$sum": "$grade_a_percent"}
+        }
+    }
+
+def _window_stats(totals: dict, issues_resolved: int, baseline_loss_percent: float) -> dict:
+    total_production = totals.get('total_production', 0)
+    loss_kg = totals.get('loss_kg', 0)
+    return {
+        "logs": totals.get('logs', 0),
+        "total_production_kg": round(total_production, 2),
+        "loss_kg": round(loss_kg, 2),
+        "loss_kg_avoided": round(total_production * baseline_loss_percent / 100 - loss_kg, 2),
+        "grade_a_share": round(totals.get('grade_a_kg', 0) / total_production * 100, 2) if total_production else 0,
+        "issues_resolved": issues_resolved
+    }
+
+async def compute_cooperative_stats(coop: dict) -> dict:
+    """Aggregate lifetime and trailing-window stats for one cooperative"""
+    coop_id = coop['id']
+    cutoff = to_utc_iso(datetime.now(timezone.utc) - timedelta(days=STATS_WINDOW_DAYS))
+    
+    log_facets = await db.production_logs.aggregate([
+        {"$match": {"cooperative_id": coop_id}},
+        {"$facet": {
+            "lifetime": [_production_totals_group()],
+            "trailing": [{"$match": {"date": {"$gte": cutoff}}}, _production_totals_group()],
+            "baseline": [
+                {"$sort": {"date": 1}},
+                {"$limit": STATS_BASELINE_LOGS},
+                {"$project": {"_id": 0, "date": 1, "loss_percent": "$post_harvest_loss_percent"}}
+            ]
+        }}
+    ]).to_list(1)
+    nc_facets = await db.nonconformities.aggregate([
+        {"$match": {"cooperative_id": coop_id}},
+        {"$facet": {
+            "open": [{"$match": {"status": {"$in": ["open", "in_progress"]}}}, {"$count": "n"}],
+            "resolved": [{"$match": {"status": "closed"}}, {"$count": "n"}],
+            "resolved_trailing": [{"$match": {"status": "closed", "closed_date": {"$gte": cutoff}}}, {"$count": "n"}]
+        }}
+    ]).to_list(1)
+    total_farmers = await db.users.count_documents({"cooperative_id": coop_id, "role": "farmer"})
+    archived = await get_monthly_summaries([coop_id])
+    
+    logs = log_facets[0] if log_facets else {}
+    ncs = nc_facets[0] if nc_facets else {}
+    # The trailing window is always hot; lifetime adds the archived months
+    lifetime = add_totals((logs.get('lifetime') or [{}])[0], *archived)
+    trailing = (logs.get('trailing') or [{}])[0]
+    
+    def count(facet):
+        return ncs[facet][0]['n'] if ncs.get(facet) else 0
+    
+    # Baseline is the cooperative's configured loss, or the loss it started with
+    if coop.get('baseline_loss_percent') is not None:
+        baseline_loss_percent = coop['baseline_loss_percent']
+    elif archived or logs.get('baseline'):
+        earliest = [entry for summary in archived for entry in summary.get('baseline_logs', [])] + logs.get('baseline', [])
+        earliest = sorted(earliest, key=lambda entry: entry['date'])[:STATS_BASELINE_LOGS]
+        baseline_loss_percent = sum(entry['loss_percent'] or 0 for entry in earliest) / len(earliest)
+    else:
+        baseline_loss_percent = 0
+    
+    return {
+        "cooperative_id": coop_id,
+        "total_farmers": total_farmers,
+        "open_issues": count('open'),
+        "total_logs": lifetime.get('logs', 0),
+        "total_production": round(lifetime.get('total_production', 0), 2),
+        "avg_quality_a": round(lifetime['grade_a_percent_sum'] / lifetime['logs'], 2) if lifetime['logs'] else 0,
+        "avg_loss": round(lifetime['loss_percent_sum'] / lifetime['logs'], 2) if lifetime['logs'] else 0,
+        "baseline_loss_percent": round(baseline_loss_percent, 2),
+        "lifetime": _window_stats(lifetime, count('resolved'), baseline_loss_percent),
+        "trailing": {
+            "days": STATS_WINDOW_DAYS,
+            **_window_stats(trailing, count('resolved_trailing'), baseline_loss_percent)
+        },
+        "computed_at": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.get("/cooperatives/{coop_id}/stats")
+async def get_cooperative_stats(coop_id: str, current_user: dict = Depends(get_current_user)):
+    """Member-facing cooperative stats, served from a per-cooperative cache"""
+    cached = _cooperative_stats_cache.get(coop_id)
+    if cached and time.monotonic() - cached[0] < STATS_CACHE_TTL_SECONDS:
+        return cached[1]
+    
+    return await single_flight.do(("cooperatives/stats", coop_id), partial(refresh_cooperative_stats, coop_id))
+
+async def refresh_cooperative_stats(coop_id: str) -> dict:
+    coop = await db.cooperatives.find_one({"id": coop_id}, {"_id": 0})
+    if not coop:
+        raise HTTPException(status_code=404, detail="Cooperative not found")
+    
+    stats = await compute_cooperative_stats(coop)
+    _cooperative_stats_cache[coop_id] = (time.monotonic(), stats)
+    return stats
+
+# ============= DASHBOARD =============
+
+FARMER_HOME_LOG_LIMIT = 7
+
+class CooperativeOverview(BaseModel):
+    cooperative: Cooperative
+    kpis: dict
+
+class DashboardResponse(BaseModel):
+    """One page's data; documents go through their public models so storage fields stay internal"""
+    role: str
+    view: str
+    overview: Optional[List[CooperativeOverview]] = None
+    kpis: Optional[dict] = None
+    cooperative: Optional[Cooperative] = None
+    cooperatives: Optional[List[Cooperative]] = None
+    production_logs: Optional[List[ProductionLog]] = None
+    nonconformities: Optional[List[Nonconformity]] = None
+    
+    @model_serializer(mode="wrap")
+    def omit_other_views(self, handler):
+        """Leave out the keys the requested view does not set, but keep nested documents whole"""
+        return {key: value for key, value in handler(self).items() if key in self.model_fields_set}
+
+async def _none():
+    return None
+
+async def get_recent_cooperative_logs(coop_id: str, limit: int) -> list:
+    logs = await db.production_logs.find(
+        {"cooperative_id": coop_id},
+        {"_id": 0}
+    ).sort("date", -1).limit(limit).to_list(limit)
+    for log in logs:
+        if isinstance(log.get('date'), str):
+            log['date'] = datetime.fromisoformat(log['date'])
+        if isinstance(log.get('created_at'), str):
+            log['created_at'] = datetime.fromisoformat(log['created_at'])
+    return logs
+
+@api_router.get("/dashboard", response_model=DashboardResponse)
+async def get_dashboard(
+    view: str = "home",
+    current_user: dict = Depends(get_current_user)
+):
+    """Everything a page needs in one response, gathered concurrently.
+
+    view=home returns the landing page data for the caller's role;
+    view=data-entries and view=issues return the list plus cooperatives.
+    """
+    role = current_user['role']
+    coop_id = current_user.get('cooperative_id')
+    
+    if view == "home":
+        if role == 'officer':
+            overview = await get_overview_kpis(current_user)
+            return {"role": role, "view": view, "overview": overview}
+        
+        if role == 'manager':
+            cooperative, kpis = await asyncio.gather(
+                get_cooperative(coop_id, current_user) if coop_id else _none(),
+                get_cooperative_kpis(coop_id, current_user) if coop_id else _none()
+            )
+            return {"role": role, "view": view, "cooperative": cooperative, "kpis": kpis}
+        
+        cooperative, production_logs = await asyncio.gather(
+            get_cooperative(coop_id, current_user) if coop_id else _none(),
+            get_recent_cooperative_logs(coop_id, FARMER_HOME_LOG_LIMIT) if coop_id else _none()
+        )
+        return {
+            "role": role,
+            "view": view,
+            "cooperative": cooperative,
+            "production_logs": production_logs or []
+        }
+    
+    if view == "data-entries":
+        production_logs, cooperatives = await asyncio.gather(
+            get_production_logs(current_user=current_user),
+            get_cooperatives(current_user=current_user)
+        )
+        return {"role": role, "view": view, "production_logs": production_logs, "cooperatives": cooperatives}
+    
+    if view == "issues":
+        nonconformities, cooperatives = await asyncio.gather(
+            get_nonconformities(current_user=current_user),
+            get_cooperatives(current_user=current_user)
+        )
+        return {"role": role, "view": view, "nonconformities": nonconformities, "cooperatives": cooperatives}
+    
+    raise HTTPException(status_code=400, detail=f"Unknown dashboard view: {view}")
+
+# ============= FORECASTING =============
+
+FORECAST_METRICS = ("total_production", "post_harvest_loss_percent")
+FORECAST_Z = 1.96  # 95% prediction interval
+FORECAST_RIDGE = 1e-6
+
+# Fitted parameters per cooperative: {coop_id: (fitted_at_monotonic, fit or None)}.
+# Entries are dropped whenever a write through this process changes the
+# cooperative's logs; the TTL bounds staleness of writes made through other
+# worker processes.
+_forecast_cache: dict = {}
+
+def invalidate_forecast(coop_id: Optional[str] = None):
+    """Force a refit for one cooperative, or for all when no id is given"""
+    if coop_id is None:
+        _forecast_cache.clear()
+    else:
+        _forecast_cache.pop(coop_id, None)
+
+def forecast_design(t: np.ndarray) -> np.ndarray:
+    """Trend plus one seasonal harmonic: [1, t, sin, cos]"""
+    angle = 2 * np.pi * t / FORECAST_SEASON_LENGTH
+    return np.stack([np.ones_like(t), t, np.sin(angle), np.cos(angle)], axis=-1)
+
+FORECAST_MIN_POINTS = forecast_design(np.zeros(1)).shape[-1] + 2
+
+def fit_forecast_batch(y: np.ndarray, mask: np.ndarray) -> tuple:
+    """Weighted least squares fit for every cooperative and metric at once.
+
+    `y` is (cooperatives, length, metrics), right-aligned so each series ends
+    at t = length - 1; `mask` is (cooperatives, length) and zero on padding.
+    Returns (beta, sigma, cov) with cov the unscaled parameter covariance.
+    """
+    X = forecast_design(np.arange(y.shape[1], dtype=float))
+    n_params = X.shape[1]
+    xtwx = np.einsum('cl,lp,lq->cpq', mask, X, X) + FORECAST_RIDGE * np.eye(n_params)
+    xtwy = np.einsum('cl,lp,clk->cpk', mask, X, y)
+    beta = np.linalg.solve(xtwx, xtwy)
+    residuals = (y - np.einsum('lp,cpk->clk', X, beta)) * mask[..., None]
+    dof = np.maximum(mask.sum(axis=1) - n_params, 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / dof[:, None])
+    return beta, sigma, np.linalg.inv(xtwx)
+
+async def refit_forecasts(coop_ids: List[str]):
+    """Fit every listed cooperative's series in one NumPy batch and cache the parameters"""
+    projection = {"_id": 0, "cooperative_id": 1, "date": 1, **{metric: 1 for metric in FORECAST_METRICS}}
+    
+    async def recent_logs(coop_id: str) -> list:
+        # Walks the (cooperative_id, date) index backwards and stops after the window
+        logs = await db.production_logs.find(
+            {"cooperative_id": coop_id}, projection
+        ).sort("date", -1).limit(FORECAST_HISTORY).to_list(FORECAST_HISTORY)
+        return logs[::-1]
+    
+    series = dict(zip(coop_ids, await asyncio.gather(*(recent_logs(coop_id) for coop_id in coop_ids))))
+    
+    fitted_at = time.monotonic()
+    fit_ids = []
+    for coop_id, coop_logs in series.items():
+        if not coop_logs:
+            continue
+        if len(coop_logs) < FORECAST_MIN_POINTS:
+            _forecast_cache[coop_id] = (fitted_at, None)
+        else:
+            fit_ids.append(coop_id)
+    if not fit_ids:
+        return
+    
+    length = max(len(series[coop_id]) for coop_id in fit_ids)
+    y = np.zeros((len(fit_ids), length, len(FORECAST_METRICS)))
+    mask = np.zeros((len(fit_ids), length))
+    for c, coop_id in enumerate(fit_ids):
+        coop_logs = series[coop_id]
+        offset = length - len(coop_logs)
+        mask[c, offset:] = 1
+        y[c, offset:] = [[float(log.get(metric) or 0) for metric in FORECAST_METRICS] for log in coop_logs]
+    
+    beta, sigma, cov = fit_forecast_batch(y, mask)
+    
+    for c, coop_id in enumerate(fit_ids):
+        dates = []
+        for log in series[coop_id]:
+            date = datetime.fromisoformat(log['date']) if isinstance(log['date'], str) else log['date']
+            dates.append(date if date.tzinfo else date.replace(tzinfo=timezone.utc))
+        gaps = np.diff([date.timestamp() for date in dates]) / 86400
+        _forecast_cache[coop_id] = (fitted_at, {
+            "beta": beta[c],
+            "sigma": sigma[c],
+            "cov": cov[c],
+            "t_last": length - 1,
+            "history_points": len(dates),
+            "last_date": dates[-1],
+            "cadence_days": float(np.median(gaps)) if len(gaps) else 0.0
+        })
+
+@api_router.get("/forecast")
+async def get_forecast(
+    periods: int = 4,
+    cooperative_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Next-period production and loss forecasts with 95% prediction intervals"""
+    if not 1 <= periods <= FORECAST_MAX_PERIODS:
+        raise HTTPException(status_code=400, detail=f"periods must be between 1 and {FORECAST_MAX_PERIODS}")
+    
+    if current_user['role'] == 'manager' and current_user.get('cooperative_id'):
+        coop_ids = [current_user['cooperative_id']]
+    elif cooperative_id:
+        coop_ids = [cooperative_id]
+    else:
+        coop_ids = [coop['id'] for coop in await db.cooperatives.find({}, {"_id": 0, "id": 1}).to_list(1000)]
+    
+    started = time.perf_counter()
+    now = time.monotonic()
+    stale = [
+        coop_id for coop_id in coop_ids
+        if coop_id not in _forecast_cache or now - _forecast_cache[coop_id][0] >= FORECAST_CACHE_TTL_SECONDS
+    ]
+    if stale:
+        await refit_forecasts(stale)
+    
+    fitted = [coop_id for coop_id in coop_ids if _forecast_cache.get(coop_id, (None, None))[1]]
+    forecasts = {coop_id: None for coop_id in coop_ids}
+    if fitted:
+        fits = [_forecast_cache[coop_id][1] for coop_id in fitted]
+        steps = np.arange(1, periods + 1, dtype=float)
+        t = np.array([fit['t_last'] for fit in fits], dtype=float)[:, None] + steps
+        X = forecast_design(t)  # (cooperatives, periods, params)
+        beta = np.stack([fit['beta'] for fit in fits])
+        cov = np.stack([fit['cov'] for fit in fits])
+        sigma = np.stack([fit['sigma'] for fit in fits])
+        
+        predicted = np.einsum('cnp,cpk->cnk', X, beta)
+        spread = FORECAST_Z * sigma[:, None, :] * np.sqrt(1 + np.einsum('cnp,cpq,cnq->cn', X, cov, X))[..., None]
+        lower = predicted - spread
+        upper = predicted + spread
+        
+        for c, (coop_id, fit) in enumerate(zip(fitted, fits)):
+            result = {
+                "history_points": fit['history_points'],
+                "cadence_days": round(fit['cadence_days'], 2)
+            }
+            for k, metric in enumerate(FORECAST_METRICS):
+                ceiling = 100 if metric.endswith('_percent') else np.inf
+                result[metric] = [
+                    {
+                        "period": n + 1,
+                        "date": (fit['last_date'] + timedelta(days=fit['cadence_days'] * (n + 1))).isoformat(),
+                        "value": round(float(np.clip(predicted[c, n, k], 0, ceiling)), 2),
+                        "lower": round(float(np.clip(lower[c, n, k], 0, ceiling)), 2),
+                        "upper": round(float(np.clip(upper[c, n, k], 0, ceiling)), 2)
+                    }
+                    for n in range(periods)
+                ]
+            forecasts[coop_id] = result
+    
+    return {
+        "periods": periods,
+        "season_length": FORECAST_SEASON_LENGTH,
+        "confidence": 0.95,
+        "refitted": len(stale),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "forecasts": [
+            {"cooperative_id": coop_id, **(forecast or {"insufficient_history": True})}
+            for coop_id, forecast in forecasts.items()
+        ]
     }
 
-@api_router.get("/kpis/overview")
-async def get_overview_kpis(current_user: dict = Depends(get_current_user)):
-    if current_user['role'] != 'officer':
-        raise HTTPException(status_code=403, detail="Only officers can view overview")
+# ============= PEER BENCHMARKING =============
+
+# Benchmarked metrics and whether a higher value is better
+PEER_BENCHMARK_METRICS = {
+    "avg_loss_percent": False,
+    "grade_a_share": True,
+    "avg_resolution_days": False,
+}
+
+def peer_percentiles(values: np.ndarray, higher_is_better: bool) -> np.ndarray:
+    """Percentile rank of each value among its peers, 100 = best and 0 = worst"""
+    scores = values if higher_is_better else -values
+    better_than = (scores[:, None] > scores[None, :]).sum(axis=1)
+    ties = (scores[:, None] == scores[None, :]).sum(axis=1) - 1
+    return (better_than + 0.5 * ties) / (len(values) - 1) * 100
+
+async def rebuild_peer_benchmarks() -> dict:
+    """Precompute each cooperative's percentile against peers with the same product"""
+    source = analytics_db()
+    cooperatives = await source.cooperatives.find({}, {"_id": 0, "id": 1, "name": 1, "product": 1}).to_list(None)
+    log_totals = await source.production_logs.aggregate([_production_totals_group("$cooperative_id")]).to_list(None)
+    totals = {row['_id']: add_totals(row) for row in log_totals}
+    for summary in await get_monthly_summaries(source=source):
+        totals[summary['cooperative_id']] = add_totals(totals.get(summary['cooperative_id'], {}), summary)
+    resolution_metrics = await source.nonconformities.aggregate([
+        {"$match": {"status": "closed", "closed_date": {"$ne": None}}},
+        {"$group": {
+            "_id": "$cooperative_id",
+            "avg_resolution_ms": {"$avg": {"$subtract": [
+                {"$dateFromString": {"dateString": "$closed_date"}},
+                {"$dateFromString": {"dateString": "$date"}}
+            ]}}
+        }}
+    ]).to_list(None)
     
-    cooperatives = await db.cooperatives.find({}, {"_id": 0}).to_list(1000)
+    metrics = {coop['id']: dict.fromkeys(PEER_BENCHMARK_METRICS) for coop in cooperatives}
+    for coop_id, row in totals.items():
+        if coop_id in metrics and row['logs']:
+            metrics[coop_id]['avg_loss_percent'] = row['loss_percent_sum'] / row['logs']
+            if row['total_production']:
+                metrics[coop_id]['grade_a_share'] = row['grade_a_kg'] / row['total_production'] * 100
+    for row in resolution_metrics:
+        if row['_id'] in metrics and row['avg_resolution_ms'] is not None:
+            metrics[row['_id']]['avg_resolution_days'] = row['avg_resolution_ms'] / 86400000
     
-    overview = []
+    by_product = {}
     for coop in cooperatives:
-        kpis = await get_cooperative_kpis(coop['id'], current_user)
-        overview.append({
-            "cooperative": coop,
-            "kpis": kpis
-        })
+        by_product.setdefault(coop['product'], []).append(coop)
     
-    return overview
+    computed_at = datetime.now(timezone.utc).isoformat()
+    for product, peers in by_product.items():
+        results = {coop['id']: {} for coop in peers}
+        distribution = {}
+        for metric, higher_is_better in PEER_BENCHMARK_METRICS.items():
+            ranked = [coop['id'] for coop in peers if metrics[coop['id']][metric] is not None]
+            values = np.array([metrics[coop_id][metric] for coop_id in ranked], dtype=float)
+            percentiles = peer_percentiles(values, higher_is_better) if len(values) > 1 else [None] * len(values)
+            for coop_id, value, percentile in zip(ranked, values, percentiles):
+                results[coop_id][metric] = {
+                    "value": round(float(value), 2),
+                    "percentile": None if percentile is None else round(float(percentile), 1)
+                }
+            distribution[metric] = (
+                dict(zip(("p10", "p25", "p50", "p75", "p90"),
+                         (round(float(v), 2) for v in np.percentile(values, [10, 25, 50, 75, 90]))))
+                if len(values) else None
+            )
+        
+        for coop in peers:
+            await db.peer_benchmarks.update_one(
+                {"cooperative_id": coop['id']},
+                {"$set": {
+                    "cooperative_id": coop['id'],
+                    "cooperative_name": coop['name'],
+                    "product": product,
+                    "peer_count": len(peers),
+                    "metrics": {
+                        metric: results[coop['id']].get(metric, {"value": None, "percentile": None})
+                        for metric in PEER_BENCHMARK_METRICS
+                    },
+                    "product_distribution": distribution,
+                    "computed_at": computed_at
+                }},
+                upsert=True
+            )
+    
+    # Drop tables of cooperatives that no longer exist
+    await db.peer_benchmarks.delete_many({"cooperative_id": {"$nin": list(metrics)}})
+    
+    return {product: len(peers) for product, peers in by_product.items()}
+
+@api_router.get("/benchmarks/cooperative/{coop_id}")
+async def get_cooperative_benchmark(coop_id: str, current_user: dict = Depends(get_current_user)):
+    """A cooperative's precomputed percentiles against same-product peers"""
+    benchmark = await analytics_db().peer_benchmarks.find_one({"cooperative_id": coop_id}, {"_id": 0})
+    if not benchmark:
+        raise HTTPException(status_code=404, detail="No benchmark computed for this cooperative yet")
+    return benchmark
+
+@api_router.get("/benchmarks")
+async def get_benchmarks(product: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Precomputed peer benchmarks for all cooperatives, optionally for one product"""
+    query = {"product": product} if product else {}
+    return await analytics_db().peer_benchmarks.find(query, {"_id": 0}).sort("cooperative_name", 1).to_list(1000)
+
+@api_router.post("/benchmarks/rebuild")
+async def rebuild_benchmarks(current_user: dict = Depends(get_current_user)):
+    """Recompute peer benchmark tables now instead of waiting for the next run (officer only)"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can rebuild benchmarks")
+    
+    started = time.perf_counter()
+    cooperatives_per_product = await rebuild_peer_benchmarks()
+    return {
+        "message": "Peer benchmarks rebuilt",
+        "cooperatives_per_product": cooperatives_per_product,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
 
 # ============= SCENARIO / WHAT-IF SIMULATOR =============
 
@@ -693,18 +3729,40 @@ async def initialize_mvp_data(current_user: dict = Depends(get_current_user)):
     
     return await create_sample_data()
 
-@api_router.post("/reinit-data")
-async def reinitialize_data(current_user: dict = Depends(get_current_user)):
-    if current_user['role'] != 'officer':
-        raise HTTPException(status_code=403, detail="Only officers can reinitialize data")
-    
+async def reset_sample_data():
     # Clear existing data
     await db.cooperatives.delete_many({})
     await db.production_logs.delete_many({})
     await db.nonconformities.delete_many({})
+    await db.production_stats.delete_many({})
+    await db.production_log_archive.delete_many({})
+    await db.production_log_monthly.delete_many({})
+    # Clients holding data from before the wipe must resync from scratch
+    await db.sync_tombstones.delete_many({})
+    await db.counters.update_one({"_id": "sync"}, {"$set": {"epoch": new_sync_epoch()}}, upsert=True)
+    invalidate_cooperative_stats()
+    invalidate_forecast()
+    columnar_store.invalidate()
     
     return await create_sample_data()
 
+@api_router.post("/reinit-data")
+async def reinitialize_data(
+    response: Response,
+    background: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Wipe and reseed sample data; with background=true it runs as a job and returns its run id"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can reinitialize data")
+    
+    if background:
+        run_id = await job_scheduler.trigger("reinit-sample-data")
+        response.status_code = 202
+        return {"message": "Data reinitialization queued", "job": "reinit-sample-data", "run_id": run_id}
+    
+    return await reset_sample_data()
+
 @api_router.post("/fix-manager-cooperative")
 async def fix_manager_cooperative(current_user: dict = Depends(get_current_user)):
     """Fix manager's cooperative_id to point to the first cooperative"""
@@ -762,32 +3820,114 @@ async def update_manager_cooperative(
 async def update_email_domains(
     old_domain: str,
     new_domain: str,
+    dry_run: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
-    """Update all user email domains"""
+    """Update all user email domains
+    
+    Users whose rewritten address already belongs to someone else are left on
+    the old domain and reported under `conflicts`, in dry runs as well.
+    """
     if current_user['role'] != 'officer':
         raise HTTPException(status_code=403, detail="Only officers can update email domains")
     
-    # Get all users
-    users = await db.users.find({}, {"_id": 0}).to_list(1000)
+    if old_domain == new_domain:
+        raise HTTPException(status_code=400, detail="Old and new domain must differ")
     
-    updated_count = 0
-    for user in users:
-        if user['email'].endswith(f"@{old_domain}"):
-            new_email = user['email'].replace(f"@{old_domain}", f"@{new_domain}")
-            await db.users.update_one(
-                {"id": user['id']},
-                {"$set": {"email": new_email}}
-            )
-            updated_count += 1
+    # Anchored match on the domain part so the filter is evaluated server-side
+    # and users that were already migrated never match again
+    email_filter = {"email": {"$regex": f"@{re.escape(old_domain)}$"}}
+    
+    # Rewrite the suffix inside MongoDB: keep everything before the old
+    # domain and append the new one
+    new_email = {
+        "$concat": [
+            {"$substrCP": [
+                "$email",
+                0,
+                {"$subtract": [{"$strLenCP": "$email"}, len(old_domain)]}
+            ]},
+            new_domain
+        ]
+    }
+    rewrite_pipeline = [{"$set": {"email": new_email}}, {"$set": {"email_lower": {"$toLower": "$email"}}}]
+    
+    started = time.perf_counter()
+    matched_count = await db.users.count_documents(email_filter)
+    conflicts = await email_domain_conflicts(email_filter, new_email)
+    
+    if dry_run:
+        return {
+            "message": f"{matched_count - len(conflicts)} user email domains would be updated",
+            "old_domain": old_domain,
+            "new_domain": new_domain,
+            "dry_run": True,
+            "matched_count": matched_count,
+            "conflict_count": len(conflicts),
+            "conflicts": [{key: conflict.get(key) for key in ("id", "email", "new_email")} for conflict in conflicts]
+        }
+    
+    for attempt in range(5):
+        pending_filter = {**email_filter, "_id": {"$nin": [conflict['_id'] for conflict in conflicts]}}
+        try:
+            await rewrite_email_domains(pending_filter, rewrite_pipeline)
+            break
+        except (DuplicateKeyError, BulkWriteError):
+            # An address on the new domain was registered while we migrated;
+            # everything not yet rewritten matches again, so find it and retry
+            conflicts = await email_domain_conflicts(email_filter, new_email)
+    else:
+        logger.warning("Email domain rewrite %s -> %s kept colliding with new registrations", old_domain, new_domain)
+    
+    # Whatever still sits on the old domain was not migrated
+    updated_count = matched_count - await db.users.count_documents(email_filter)
+    elapsed = time.perf_counter() - started
     
     return {
         "message": f"Updated {updated_count} user email domains",
         "old_domain": old_domain,
         "new_domain": new_domain,
-        "updated_count": updated_count
+        "dry_run": False,
+        "matched_count": matched_count,
+        "updated_count": updated_count,
+        "conflict_count": len(conflicts),
+        "conflicts": [{key: conflict.get(key) for key in ("id", "email", "new_email")} for conflict in conflicts],
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "users_per_second": round(updated_count / elapsed, 1) if elapsed > 0 else None
     }
 
+async def email_domain_conflicts(email_filter: dict, new_email: dict) -> list:
+    """Matching users whose rewritten address is already registered"""
+    return await db.users.aggregate([
+        {"$match": email_filter},
+        {"$project": {"id": 1, "email": 1, "new_email": new_email}},
+        # Probes the unique email index once per matching user
+        {"$lookup": {
+            "from": "users",
+            "localField": "new_email",
+            "foreignField": "email",
+            "pipeline": [{"$project": {"_id": 1}}, {"$limit": 1}],
+            "as": "taken"
+        }},
+        {"$match": {"taken": {"$ne": []}}},
+        {"$project": {"taken": 0}}
+    ]).to_list(None)
+
+async def rewrite_email_domains(email_filter: dict, rewrite_pipeline: list):
+    """Apply the domain rewrite to every user matching `email_filter`"""
+    if await db.users.count_documents(email_filter, limit=EMAIL_DOMAIN_CHUNK_SIZE + 1) <= EMAIL_DOMAIN_CHUNK_SIZE:
+        await db.users.update_many(email_filter, rewrite_pipeline)
+        return
+    # Large tenants are migrated in bounded chunks so no single write holds
+    # locks for long; re-running the request resumes where it stopped
+    while True:
+        chunk = await db.users.find(email_filter, {"_id": 1}).limit(EMAIL_DOMAIN_CHUNK_SIZE).to_list(EMAIL_DOMAIN_CHUNK_SIZE)
+        if not chunk:
+            break
+        await db.users.bulk_write([
+            UpdateMany({"$and": [{"_id": {"$in": [doc['_id'] for doc in chunk]}}, email_filter]}, rewrite_pipeline)
+        ], ordered=False)
+
 async def create_sample_data():
     
     # Create 4 cooperatives with diverse data
@@ -1289,6 +4429,13 @@ async def create_sample_data():
     ]
     
     await db.nonconformities.insert_many(additional_ncs)
+    await stamp_missing_sync_seq()
+    await stamp_missing_severity_rank()
+    await backfill_anomaly_state()
+    await rebuild_resolution_metrics()
+    invalidate_cooperative_stats()
+    invalidate_forecast()
+    columnar_store.invalidate()
     
     # Update manager user's cooperative_id to the first cooperative
     manager_update = await db.users.update_one(
@@ -1305,16 +4452,1173 @@ async def create_sample_data():
         "manager_updated": manager_update.modified_count > 0
     }
 
+# ============= JOB SCHEDULER =============
+
+class IntervalTrigger:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+    
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+    
+    def describe(self) -> str:
+        return f"every {self.seconds:g}s"
+
+class CronTrigger:
+    """Five-field cron expression (minute hour day-of-month month day-of-week), evaluated in UTC"""
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}  # 0 and 7 are both Sunday
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+    
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(','):
+            body, _, step = part.partition('/')
+            step = int(step) if step else 1
+            if body == '*':
+                start, end = low, high
+            elif '-' in body:
+                start, end = (int(bound) for bound in body.split('-', 1))
+            else:
+                start = int(body)
+                end = high if step != 1 else start
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Invalid cron field {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def _day_matches(self, moment: datetime) -> bool:
+        day_of_month = moment.day in self.days
+        day_of_week = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return day_of_week
+        if self.any_weekday:
+            return day_of_month
+        return day_of_month or day_of_week  # standard cron: either restricted field may match
+    
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+    
+    def describe(self) -> str:
+        return f"cron {self.expression}"
+
+class ScheduledJob:
+    def __init__(self, name, func, trigger=None, run_at_startup=False, lease_seconds=JOB_LEASE_SECONDS):
+        self.name = name
+        self.func = func
+        self.trigger = trigger  # None: only runs when triggered manually
+        self.run_at_startup = run_at_startup
+        self.lease_seconds = lease_seconds
+        self.next_run: Optional[datetime] = None
+        self.running = False
+
+class JobScheduler:
+    """
+    Runs registered coroutines on interval/cron triggers inside the API process.
+    
+    Every run first takes a lease in `job_leases`, so with several uvicorn
+    workers or replicas each job executes on exactly one of them. Runs are
+    recorded in `job_runs`. CPU-heavy work inside a job can be pushed to the
+    shared process pool with run_in_process_pool().
+    """
+    
+    def __init__(self):
+        self.jobs = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._loop_task: Optional[asyncio.Task] = None
+        self._run_tasks: Set[asyncio.Task] = set()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+    
+    def register(self, name, func, trigger=None, run_at_startup=False, lease_seconds=JOB_LEASE_SECONDS):
+        self.jobs[name] = ScheduledJob(name, func, trigger, run_at_startup, lease_seconds)
+    
+    async def run_in_process_pool(self, func, *args):
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=JOB_PROCESS_POOL_WORKERS)
+        return await asyncio.get_running_loop().run_in_executor(self._process_pool, partial(func, *args))
+    
+    def start(self):
+        now = datetime.now(timezone.utc)
+        for job in self.jobs.values():
+            if job.trigger:
+                job.next_run = now if job.run_at_startup else job.trigger.next_after(now)
+        self._loop_task = asyncio.create_task(self._run_loop())
+    
+    async def stop(self):
+        tasks = list(self._run_tasks) + ([self._loop_task] if self._loop_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+    
+    async def _run_loop(self):
+        while True:
+            now = datetime.now(timezone.utc)
+            for job in self.jobs.values():
+                if job.next_run and job.next_run <= now:
+                    job.next_run = job.trigger.next_after(now)
+                    self._spawn(job, "schedule")
+            delays = [(job.next_run - now).total_seconds() for job in self.jobs.values() if job.next_run]
+            await asyncio.sleep(max(min(delays + [JOB_MAX_SLEEP_SECONDS]), 0.05))
+    
+    def spawn(self, coro) -> asyncio.Task:
+        """Run a coroutine in the background; it is cancelled when the scheduler stops"""
+        task = asyncio.create_task(coro)
+        self._run_tasks.add(task)
+        task.add_done_callback(self._run_tasks.discard)
+        return task
+    
+    def _spawn(self, job: ScheduledJob, trigger: str, run_id: Optional[str] = None):
+        self.spawn(self._execute(job, trigger, run_id))
+    
+    async def trigger(self, name: str) -> str:
+        """Queue a run now, regardless of the job's schedule, and return its run id"""
+        job = self.jobs[name]
+        run_id = str(uuid.uuid4())
+        await db.job_runs.insert_one({
+            "id": run_id,
+            "job": name,
+            "trigger": "manual",
+            "status": "queued",
+            "worker": self.worker_id,
+            "queued_at": datetime.now(timezone.utc).isoformat()
+        })
+        self._spawn(job, "manual", run_id)
+        return run_id
+    
+    async def _acquire_lease(self, job: ScheduledJob) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            # Matches only a free or expired lease; otherwise the upsert collides on _id
+            await db.job_leases.find_one_and_update(
+                {"_id": job.name, "expires_at": {"$lte": now}},
+                {"$set": {
+                    "owner": self.worker_id,
+                    "acquired_at": now,
+                    "expires_at": now + timedelta(seconds=job.lease_seconds)
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+    
+    async def _renew_lease(self, job: ScheduledJob):
+        while True:
+            await asyncio.sleep(job.lease_seconds / 3)
+            await db.job_leases.update_one(
+                {"_id": job.name, "owner": self.worker_id},
+                {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=job.lease_seconds)}}
+            )
+    
+    async def _execute(self, job: ScheduledJob, trigger: str, run_id: Optional[str] = None):
+        skipped = None
+        if job.running:
+            skipped = "Already running on this worker"
+        elif not await self._acquire_lease(job):
+            skipped = "Lease held by another worker"
+        if skipped:
+            if run_id:
+                await db.job_runs.update_one({"id": run_id}, {"$set": {"status": "skipped", "error": skipped}})
+            return
+        
+        job.running = True
+        run_id = run_id or str(uuid.uuid4())
+        started_at = datetime.now(timezone.utc)
+        await db.job_runs.update_one(
+            {"id": run_id},
+            {"$set": {
+                "job": job.name,
+                "trigger": trigger,
+                "status": "running",
+                "worker": self.worker_id,
+                "started_at": started_at.isoformat()
+            }, "$setOnInsert": {"queued_at": started_at.isoformat()}},
+            upsert=True
+        )
+        
+        heartbeat = asyncio.create_task(self._renew_lease(job))
+        status, result, error = "succeeded", None, None
+        try:
+            result = await job.func()
+        except asyncio.CancelledError:
+            status, error = "cancelled", "Worker shut down"
+            raise
+        except Exception as exc:
+            status, error = "failed", f"{type(exc).__name__}: {exc}"
+            logger.exception("Job %s failed", job.name)
+        finally:
+            heartbeat.cancel()
+            job.running = False
+            finished_at = datetime.now(timezone.utc)
+            await db.job_runs.update_one(
+                {"id": run_id},
+                {"$set": {
+                    "status": status,
+                    "result": result,
+                    "error": error,
+                    "finished_at": finished_at.isoformat(),
+                    "duration_ms": round((finished_at - started_at).total_seconds() * 1000, 2)
+                }}
+            )
+            await db.job_leases.update_one(
+                {"_id": job.name, "owner": self.worker_id},
+                {"$set": {"expires_at": finished_at}}
+            )
+
+job_scheduler = JobScheduler()
+job_scheduler.register(
+    "peer-benchmarks", rebuild_peer_benchmarks,
+    trigger=IntervalTrigger(PEER_BENCHMARK_INTERVAL_SECONDS), run_at_startup=True
+)
+job_scheduler.register("anomaly-backfill", backfill_anomaly_state, trigger=CronTrigger(ANOMALY_BACKFILL_CRON))
+job_scheduler.register("log-tiering", tier_production_logs, trigger=CronTrigger(LOG_TIERING_CRON))
+job_scheduler.register("sync-tombstone-purge", purge_sync_tombstones, trigger=CronTrigger(SYNC_TOMBSTONE_PURGE_CRON))
+job_scheduler.register(
+    "resolution-metrics", rebuild_resolution_metrics,
+    trigger=CronTrigger(RESOLUTION_METRICS_CRON), run_at_startup=True
+)
+job_scheduler.register("reinit-sample-data", reset_sample_data)
+
+def serialize_job(job: ScheduledJob) -> dict:
+    return {
+        "name": job.name,
+        "schedule": job.trigger.describe() if job.trigger else "manual",
+        "next_run": job.next_run.isoformat() if job.next_run else None,
+        "running_here": job.running
+    }
+
+@api_router.get("/jobs")
+async def list_jobs(current_user: dict = Depends(get_current_user)):
+    """Registered jobs with their schedule, lease holder and most recent run (officer only)"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can view jobs")
+    
+    names = list(job_scheduler.jobs)
+    leases = {
+        lease['_id']: lease
+        for lease in await db.job_leases.find({"_id": {"$in": names}}).to_list(len(names))
+    }
+    last_runs = await asyncio.gather(*(
+        db.job_runs.find_one({"job": name}, {"_id": 0}, sort=[("queued_at", -1)])
+        for name in names
+    ))
+    
+    now = datetime.now(timezone.utc)
+    jobs = []
+    for job, last_run in zip(job_scheduler.jobs.values(), last_runs):
+        lease = leases.get(job.name)
+        expires_at = lease['expires_at'].replace(tzinfo=timezone.utc) if lease else None
+        jobs.append({
+            **serialize_job(job),
+            "lease_owner": lease['owner'] if lease and expires_at > now else None,
+            "last_run": last_run
+        })
+    return jobs
+
+@api_router.get("/jobs/runs/{run_id}")
+async def get_job_run(run_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can view jobs")
+    
+    run = await db.job_runs.find_one({"id": run_id}, {"_id": 0})
+    if not run:
+        raise HTTPException(status_code=404, detail="Job run not found")
+    return run
+
+@api_router.get("/jobs/{name}/history")
+async def get_job_history(name: str, limit: int = 20, current_user: dict = Depends(get_current_user)):
+    """Most recent runs of a job across all workers, newest first (officer only)"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can view jobs")
+    if name not in job_scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    limit = max(1, min(limit, 100))
+    return await db.job_runs.find({"job": name}, {"_id": 0}).sort("queued_at", -1).to_list(limit)
+
+@api_router.post("/jobs/{name}/run", status_code=202)
+async def run_job(name: str, current_user: dict = Depends(get_current_user)):
+    """Trigger a job immediately; poll /jobs/runs/{run_id} for the outcome (officer only)"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can run jobs")
+    if name not in job_scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {"job": name, "run_id": await job_scheduler.trigger(name)}
+
+# ============= REPORTS =============
+
+# Bump when the report layout changes so cached artifacts are rebuilt
+REPORT_LAYOUT_VERSION = 1
+
+REPORT_MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+REPORT_PROJECTION = {"_id": 0, "artifact_id": 0}
+
+REPORT_LOG_PROJECTION = {
+    "_id": 0, "date": 1, "batch_period": 1, "total_production": 1, "grade_a_percent": 1, "grade_b_percent": 1,
+    "post_harvest_loss_percent": 1, "post_harvest_loss_kg": 1, "energy_use": 1, "has_nonconformity": 1
+}
+
+REPORT_NC_PROJECTION = {
+    "_id": 0, "date": 1, "category": 1, "severity": 1, "status": 1, "description": 1,
+    "corrective_action": 1, "closed_date": 1
+}
+
+# Nonconformity category covered by each management-system standard
+ISO_STANDARDS = (
+    ("ISO 9001", "Quality", "quality"),
+    ("ISO 14001", "Environmental", "environmental"),
+    ("ISO 45001", "Occupational health & safety", "safety"),
+)
+
+class ReportRequest(BaseModel):
+    cooperative_id: str
+    period: str  # "2025", "2025-Q2" or "2025-06"
+    format: str = "pdf"
+
+def available_report_formats() -> List[str]:
+    formats = []
+    if SimpleDocTemplate is not None:
+        formats.append("pdf")
+    if openpyxl is not None:
+        formats.append("xlsx")
+    return formats
+
+def parse_report_period(period: str) -> tuple:
+    """A year, quarter or month as a [start, end) pair of UTC datetimes"""
+    match = re.fullmatch(r"(\d{4})(?:-Q([1-4])|-(\d{2}))?", period)
+    if not match:
+        raise ValueError("period must look like 2025, 2025-Q2 or 2025-06")
+    year = int(match[1])
+    if match[2]:
+        first_month, months = (int(match[2]) - 1) * 3 + 1, 3
+    elif match[3]:
+        first_month, months = int(match[3]), 1
+        if not 1 <= first_month <= 12:
+            raise ValueError("month must be between 01 and 12")
+    else:
+        first_month, months = 1, 12
+    end_index = year * 12 + first_month - 1 + months
+    return (
+        datetime(year, first_month, 1, tzinfo=timezone.utc),
+        datetime(end_index // 12, end_index % 12 + 1, 1, tzinfo=timezone.utc)
+    )
+
+def months_between(start: datetime, end: datetime) -> List[str]:
+    months = []
+    cursor = start
+    while cursor < end:
+        months.append(cursor.strftime("%Y-%m"))
+        cursor = (cursor + timedelta(days=32)).replace(day=1)
+    return months
+
+def check_report_access(current_user: dict, coop_id: str):
+    if current_user['role'] != 'officer' and current_user.get('cooperative_id') != coop_id:
+        raise HTTPException(status_code=403, detail="Cannot access reports for other cooperatives")
+
+async def report_data_version(coop: dict, start: datetime, end: datetime) -> tuple:
+    """
+    Cheap fingerprint of everything a report reads, plus the number of records behind it.
+    
+    Every write stamps `updated_seq`, so count + max seq per collection changes
+    whenever a log or nonconformity in the period is added, edited or deleted.
+    Archive blocks are immutable, so their ids stand in for their contents.
+    """
+    match = {"$match": {"cooperative_id": coop['id'], "date": {"$gte": to_utc_iso(start), "$lt": to_utc_iso(end)}}}
+    group = {"$group": {"_id": None, "count": {"$sum": 1}, "seq": {"$max": "$updated_seq"}}}
+    logs, nonconformities, blocks = await asyncio.gather(
+        db.production_logs.aggregate([match, group]).to_list(1),
+        db.nonconformities.aggregate([match, group]).to_list(1),
+        db.production_log_archive.find(
+            {"cooperative_id": coop['id'], "month": {"$in": months_between(start, end)}},
+            {"_id": 0, "id": 1, "count": 1}
+        ).to_list(None)
+    )
+    fingerprint = {
+        "layout": REPORT_LAYOUT_VERSION,
+        "cooperative": coop,
+        "logs": logs[0] if logs else None,
+        "nonconformities": nonconformities[0] if nonconformities else None,
+        "archive_blocks": sorted(block['id'] for block in blocks)
+    }
+    version = hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode()).hexdigest()[:32]
+    records = sum(part[0]['count'] for part in (logs, nonconformities) if part) + sum(block['count'] for block in blocks)
+    return version, records
+
+def report_is_stale(report: dict) -> bool:
+    """A queued/running report whose worker stopped updating it (e.g. it was restarted)"""
+    updated_at = datetime.fromisoformat(report['updated_at'])
+    return datetime.now(timezone.utc) - updated_at > timedelta(seconds=REPORT_STALE_SECONDS)
+
+def serialize_report(report: dict) -> dict:
+    report = {key: value for key, value in report.items() if key not in ("_id", "artifact_id")}
+    if report['status'] == 'succeeded':
+        report['download_url'] = f"/api/reports/{report['id']}/download"
+    return report
+
+async def set_report_progress(report_id: str, **fields):
+    fields['updated_at'] = datetime.now(timezone.utc).isoformat()
+    await db.reports.update_one({"id": report_id}, {"$set": fields})
+
+def report_artifacts() -> AsyncIOMotorGridFSBucket:
+    """Finished report files live in GridFS; `reports` documents only keep the file id"""
+    return AsyncIOMotorGridFSBucket(db, bucket_name="report_artifacts")
+
+async def collect_report_data(report: dict, staging: Path) -> dict:
+    """
+    Stream the period's logs (hot and archived) and nonconformities to JSON-lines files in `staging`.
+    
+    Rows are appended a batch at a time, so neither this process nor the pickle
+    to the render worker ever holds the whole period. Returns the report header.
+    """
+    start, end = parse_report_period(report['period'])
+    date_range = {"$gte": to_utc_iso(start), "$lt": to_utc_iso(end)}
+    query = {"cooperative_id": report['cooperative_id'], "date": date_range}
+    coop = await db.cooperatives.find_one({"id": report['cooperative_id']}, {"_id": 0})
+    
+    seen = 0
+    buffers = {"logs": [], "nonconformities": []}
+    
+    def flush(name: str):
+        with open(staging / f"{name}.jsonl", "a") as file:
+            file.writelines(json.dumps(row, default=str) + "\n" for row in buffers[name])
+        buffers[name].clear()
+    
+    async def stage(name: str, rows: list):
+        nonlocal seen
+        buffers[name].extend(rows)
+        if len(buffers[name]) >= REPORT_CURSOR_BATCH_SIZE:
+            flush(name)
+        before, seen = seen, seen + len(rows)
+        if before // REPORT_CURSOR_BATCH_SIZE != seen // REPORT_CURSOR_BATCH_SIZE:
+            # Collection is the first 80% of the work; rendering and storing the rest
+            await set_report_progress(report['id'], progress=min(80, 80 * seen // max(report['records'], 1)))
+    
+    cursor = db.production_logs.find(query, REPORT_LOG_PROJECTION).batch_size(REPORT_CURSOR_BATCH_SIZE)
+    async for log in cursor:
+        await stage("logs", [log])
+    
+    archive = db.production_log_archive.find(
+        {"cooperative_id": report['cooperative_id'], "month": {"$in": months_between(start, end)}}, {"_id": 0}
+    ).batch_size(1)
+    async for block in archive:
+        await stage("logs", [
+            {field: log.get(field) for field in REPORT_LOG_PROJECTION if field != "_id"}
+            for log in decode_archive_block(block)
+        ])
+    
+    cursor = db.nonconformities.find(query, REPORT_NC_PROJECTION).batch_size(REPORT_CURSOR_BATCH_SIZE)
+    async for nc in cursor:
+        await stage("nonconformities", [nc])
+    
+    for name in buffers:
+        flush(name)
+    return {
+        "cooperative": coop,
+        "period": report['period'],
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "data_version": report['data_version']
+    }
+
+def read_report_rows(path: Path) -> list:
+    with open(path) as file:
+        return sorted((json.loads(line) for line in file), key=lambda row: row['date'])
+
+def summarize_report_data(data: dict) -> dict:
+    """Figures shared by every report format"""
+    logs, nonconformities = data['logs'], data['nonconformities']
+    
+    monthly = {}
+    for log in logs:
+        monthly.setdefault(log_month(log['date']), []).append(log)
+    
+    energy_use = {level: 0 for level in ("Low", "Medium", "High")}
+    for log in logs:
+        level = log.get('energy_use') or "Unknown"
+        energy_use[level] = energy_use.get(level, 0) + 1
+    
+    standards = []
+    for standard, scope, category in ISO_STANDARDS:
+        matching = [nc for nc in nonconformities if nc.get('category') == category]
+        closed = [nc for nc in matching if nc.get('status') == 'closed']
+        resolution_days = [
+            (as_utc_datetime(nc['closed_date']) - as_utc_datetime(nc['date'])).total_seconds() / 86400
+            for nc in closed if nc.get('closed_date')
+        ]
+        severities = {}
+        for nc in matching:
+            severities[nc.get('severity')] = severities.get(nc.get('severity'), 0) + 1
+        standards.append({
+            "standard": standard,
+            "scope": scope,
+            "nonconformities": len(matching),
+            "open": len(matching) - len(closed),
+            "closed": len(closed),
+            "closure_rate": round(len(closed) / len(matching) * 100, 1) if matching else None,
+            "avg_resolution_days": round(sum(resolution_days) / len(resolution_days), 1) if resolution_days else None,
+            "by_severity": severities
+        })
+    
+    return {
+        "totals": monthly_figures(production_totals(logs)),
+        "monthly": [{"month": month, **monthly_figures(production_totals(rows))} for month, rows in sorted(monthly.items())],
+        "energy_use": energy_use,
+        "standards": standards
+    }
+
+def render_report_xlsx(data: dict, summary: dict) -> bytes:
+    workbook = openpyxl.Workbook(write_only=True)
+    coop = data['cooperative']
+    totals = summary['totals']
+    
+    sheet = workbook.create_sheet("Summary")
+    sheet.append(["Cooperative", coop['name']])
+    sheet.append(["Product", coop.get('product')])
+    sheet.append(["Period", data['period']])
+    sheet.append(["Generated at", data['generated_at']])
+    sheet.append(["Data version", data['data_version']])
+    sheet.append([])
+    sheet.append(["Environmental"])
+    sheet.append(["Production logs", totals['logs']])
+    sheet.append(["Total production", totals['total_production']])
+    sheet.append(["Post-harvest loss (kg)", totals['loss_kg']])
+    sheet.append(["Average loss (%)", totals['avg_loss_percent']])
+    for level, count in summary['energy_use'].items():
+        sheet.append([f"{level} energy batches", count])
+    sheet.append([])
+    sheet.append(["Standard", "Scope", "Nonconformities", "Open", "Closed", "Closure rate (%)", "Avg resolution (days)"])
+    for row in summary['standards']:
+        sheet.append([row['standard'], row['scope'], row['nonconformities'], row['open'], row['closed'],
+                      row['closure_rate'], row['avg_resolution_days']])
+    
+    sheet = workbook.create_sheet("Monthly")
+    sheet.append(["Month", "Logs", "Total production", "Loss (kg)", "Avg loss (%)", "Grade A (%)"])
+    for row in summary['monthly']:
+        sheet.append([row['month'], row['logs'], row['total_production'], row['loss_kg'],
+                      row['avg_loss_percent'], row['grade_mix']['a'] if row['grade_mix'] else None])
+    
+    sheet = workbook.create_sheet("Production Logs")
+    columns = [field for field in REPORT_LOG_PROJECTION if field != "_id"]
+    sheet.append(columns)
+    for log in data['logs']:
+        sheet.append([log.get(field) for field in columns])
+    
+    sheet = workbook.create_sheet("Nonconformities")
+    columns = [field for field in REPORT_NC_PROJECTION if field != "_id"]
+    sheet.append(columns)
+    for nc in data['nonconformities']:
+        sheet.append([nc.get(field) for field in columns])
+    
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def render_report_pdf(data: dict, summary: dict) -> bytes:
+    styles = getSampleStyleSheet()
+    coop = data['cooperative']
+    totals = summary['totals']
+    grid = TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ])
+    
+    def table(rows):
+        return Table([[("" if cell is None else str(cell)) for cell in row] for row in rows], style=grid, hAlign="LEFT")
+    
+    story = [
+        Paragraph(f"ESG &amp; ISO Report: {coop['name']}", styles['Title']),
+        Paragraph(f"Period {data['period']} &middot; generated {data['generated_at'][:16]} UTC "
+                  f"&middot; data version {data['data_version'][:12]}", styles['Normal']),
+        Spacer(1, 12),
+        Paragraph("Environmental (ISO 14001)", styles['Heading2']),
+        table([
+            ["Production logs", "Total production", "Loss (kg)", "Avg loss (%)", *(f"{level} energy" for level in summary['energy_use'])],
+            [totals['logs'], totals['total_production'], totals['loss_kg'], totals['avg_loss_percent'], *summary['energy_use'].values()]
+        ]),
+        Spacer(1, 12),
+        Paragraph("Management systems", styles['Heading2']),
+        table([["Standard", "Scope", "Nonconformities", "Open", "Closed", "Closure rate (%)", "Avg resolution (days)"]] + [
+            [row['standard'], row['scope'], row['nonconformities'], row['open'], row['closed'],
+             row['closure_rate'], row['avg_resolution_days']]
+            for row in summary['standards']
+        ]),
+        Spacer(1, 12),
+        Paragraph("Monthly production", styles['Heading2']),
+        table([["Month", "Logs", "Total production", "Loss (kg)", "Avg loss (%)", "Grade A (%)"]] + [
+            [row['month'], row['logs'], row['total_production'], row['loss_kg'], row['avg_loss_percent'],
+             row['grade_mix']['a'] if row['grade_mix'] else None]
+            for row in summary['monthly']
+        ]),
+    ]
+    if data['nonconformities']:
+        story += [
+            Spacer(1, 12),
+            Paragraph("Nonconformity register", styles['Heading2']),
+            table([["Date", "Category", "Severity", "Status", "Description"]] + [
+                [nc['date'][:10], nc.get('category'), nc.get('severity'), nc.get('status'), (nc.get('description') or "")[:80]]
+                for nc in data['nonconformities']
+            ]),
+        ]
+    
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, title=f"{coop['name']} {data['period']}").build(story)
+    return buffer.getvalue()
+
+def render_report(report_format: str, data: dict) -> bytes:
+    summary = summarize_report_data(data)
+    if report_format == "xlsx":
+        return render_report_xlsx(data, summary)
+    return render_report_pdf(data, summary)
+
+def render_staged_report(report_format: str, header: dict, staging: str) -> int:
+    """
+    Runs in the process pool, so it must stay a module-level function of plain data.
+    
+    Reads the rows collect_report_data() staged and writes the file next to
+    them, so only paths and sizes cross the process boundary.
+    """
+    staging = Path(staging)
+    data = {**header, **{name: read_report_rows(staging / f"{name}.jsonl") for name in ("logs", "nonconformities")}}
+    content = render_report(report_format, data)
+    (staging / "artifact").write_bytes(content)
+    return len(content)
+
+async def generate_report(report: dict):
+    started_at = datetime.now(timezone.utc)
+    try:
+        await set_report_progress(report['id'], status="running", stage="collecting", worker=job_scheduler.worker_id,
+                                  started_at=started_at.isoformat())
+        with tempfile.TemporaryDirectory(prefix="report-", dir=REPORT_STAGING_DIR) as staging:
+            header = await collect_report_data(report, Path(staging))
+            await set_report_progress(report['id'], stage="rendering", progress=80)
+            size = await job_scheduler.run_in_process_pool(render_staged_report, report['format'], header, staging)
+            await set_report_progress(report['id'], stage="storing", progress=90)
+            with open(Path(staging) / "artifact", "rb") as artifact:
+                artifact_id = await report_artifacts().upload_from_stream(
+                    report['filename'], artifact, metadata={"report_id": report['id'], "content_type": REPORT_MEDIA_TYPES[report['format']]}
+                )
+        finished_at = datetime.now(timezone.utc)
+        await set_report_progress(
+            report['id'],
+            status="succeeded",
+            stage="done",
+            progress=100,
+            artifact_id=artifact_id,
+            size=size,
+            finished_at=finished_at.isoformat(),
+            duration_ms=round((finished_at - started_at).total_seconds() * 1000, 2)
+        )
+    except asyncio.CancelledError:
+        await set_report_progress(report['id'], status="cancelled", error="Worker shut down")
+        raise
+    except Exception as exc:
+        logger.exception("Report %s failed", report['id'])
+        await set_report_progress(report['id'], status="failed", error=f"{type(exc).__name__}: {exc}")
+        return
+    
+    # Artifacts for older data versions of the same report can never be served again;
+    # drop the documents first so a crash leaves orphaned files rather than dangling ids
+    outdated = {
+        "cooperative_id": report['cooperative_id'],
+        "period": report['period'],
+        "format": report['format'],
+        "data_version": {"$ne": report['data_version']},
+        "status": {"$nin": ["queued", "running"]}
+    }
+    artifacts = await db.reports.distinct("artifact_id", outdated)
+    await db.reports.delete_many(outdated)
+    for artifact_id in artifacts:
+        with contextlib.suppress(NoFile):
+            await report_artifacts().delete(artifact_id)
+
+@api_router.post("/reports", status_code=202)
+async def request_report(request: ReportRequest, response: Response, current_user: dict = Depends(get_current_user)):
+    """
+    Queue an ESG/ISO report for a cooperative and period.
+    
+    Artifacts are keyed by cooperative, period, format and a fingerprint of
+    the underlying data, so asking again for unchanged data returns the
+    finished report (200) instead of queueing a new one (202).
+    """
+    formats = available_report_formats()
+    if request.format not in formats:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(formats) or 'none installed'}")
+    check_report_access(current_user, request.cooperative_id)
+    try:
+        start, end = parse_report_period(request.period)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    coop = await db.cooperatives.find_one({"id": request.cooperative_id}, {"_id": 0})
+    if not coop:
+        raise HTTPException(status_code=404, detail="Cooperative not found")
+    
+    version, records = await report_data_version(coop, start, end)
+    key = {"cooperative_id": coop['id'], "period": request.period, "format": request.format, "data_version": version}
+    
+    existing = await db.reports.find_one(key, REPORT_PROJECTION)
+    if existing and (existing['status'] == 'succeeded' or (existing['status'] in ('queued', 'running') and not report_is_stale(existing))):
+        if existing['status'] == 'succeeded':
+            response.status_code = 200
+        return serialize_report(existing)
+    
+    now = datetime.now(timezone.utc).isoformat()
+    report = {
+        **key,
+        "id": str(uuid.uuid4()),
+        "status": "queued",
+        "stage": "queued",
+        "progress": 0,
+        "records": records,
+        "filename": f"{re.sub(r'[^A-Za-z0-9]+', '-', coop['name']).strip('-').lower()}-{request.period}.{request.format}",
+        "requested_by": current_user['email'],
+        "error": None,
+        "created_at": now,
+        "updated_at": now
+    }
+    if existing:
+        # Take over a failed or abandoned run; a concurrent request may beat us to it
+        claimed = await db.reports.find_one_and_replace(
+            {"id": existing['id'], "updated_at": existing['updated_at']}, report,
+            projection=REPORT_PROJECTION, return_document=ReturnDocument.AFTER
+        )
+        if not claimed:
+            return serialize_report(await db.reports.find_one(key, REPORT_PROJECTION))
+    else:
+        try:
+            await db.reports.insert_one(report)
+        except DuplicateKeyError:
+            return serialize_report(await db.reports.find_one(key, REPORT_PROJECTION))
+    
+    job_scheduler.spawn(generate_report(report))
+    return serialize_report(report)
+
+@api_router.get("/reports")
+async def list_reports(cooperative_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Recent reports, newest first; non-officers only see their own cooperative's"""
+    if current_user['role'] != 'officer':
+        cooperative_id = current_user.get('cooperative_id')
+    query = {"cooperative_id": cooperative_id} if cooperative_id else {}
+    reports = await db.reports.find(query, REPORT_PROJECTION).sort("created_at", -1).to_list(50)
+    return [serialize_report(report) for report in reports]
+
+@api_router.get("/reports/{report_id}")
+async def get_report(report_id: str, current_user: dict = Depends(get_current_user)):
+    """Status and progress of a report; poll until status is succeeded or failed"""
+    report = await db.reports.find_one({"id": report_id}, REPORT_PROJECTION)
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    check_report_access(current_user, report['cooperative_id'])
+    return serialize_report(report)
+
+@api_router.get("/reports/{report_id}/download")
+async def download_report(report_id: str, current_user: dict = Depends(get_current_user)):
+    report = await db.reports.find_one({"id": report_id}, {"_id": 0})
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    check_report_access(current_user, report['cooperative_id'])
+    if report['status'] != 'succeeded':
+        raise HTTPException(status_code=409, detail=f"Report is {report['status']}")
+    
+    try:
+        artifact = await report_artifacts().open_download_stream(report['artifact_id'])
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Report file no longer exists; request the report again")
+    
+    async def chunks():
+        while chunk := await artifact.readchunk():
+            yield chunk
+    
+    return StreamingResponse(
+        chunks(),
+        media_type=REPORT_MEDIA_TYPES[report['format']],
+        headers={
+            "Content-Length": str(artifact.length),
+            "Content-Disposition": f'attachment; filename="{report["filename"]}"',
+            "Cache-Control": "private, max-age=3600"  # a report id never changes content
+        }
+    )
+
+# ============= ADMISSION CONTROL =============
+
+# Applied when RATE_LIMITS leaves out "anonymous", which unknown roles also fall back to
+DEFAULT_ANONYMOUS_RATE_LIMIT = (2.0, 10.0)
+# Unauthenticated login and registration get their own buckets under the "auth" role
+AUTH_ROUTES = ("/api/auth/login", "/api/auth/register")
+DEFAULT_AUTH_RATE_LIMIT = (5.0, 20.0)
+
+def parse_rate_limits(spec: str) -> dict:
+    """"role:rate/burst,..." -> {role: (tokens per second, bucket size)}, always with anonymous and auth entries"""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        role, _, values = entry.partition(':')
+        rate, _, burst = values.partition('/')
+        limits[role] = (float(rate), float(burst or rate))
+    limits.setdefault('anonymous', DEFAULT_ANONYMOUS_RATE_LIMIT)
+    limits.setdefault('auth', DEFAULT_AUTH_RATE_LIMIT)
+    return limits
+
+def parse_route_limits(spec: str) -> dict:
+    """"/api/path:limit,..." -> {path: max concurrent requests}"""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        path, _, limit = entry.rpartition(':')
+        limits[path] = int(limit)
+    return limits
+
+RATE_LIMITS = parse_rate_limits(RATE_LIMITS_SPEC)
+
+def client_address(request) -> str:
+    """The caller's address, read from ADMISSION_CLIENT_IP_HEADER when one is configured"""
+    if ADMISSION_CLIENT_IP_HEADER:
+        # Each trusted proxy appends the address it saw, so count from the right;
+        # anything further left was written by the client and can be forged
+        hops = [hop.strip() for hop in request.headers.get(ADMISSION_CLIENT_IP_HEADER, '').split(',') if hop.strip()]
+        if hops:
+            return hops[-min(ADMISSION_TRUSTED_PROXIES, len(hops))]
+    return request.client.host if request.client else 'unknown'
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+    
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.updated = time.monotonic()
+    
+    def take(self, rate: float, burst: float) -> float:
+        """Spend a token; returns 0 when admitted, else seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate if rate > 0 else float(SHED_RETRY_AFTER_SECONDS)
+
+class RouteGate:
+    """Concurrency cap for one expensive route, with a short bounded wait queue"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+    
+    async def acquire(self) -> bool:
+        if self.in_flight >= self.limit and self.waiting >= ROUTE_QUEUE_DEPTH:
+            self.shed += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), ROUTE_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+    
+    def release(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+    
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "waiting": self.waiting,
+                "admitted": self.admitted, "shed": self.shed}
+
+class AdmissionControl:
+    def __init__(self):
+        self.buckets: OrderedDict = OrderedDict()
+        self.routes = {path: RouteGate(limit) for path, limit in parse_route_limits(ROUTE_CONCURRENCY_LIMITS).items()}
+        self.roles: OrderedDict = OrderedDict()  # user id -> (expires_at, role)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.admitted = 0
+        self.shed_overload = 0
+        self.rate_limited = {role: 0 for role in RATE_LIMITS}
+    
+    async def identify(self, request) -> tuple:
+        """(bucket key, role) without a full user load; unauthenticated callers share a bucket per IP"""
+        address = client_address(request)
+        if request.url.path in AUTH_ROUTES:
+            anonymous = (f"auth:{address}", "auth")
+        else:
+            anonymous = (f"ip:{address}", "anonymous")
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return anonymous
+        try:
+            user_id = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get('sub')
+        except PyJWTError:
+            return anonymous
+        if not user_id:
+            return anonymous
+        
+        cached = self.roles.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return user_id, cached[1]
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "role": 1})
+        if not user:
+            return anonymous
+        self.roles[user_id] = (time.monotonic() + ROLE_CACHE_TTL_SECONDS, user['role'])
+        self.roles.move_to_end(user_id)
+        if len(self.roles) > ADMISSION_TRACKED_KEYS:
+            self.roles.popitem(last=False)
+        return user_id, user['role']
+    
+    def take_token(self, key: str, role: str) -> float:
+        rate, burst = RATE_LIMITS.get(role) or RATE_LIMITS['anonymous']
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(burst)
+            if len(self.buckets) > ADMISSION_TRACKED_KEYS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        wait = bucket.take(rate, burst)
+        if wait:
+            self.rate_limited[role] = self.rate_limited.get(role, 0) + 1
+        return wait
+    
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_in_flight": MAX_IN_FLIGHT_REQUESTS,
+            "admitted": self.admitted,
+            "shed_overload": self.shed_overload,
+            "rate_limits": {role: {"rate": rate, "burst": burst} for role, (rate, burst) in RATE_LIMITS.items()},
+            "rate_limited": self.rate_limited,
+            "tracked_clients": len(self.buckets),
+            "routes": {path: gate.stats() for path, gate in self.routes.items()}
+        }
+
+admission = AdmissionControl()
+
+def rejection(status_code: int, detail: str, retry_after: float) -> Response:
+    return Response(
+        content=json.dumps({"detail": detail}),
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        media_type="application/json"
+    )
+
+class AdmissionControlMiddleware(BaseHTTPMiddleware):
+    """Sheds load when the process is saturated, then applies per-user rate limits and per-route caps"""
+    
+    async def dispatch(self, request, call_next):
+        if not ADMISSION_ENABLED or request.method == "OPTIONS" or not request.url.path.startswith("/api/"):
+            return await call_next(request)
+        
+        # Refuse outright rather than queue behind work the loop cannot keep up with
+        if admission.in_flight >= MAX_IN_FLIGHT_REQUESTS:
+            admission.shed_overload += 1
+            return rejection(503, "Server is busy, please retry", SHED_RETRY_AFTER_SECONDS)
+        
+        key, role = await admission.identify(request)
+        wait = admission.take_token(key, role)
+        if wait:
+            return rejection(429, "Rate limit exceeded", wait)
+        
+        # Requests queued at a route gate hold a connection too, so they count towards load shedding
+        admission.in_flight += 1
+        admission.peak_in_flight = max(admission.peak_in_flight, admission.in_flight)
+        try:
+            gate = admission.routes.get(request.url.path)
+            if gate is not None and not await gate.acquire():
+                return rejection(503, "Too many concurrent requests for this endpoint, please retry", SHED_RETRY_AFTER_SECONDS)
+            admission.admitted += 1
+            try:
+                return await call_next(request)
+            finally:
+                if gate is not None:
+                    gate.release()
+        finally:
+            admission.in_flight -= 1
+
+@api_router.get("/admission/stats")
+async def get_admission_stats(current_user: dict = Depends(get_current_user)):
+    """Live admission counters for tuning the limits (officer only)"""
+    if current_user['role'] != 'officer':
+        raise HTTPException(status_code=403, detail="Only officers can view admission stats")
+    return admission.stats()
+
+# ============= READ PREFERENCE OVERRIDE =============
+
+class ReadPreferenceMiddleware(BaseHTTPMiddleware):
+    """`X-Read-Preference: primary` (or any other mode) redirects this request's analytics reads"""
+    
+    async def dispatch(self, request, call_next):
+        mode = request.headers.get('x-read-preference')
+        if mode is None:
+            return await call_next(request)
+        if mode not in READ_PREFERENCES:
+            return Response(
+                content=json.dumps({"detail": f"X-Read-Preference must be one of: {', '.join(READ_PREFERENCES)}"}),
+                status_code=400,
+                media_type="application/json"
+            )
+        token = read_preference_override.set(mode)
+        try:
+            response = await call_next(request)
+        finally:
+            read_preference_override.reset(token)
+        response.headers['X-Read-Preference'] = mode
+        return response
+
+# ============= RESPONSE ENCODING =============
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+_encoded_body_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+def negotiate_media_type(accept: str) -> str:
+    """Pick MessagePack when the client asks for it and it is installed, JSON otherwise"""
+    if msgpack is not None and any(media in accept for media in MSGPACK_MEDIA_TYPES):
+        return "application/msgpack"
+    return "application/json"
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported content-coding the client accepts (br over gzip)"""
+    offered = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        offered.add(coding.strip().lower())
+    if brotli is not None and 'br' in offered:
+        return 'br'
+    if 'gzip' in offered:
+        return 'gzip'
+    return None
+
+def encode_body(body: bytes, media_type: str, encoding: Optional[str]) -> bytes:
+    """Re-encode a JSON body into the negotiated media type and content-coding"""
+    if media_type == "application/msgpack":
+        body = msgpack.packb(json.loads(body), use_bin_type=True)
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+class ResponseEncodingMiddleware(BaseHTTPMiddleware):
+    """ETags, MessagePack and gzip/brotli compression for JSON API responses.
+
+    GET responses get a weak ETag derived from the JSON body, so a matching
+    If-None-Match is answered with 304. Because the ETag identifies the
+    content, encoded bodies of ETag'd responses are cached by
+    (ETag, media type, coding) and never recompressed.
+    """
+    
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        
+        content_type = response.headers.get('content-type', '').split(';')[0]
+        if (
+            not request.url.path.startswith('/api/')
+            or content_type != 'application/json'
+            or 'content-encoding' in response.headers
+        ):
+            return response
+        
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {
+            key: value for key, value in response.headers.items()
+            if key not in ('content-length', 'content-type')
+        }
+        headers['Vary'] = 'Accept, Accept-Encoding'
+        
+        etag = None
+        if request.method == 'GET' and response.status_code == 200:
+            etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            headers['ETag'] = etag
+            if etag in request.headers.get('if-none-match', ''):
+                return Response(status_code=304, headers=headers)
+        
+        media_type = negotiate_media_type(request.headers.get('accept', ''))
+        encoding = negotiate_encoding(request.headers.get('accept-encoding', ''))
+        if len(body) < COMPRESSION_MIN_SIZE:
+            encoding = None
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        
+        if media_type == 'application/json' and encoding is None:
+            return Response(content=body, status_code=response.status_code, headers=headers, media_type=media_type)
+        
+        cache_key = (etag, media_type, encoding)
+        encoded = _encoded_body_cache.get(cache_key) if etag else None
+        if encoded is None:
+            encoded = encode_body(body, media_type, encoding)
+            if etag:
+                _encoded_body_cache[cache_key] = encoded
+                if len(_encoded_body_cache) > ENCODED_BODY_CACHE_SIZE:
+                    _encoded_body_cache.popitem(last=False)
+        else:
+            _encoded_body_cache.move_to_end(cache_key)
+        
+        return Response(content=encoded, status_code=response.status_code, headers=headers, media_type=media_type)
+
 # ============= SETUP =============
 
 app.include_router(api_router)
 
+app.add_middleware(ReadPreferenceMiddleware)
+
+app.add_middleware(ResponseEncodingMiddleware)
+
+app.add_middleware(AdmissionControlMiddleware)
+
+# Outermost (but inside CORS) so the root span covers admission and encoding too
+if TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Trace-Id"],
 )
 
 logging.basicConfig(
@@ -1323,6 +5627,97 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await db.production_stats.create_index("cooperative_id", unique=True)
+    await db.peer_benchmarks.create_index("cooperative_id", unique=True)
+    await db.peer_benchmarks.create_index([("product", 1), ("cooperative_name", 1)])
+
+    await db.production_logs.create_index([("cooperative_id", 1), ("date", 1)])
+    await db.production_logs.create_index([("cooperative_id", 1), ("created_at", 1)])  # recent logs for the anomaly EWMA
+    await db.production_logs.create_index("date")  # officer-wide pages sorted by date
+    await db.production_logs.create_index("id", unique=True)
+    await db.nonconformities.create_index("id", unique=True)
+    await db.nonconformities.create_index("production_log_id")
+    await db.nonconformities.create_index([("assigned_to", 1), ("status", 1), ("severity_rank", -1), ("date", 1), ("id", 1)])
+    await stamp_missing_severity_rank()
+    for collection in SYNC_COLLECTIONS:
+        await db[collection].create_index("updated_seq")
+    await db.sync_tombstones.create_index("updated_seq")
+    await stamp_missing_sync_seq()
+    await db.production_log_archive.create_index([("cooperative_id", 1), ("month", 1)])
+    await db.production_log_archive.create_index("log_ids")
+    await db.production_log_monthly.create_index([("cooperative_id", 1), ("month", 1)], unique=True)
+    await db.job_runs.create_index("id", unique=True)
+    await db.job_runs.create_index([("job", 1), ("queued_at", -1)])
+    await ensure_unique_user_email_index()
+    await db.users.create_index("email_lower")
+    await db.users.create_index([("name_lower", 1), ("id", 1)])
+    await db.users.create_index([("role", 1), ("name_lower", 1), ("id", 1)])
+    await db.users.create_index([("cooperative_id", 1), ("name_lower", 1), ("id", 1)])
+    await stamp_missing_user_search_fields()
+    await db.reports.create_index("id", unique=True)
+    await db.reports.create_index([("cooperative_id", 1), ("period", 1), ("format", 1), ("data_version", 1)], unique=True)
+    await db.reports.create_index([("cooperative_id", 1), ("created_at", -1)])
+    await db.resolution_metrics.create_index([("cooperative_id", 1), ("category", 1), ("severity", 1)], unique=True)
+    await db.resolution_journal.create_index("recorded_at", expireAfterSeconds=RESOLUTION_JOURNAL_TTL_SECONDS)
+
+async def duplicate_user_emails(limit: int = 10) -> list:
+    """Emails registered to more than one user"""
+    rows = await db.users.aggregate([
+        {"$group": {"_id": "$email", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit}
+    ]).to_list(limit)
+    return [row['_id'] for row in rows]
+
+async def ensure_unique_user_email_index():
+    """Make users.email unique, replacing the plain index older deployments built
+    
+    Registration used to race, so older databases can hold duplicate emails.
+    Those are reported and startup stops before any index is dropped; the
+    operator has to merge the accounts first.
+    """
+    try:
+        await db.users.create_index("email", unique=True)
+        return
+    except OperationFailure as exc:
+        replace_plain_index = exc.code in (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+        if not replace_plain_index and exc.code != 11000:  # DuplicateKey
+            raise
+    duplicates = await duplicate_user_emails()
+    if duplicates:
+        raise RuntimeError(
+            "users.email cannot be made unique while these emails belong to several users: "
+            + ", ".join(map(str, duplicates))
+        )
+    if replace_plain_index:
+        # Replace the non-unique index older deployments created under the same name
+        await db.users.drop_index("email_1")
+    try:
+        await db.users.create_index("email", unique=True)
+    except OperationFailure:
+        # A duplicate registered in between; keep lookups indexed and stop
+        await db.users.create_index("email")
+        raise
+
+@app.on_event("startup")
+async def start_job_scheduler():
+    if JOBS_ENABLED:
+        job_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_job_scheduler():
+    await job_scheduler.stop()
+
+@app.on_event("startup")
+async def start_columnar_store():
+    columnar_store.start()
+
+@app.on_event("shutdown")
+async def stop_columnar_store():
+    await columnar_store.stop()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
\ No newline at end of file
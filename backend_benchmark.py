@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+DIMS Backend Benchmarks
+Measures the Mongo access patterns used by backend/server.py against a scratch
+database so that optimisations can be compared side by side.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python backend_benchmark.py [benchmark ...]
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+load_dotenv('backend/.env')
+
+BENCH_DB_NAME = os.environ.get('BENCH_DB_NAME', 'dims_benchmark')
+CONCURRENCY = int(os.environ.get('BENCH_CONCURRENCY', '50'))
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '20'))
+JOIN_LOGS = int(os.environ.get('BENCH_JOIN_LOGS', '5000'))
+COLUMNAR_LOGS = int(os.environ.get('BENCH_COLUMNAR_LOGS', '200000'))
+COLUMNAR_COOPS = int(os.environ.get('BENCH_COLUMNAR_COOPS', '20'))
+DIRECTORY_USERS = int(os.environ.get('BENCH_DIRECTORY_USERS', '100000'))
+
+
+def summarize(name, samples):
+    """Print latency percentiles (ms) for a list of samples in seconds"""
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[int(len(ms) * 0.95) - 1] if len(ms) >= 20 else ms[-1]
+    print(f"  {name:<38} n={len(ms):<6} mean={statistics.mean(ms):7.2f}ms "
+          f"p50={statistics.median(ms):7.2f}ms p95={p95:7.2f}ms")
+    return statistics.mean(ms)
+
+
+def make_log(coop_id, i):
+    date = datetime.now(timezone.utc) - timedelta(days=i)
+    return {
+        "id": str(uuid.uuid4()),
+        "cooperative_id": coop_id,
+        "date": date.isoformat(),
+        "batch_period": f"Week {i}",
+        "total_production": 500 + i,
+        "grade_a_percent": 70.0,
+        "grade_b_percent": 30.0,
+        "post_harvest_loss_percent": 12.0,
+        "post_harvest_loss_kg": 60.0,
+        "energy_use": ["Low", "Medium", "High"][i % 3],
+        "has_nonconformity": False,
+        "nonconformity_description": None,
+        "corrective_action": None,
+        "created_at": date.isoformat()
+    }
+
+
+class DIMSBenchmark:
+    def __init__(self, mongo_url, db_name=BENCH_DB_NAME):
+        self.client = AsyncIOMotorClient(mongo_url)
+        self.db = self.client[db_name]
+
+    async def reset(self):
+        await self.client.drop_database(self.db.name)
+
+    async def timed(self, coro_factory, concurrency=CONCURRENCY, rounds=ROUNDS):
+        """Run coro_factory(i) `concurrency` at a time for `rounds` rounds"""
+        samples = []
+
+        async def one(i):
+            start = time.perf_counter()
+            await coro_factory(i)
+            samples.append(time.perf_counter() - start)
+
+        for r in range(rounds):
+            await asyncio.gather(*(one(r * concurrency + i) for i in range(concurrency)))
+        return samples
+
+    async def bench_write_round_trips(self):
+        """Production log edits: find/update/find vs find_one_and_update"""
+        print("\n✏️  Concurrent production log edits")
+        coop_id = str(uuid.uuid4())
+        logs = [make_log(coop_id, i) for i in range(CONCURRENCY)]
+        await self.db.production_logs.insert_many(logs)
+        await self.db.production_logs.create_index("id")
+        manager = {"role": "manager", "cooperative_id": coop_id}
+
+        async def legacy(i):
+            log_id = logs[i % len(logs)]['id']
+            existing = await self.db.production_logs.find_one({"id": log_id}, {"_id": 0})
+            if existing['cooperative_id'] != manager['cooperative_id']:
+                raise RuntimeError("permission check failed")
+            await self.db.production_logs.update_one(
+                {"id": log_id}, {"$set": {"total_production": 600 + i}}
+            )
+            await self.db.production_logs.find_one({"id": log_id}, {"_id": 0})
+
+        async def single_round_trip(i):
+            log_id = logs[i % len(logs)]['id']
+            await self.db.production_logs.find_one_and_update(
+                {"id": log_id, "cooperative_id": manager['cooperative_id']},
+                {"$set": {"total_production": 600 + i}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+
+        before = summarize("find + update_one + find", await self.timed(legacy))
+        after = summarize("find_one_and_update", await self.timed(single_round_trip))
+        print(f"  -> mean latency reduced by {(1 - after / before) * 100:.1f}%")
+
+    async def bench_response_encodings(self):
+        """Payload size and encode CPU time per negotiated response format"""
+        print("\n📦 Response encodings (1000 production logs)")
+        logs = [make_log(str(uuid.uuid4()), i) for i in range(1000)]
+        body = json.dumps(logs).encode()
+
+        def to_json():
+            return json.dumps(logs).encode()
+
+        def to_msgpack():
+            return msgpack.packb(logs, use_bin_type=True)
+
+        formats = {
+            "json": to_json,
+            "json + gzip": lambda: gzip.compress(to_json(), compresslevel=6),
+        }
+        if brotli is not None:
+            formats["json + br"] = lambda: brotli.compress(to_json(), quality=5)
+        if msgpack is not None:
+            formats["msgpack"] = to_msgpack
+            formats["msgpack + gzip"] = lambda: gzip.compress(to_msgpack(), compresslevel=6)
+            if brotli is not None:
+                formats["msgpack + br"] = lambda: brotli.compress(to_msgpack(), quality=5)
+
+        for name, encode in formats.items():
+            start = time.process_time()
+            for _ in range(ROUNDS):
+                encoded = encode()
+            cpu_ms = (time.process_time() - start) / ROUNDS * 1000
+            print(f"  {name:<20} {len(encoded):>9,} bytes ({len(encoded) / len(body) * 100:5.1f}%)  encode={cpu_ms:7.2f}ms CPU")
+
+    async def bench_log_issue_join(self):
+        """Per-batch issue counts: two downloads + client join vs $lookup, with and without the index"""
+        print(f"\n🔗 Log to nonconformity join ({JOIN_LOGS} logs, 1 in 5 with an issue)")
+        coop_id = str(uuid.uuid4())
+        logs = [make_log(coop_id, i) for i in range(JOIN_LOGS)]
+        ncs = [
+            {"id": str(uuid.uuid4()), "cooperative_id": coop_id, "production_log_id": log['id'],
+             "severity": ["low", "medium", "high"][i % 3], "status": "open"}
+            for i, log in enumerate(logs) if i % 5 == 0
+        ]
+        await self.db.production_logs.insert_many(logs)
+        await self.db.nonconformities.insert_many(ncs)
+        pipeline = [
+            {"$match": {"cooperative_id": coop_id}},
+            {"$lookup": {"from": "nonconformities", "localField": "id", "foreignField": "production_log_id", "as": "issues"}},
+            {"$project": {"_id": 0, "id": 1, "issue_count": {"$size": "$issues"}}}
+        ]
+
+        async def client_join(i):
+            all_logs = await self.db.production_logs.find({"cooperative_id": coop_id}, {"_id": 0}).to_list(None)
+            all_ncs = await self.db.nonconformities.find({"cooperative_id": coop_id}, {"_id": 0}).to_list(None)
+            counts = {}
+            for nc in all_ncs:
+                counts[nc['production_log_id']] = counts.get(nc['production_log_id'], 0) + 1
+            return [{"id": log['id'], "issue_count": counts.get(log['id'], 0)} for log in all_logs]
+
+        async def lookup(i):
+            return await self.db.production_logs.aggregate(pipeline).to_list(None)
+
+        await self.db.production_logs.create_index([("cooperative_id", 1), ("date", 1)])
+        summarize("two downloads + client join", await self.timed(client_join, concurrency=1, rounds=5))
+        summarize("$lookup, no index", await self.timed(lookup, concurrency=1, rounds=1))
+        await self.db.nonconformities.create_index("production_log_id")
+        summarize("$lookup, production_log_id index", await self.timed(lookup, concurrency=1, rounds=5))
+
+    async def bench_columnar_store(self):
+        """Grouped production totals: Mongo $group vs the in-process columnar store"""
+        sys.path.insert(0, 'backend')
+        import server
+        
+        print(f"\n🧮 Columnar store vs Mongo aggregation ({COLUMNAR_LOGS} logs, {COLUMNAR_COOPS} cooperatives)")
+        coop_ids = [str(uuid.uuid4()) for _ in range(COLUMNAR_COOPS)]
+        for offset in range(0, COLUMNAR_LOGS, 10000):
+            await self.db.production_logs.insert_many([
+                make_log(coop_ids[i % COLUMNAR_COOPS], i) for i in range(offset, min(offset + 10000, COLUMNAR_LOGS))
+            ])
+        await self.db.production_logs.create_index([("cooperative_id", 1), ("date", 1)])
+        
+        server.db = self.db
+        server.columnar_store = server.ColumnarLogStore(True, server.COLUMNAR_STORE_MAX_BYTES)
+        start = time.perf_counter()
+        columns = {coop_id: await server.columnar_store.columns(coop_id) for coop_id in coop_ids}
+        stats = server.columnar_store.stats()
+        print(f"  load: {(time.perf_counter() - start) * 1000:.0f}ms, {stats['bytes'] / 1024 / 1024:.1f} MiB "
+              f"({stats['bytes'] / max(stats['rows'], 1):.0f} bytes/log, budget {stats['max_bytes'] / 1024 / 1024:.0f} MiB)")
+        
+        for group_by in ("energy_use", "month", "cooperative"):
+            async def mongo(i):
+                await server.mongo_breakdown({"post_harvest_loss_percent": {"$gt": 10}}, group_by)
+            
+            async def columnar(i):
+                server.columnar_breakdown(columns, group_by, None, None, 10, None, None)
+            
+            before = summarize(f"mongo $group by {group_by}", await self.timed(mongo, concurrency=1))
+            after = summarize(f"columnar by {group_by}", await self.timed(columnar, concurrency=1))
+            print(f"  -> {before / after:.1f}x faster")
+    
+    async def bench_user_directory(self):
+        """User directory: unindexed case-insensitive search vs prefix search on the lowercased fields"""
+        sys.path.insert(0, 'backend')
+        import server
+        
+        print(f"\n👥 User directory search ({DIRECTORY_USERS} users)")
+        first_names = ["Ama", "Kofi", "Abena", "Kwame", "Akosua", "Yaw", "Efua", "Kojo"]
+        coop_ids = [str(uuid.uuid4()) for _ in range(50)]
+        for offset in range(0, DIRECTORY_USERS, 10000):
+            users = []
+            for i in range(offset, min(offset + 10000, DIRECTORY_USERS)):
+                name = f"{first_names[i % len(first_names)]} Farmer{i}"
+                email = f"farmer{i}@coop{i % 50}.example.org"
+                users.append({
+                    "id": str(uuid.uuid4()), "email": email, "name": name, "role": "farmer",
+                    "cooperative_id": coop_ids[i % 50], **server.user_search_fields(email, name)
+                })
+            await self.db.users.insert_many(users)
+        
+        officer = {"id": "bench", "role": "officer"}
+        server.db = self.db
+        
+        async def regex_scan(i):
+            pattern = {"$regex": f"^kwame farmer{i}", "$options": "i"}
+            await self.db.users.find({"$or": [{"name": pattern}, {"email": pattern}]}, {"_id": 0, "password": 0}) \
+                .sort("name", 1).limit(100).to_list(100)
+        
+        async def prefix(i):
+            await server.get_users(Response(), q=f"kwame farmer{i}", current_user=officer)
+        
+        async def email_prefix(i):
+            await server.get_users(Response(), q=f"farmer{i}@", current_user=officer)
+        
+        async def browse_coop(i):
+            await server.get_users(Response(), cooperative_id=coop_ids[i % 50], current_user=officer)
+        
+        summarize("case-insensitive regex, no index", await self.timed(regex_scan, concurrency=1, rounds=5))
+        await self.db.users.create_index("email_lower")
+        await self.db.users.create_index([("name_lower", 1), ("id", 1)])
+        await self.db.users.create_index([("cooperative_id", 1), ("name_lower", 1), ("id", 1)])
+        summarize("name prefix on name_lower", await self.timed(prefix, concurrency=1))
+        summarize("email prefix on email_lower", await self.timed(email_prefix, concurrency=1))
+        summarize("cooperative page by name", await self.timed(browse_coop, concurrency=1))
+    
+    async def run(self, names):
+        benchmarks = {
+            name[len("bench_"):]: getattr(self, name)
+            for name in dir(self) if name.startswith("bench_")
+        }
+        selected = names or sorted(benchmarks)
+        print(f"🚀 Running DIMS benchmarks (concurrency={CONCURRENCY}, rounds={ROUNDS})")
+        for name in selected:
+            await self.reset()
+            await benchmarks[name]()
+        await self.reset()
+        self.client.close()
+
+
+def main():
+    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    asyncio.run(DIMSBenchmark(mongo_url).run(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    main()
@@ -48,8 +48,16 @@ const AdminTools = ({ user, api }) => {
     setLoading(true);
     setResult(null);
     try {
-      const response = await api.post('/reinit-data');
-      setResult(response.data);
+      const response = await api.post('/reinit-data', null, { params: { background: true } });
+      let run = { status: 'queued' };
+      while (run.status === 'queued' || run.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        run = (await api.get(`/jobs/runs/${response.data.run_id}`)).data;
+      }
+      if (run.status !== 'succeeded') {
+        throw { response: { data: { detail: run.error || `Reinitialization ${run.status}` } } };
+      }
+      setResult(run.result);
       toast.success('Data reinitialized successfully!');
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Failed to reinitialize data');
@@ -28,11 +28,9 @@ const DataEntriesView = ({ user, setUser, api }) => {
 
   const loadData = async () => {
     try {
-      const logsResponse = await api.get('/production-logs');
-      setProductionLogs(logsResponse.data);
-      
-      const coopsResponse = await api.get('/cooperatives');
-      setCooperatives(coopsResponse.data);
+      const response = await api.get('/dashboard?view=data-entries');
+      setProductionLogs(response.data.production_logs);
+      setCooperatives(response.data.cooperatives);
     } catch (error) {
       toast.error('Failed to load data entries');
     }
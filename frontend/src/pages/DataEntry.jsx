@@ -9,9 +9,37 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { ArrowLeft, Save } from 'lucide-react';
 import { toast } from 'sonner';
 
+const PENDING_KEY = 'pendingProductionLogs';
+
+const readPending = () => JSON.parse(localStorage.getItem(PENDING_KEY) || '[]');
+
+// Entries carry client-generated ids, so re-sending after a dropped
+// connection never creates a duplicate log on the server. Upload-only:
+// this page keeps no local copy to apply downloaded changes to
+const uploadPending = async (api) => {
+  const pending = readPending();
+  if (pending.length === 0) return;
+  const response = await api.post('/sync', { production_logs: pending, download: false });
+  const { created, existing, rejected } = response.data.uploaded.production_logs;
+  const done = new Set([...created, ...existing, ...rejected.map((r) => r.id)]);
+  localStorage.setItem(PENDING_KEY, JSON.stringify(readPending().filter((log) => !done.has(log.id))));
+  rejected.forEach((r) => toast.error(`Offline entry rejected: ${r.detail}`));
+  if (created.length > 0) toast.success(`${created.length} offline entr${created.length === 1 ? 'y' : 'ies'} uploaded`);
+};
+
 const DataEntry = ({ user, setUser, api }) => {
   const navigate = useNavigate();
   const [loading, setLoading] = useState(false);
+  const [pendingCount, setPendingCount] = useState(readPending().length);
+
+  useEffect(() => {
+    const flush = () => uploadPending(api)
+      .catch(() => {})
+      .finally(() => setPendingCount(readPending().length));
+    flush();
+    window.addEventListener('online', flush);
+    return () => window.removeEventListener('online', flush);
+  }, [api]);
   const [formData, setFormData] = useState({
     date: new Date().toISOString().split('T')[0],
     batch_period: '',
@@ -34,6 +62,7 @@ const DataEntry = ({ user, setUser, api }) => {
       const lossKg = (parseFloat(formData.total_production) * parseFloat(formData.post_harvest_loss_percent)) / 100;
 
       const logData = {
+        id: crypto.randomUUID(),
         cooperative_id: user.cooperative_id,
         date: new Date(formData.date).toISOString(),
         batch_period: formData.batch_period,
@@ -48,8 +77,15 @@ const DataEntry = ({ user, setUser, api }) => {
         corrective_action: formData.has_nonconformity ? formData.corrective_action : null
       };
 
-      await api.post('/production-logs', logData);
-      toast.success('Production data saved successfully!');
+      localStorage.setItem(PENDING_KEY, JSON.stringify([...readPending(), logData]));
+      try {
+        await uploadPending(api);
+        toast.success('Production data saved successfully!');
+      } catch (error) {
+        if (error.response) throw error;
+        toast.info('You are offline. The entry will be uploaded when the connection returns.');
+      }
+      setPendingCount(readPending().length);
       
       // Reset form
       setFormData({
@@ -95,7 +131,10 @@ const DataEntry = ({ user, setUser, api }) => {
         <Card className="border-0 shadow-lg">
           <CardHeader>
             <CardTitle>Data Entry Form</CardTitle>
-            <CardDescription>Enter production, quality, and loss information</CardDescription>
+            <CardDescription>
+              Enter production, quality, and loss information
+              {pendingCount > 0 && ` · ${pendingCount} entr${pendingCount === 1 ? 'y' : 'ies'} waiting to upload`}
+            </CardDescription>
           </CardHeader>
           <CardContent>
             <form onSubmit={handleSubmit} className="space-y-6" data-testid="data-entry-form">
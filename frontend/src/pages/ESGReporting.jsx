@@ -4,7 +4,10 @@ import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Badge } from '@/components/ui/badge';
-import { ArrowLeft, Leaf, Users, Shield, TrendingUp, Award, AlertCircle } from 'lucide-react';
+import { Input } from '@/components/ui/input';
+import { Label } from '@/components/ui/label';
+import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
+import { ArrowLeft, Leaf, Users, Shield, TrendingUp, Award, AlertCircle, Download } from 'lucide-react';
 import { LineChart, Line, BarChart, Bar, RadarChart, PolarGrid, PolarAngleAxis, PolarRadiusAxis, Radar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import { toast } from 'sonner';
 
@@ -14,6 +17,8 @@ const ESGReporting = ({ api }) => {
   const [productionLogs, setProductionLogs] = useState([]);
   const [nonconformities, setNonconformities] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [report, setReport] = useState({ cooperative_id: '', period: String(new Date().getFullYear()), format: 'pdf' });
+  const [reportStatus, setReportStatus] = useState(null);
 
   useEffect(() => {
     loadData();
@@ -35,6 +40,32 @@ const ESGReporting = ({ api }) => {
     setLoading(false);
   };
 
+  const handleDownloadReport = async () => {
+    setReportStatus({ status: 'queued', progress: 0 });
+    try {
+      let run = (await api.post('/reports', report)).data;
+      while (run.status === 'queued' || run.status === 'running') {
+        setReportStatus(run);
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        run = (await api.get(`/reports/${run.id}`)).data;
+      }
+      setReportStatus(run);
+      if (run.status !== 'succeeded') {
+        throw { response: { data: { detail: run.error || `Report ${run.status}` } } };
+      }
+      const file = await api.get(`/reports/${run.id}/download`, { responseType: 'blob' });
+      const url = URL.createObjectURL(file.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = run.filename;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (error) {
+      toast.error(error.response?.data?.detail || 'Failed to generate report');
+    }
+    setReportStatus(null);
+  };
+
   if (loading) {
     return (
       <div className="flex items-center justify-center min-h-screen">
@@ -387,6 +418,60 @@ const ESGReporting = ({ api }) => {
             </div>
           </TabsContent>
         </Tabs>
+        {/* Audit Report Download */}
+        <Card className="border-0 shadow-lg" data-testid="esg-report-download">
+          <CardHeader>
+            <CardTitle className="flex items-center gap-2">
+              <Download className="w-5 h-5" />
+              Audit Report
+            </CardTitle>
+            <CardDescription>
+              ESG and ISO 9001/14001/45001 report for one cooperative. Period is a year (2025), quarter (2025-Q2) or month (2025-06).
+            </CardDescription>
+          </CardHeader>
+          <CardContent className="grid grid-cols-1 md:grid-cols-4 gap-4 items-end">
+            <div className="space-y-2">
+              <Label>Cooperative</Label>
+              <Select value={report.cooperative_id} onValueChange={(value) => setReport({ ...report, cooperative_id: value })}>
+                <SelectTrigger data-testid="report-coop-select">
+                  <SelectValue placeholder="Select cooperative" />
+                </SelectTrigger>
+                <SelectContent>
+                  {cooperatives.map((coop) => (
+                    <SelectItem key={coop.id} value={coop.id}>{coop.name}</SelectItem>
+                  ))}
+                </SelectContent>
+              </Select>
+            </div>
+            <div className="space-y-2">
+              <Label htmlFor="report_period">Period</Label>
+              <Input
+                id="report_period"
+                value={report.period}
+                onChange={(e) => setReport({ ...report, period: e.target.value })}
+              />
+            </div>
+            <div className="space-y-2">
+              <Label>Format</Label>
+              <Select value={report.format} onValueChange={(value) => setReport({ ...report, format: value })}>
+                <SelectTrigger data-testid="report-format-select">
+                  <SelectValue />
+                </SelectTrigger>
+                <SelectContent>
+                  <SelectItem value="pdf">PDF</SelectItem>
+                  <SelectItem value="xlsx">Excel (XLSX)</SelectItem>
+                </SelectContent>
+              </Select>
+            </div>
+            <Button
+              onClick={handleDownloadReport}
+              disabled={!report.cooperative_id || reportStatus !== null}
+              data-testid="report-download-button"
+            >
+              {reportStatus ? `Generating... ${reportStatus.progress || 0}%` : 'Generate & Download'}
+            </Button>
+          </CardContent>
+        </Card>
       </main>
     </div>
   );
@@ -155,7 +155,7 @@ const FarmerCommunity = ({ user, api }) => {
                   <p className="text-xs text-green-100">Farmers</p>
                 </div>
                 <div className="bg-white/20 backdrop-blur-sm rounded-lg p-3 text-center">
-                  <p className="text-3xl font-bold">{coopStats.avg_quality?.toFixed(0) || '88'}%</p>
+                  <p className="text-3xl font-bold">{coopStats.avg_quality_a?.toFixed(0) || '88'}%</p>
                   <p className="text-xs text-green-100">Avg Quality</p>
                 </div>
                 <div className="bg-white/20 backdrop-blur-sm rounded-lg p-3 text-center">
@@ -20,16 +20,11 @@ const FarmerHome = ({ user, setUser, api }) => {
 
   const loadData = async () => {
     try {
-      // Get cooperative info
-      if (user?.cooperative_id) {
-        const coopResponse = await api.get(`/cooperatives/${user.cooperative_id}`);
-        setCooperative(coopResponse.data);
-      }
-
-      // Get farmer's production logs (simulated - in reality would filter by farmer_id)
-      const logsResponse = await api.get('/production-logs');
-      const farmerLogs = logsResponse.data.filter(log => log.cooperative_id === user?.cooperative_id).slice(0, 7);
-      setMyProduction(farmerLogs);
+      // Get cooperative info and the cooperative's latest production logs
+      // (simulated - in reality would filter by farmer_id)
+      const response = await api.get('/dashboard');
+      setCooperative(response.data.cooperative);
+      setMyProduction(response.data.production_logs);
     } catch (error) {
       toast.error('Failed to load data');
     }
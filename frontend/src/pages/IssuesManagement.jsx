@@ -39,11 +39,9 @@ const IssuesManagement = ({ user, setUser, api }) => {
 
   const loadData = async () => {
     try {
-      const ncsResponse = await api.get('/nonconformities');
-      setNonconformities(ncsResponse.data);
-      
-      const coopsResponse = await api.get('/cooperatives');
-      setCooperatives(coopsResponse.data);
+      const response = await api.get('/dashboard?view=issues');
+      setNonconformities(response.data.nonconformities);
+      setCooperatives(response.data.cooperatives);
     } catch (error) {
       toast.error('Failed to load issues');
     }
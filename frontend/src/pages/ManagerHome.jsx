@@ -18,13 +18,10 @@ const ManagerHome = ({ user, setUser, api }) => {
 
   const loadData = async () => {
     try {
-      // Load cooperative details
-      const coopResponse = await api.get(`/cooperatives/${user.cooperative_id}`);
-      setCooperative(coopResponse.data);
-      
-      // Load KPIs
-      const kpiResponse = await api.get(`/kpis/cooperative/${user.cooperative_id}`);
-      setKpis(kpiResponse.data);
+      // Load cooperative details and KPIs in one round trip
+      const response = await api.get('/dashboard');
+      setCooperative(response.data.cooperative);
+      setKpis(response.data.kpis);
     } catch (error) {
       toast.error('Failed to load data');
     }
@@ -2,13 +2,16 @@ import { useState, useEffect } from 'react';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Input } from '@/components/ui/input';
+import { Textarea } from '@/components/ui/textarea';
 import { Label } from '@/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { Badge } from '@/components/ui/badge';
-import { Users, Plus, Edit, Trash2, Search } from 'lucide-react';
+import { Users, Plus, Edit, Trash2, Search, Upload } from 'lucide-react';
 import { toast } from 'sonner';
 
+const USERS_PAGE_SIZE = 50;
+
 const UserManagement = ({ api }) => {
   const [users, setUsers] = useState([]);
   const [cooperatives, setCooperatives] = useState([]);
@@ -17,6 +20,11 @@ const UserManagement = ({ api }) => {
   const [isEditing, setIsEditing] = useState(false);
   const [currentUser, setCurrentUser] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [isBulkOpen, setIsBulkOpen] = useState(false);
+  const [bulkCsv, setBulkCsv] = useState('email,name,role,password,cooperative_id\n');
+  const [bulkResult, setBulkResult] = useState(null);
+  const [bulkSubmitting, setBulkSubmitting] = useState(false);
   const [formData, setFormData] = useState({
     email: '',
     password: '',
@@ -26,22 +34,48 @@ const UserManagement = ({ api }) => {
   });
 
   useEffect(() => {
-    loadData();
+    const loadCooperatives = async () => {
+      try {
+        const coopsResponse = await api.get('/cooperatives');
+        setCooperatives(coopsResponse.data);
+      } catch (error) {
+        toast.error('Failed to load cooperatives');
+      }
+    };
+    loadCooperatives();
   }, []);
 
+  // Search runs on the server; wait for typing to pause before querying
+  useEffect(() => {
+    const timer = setTimeout(() => loadData(), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  const loadUsers = async (cursor = null) => {
+    const usersResponse = await api.get('/users', {
+      params: { q: searchTerm || undefined, cursor: cursor || undefined, limit: USERS_PAGE_SIZE }
+    });
+    setUsers(previous => cursor ? [...previous, ...usersResponse.data] : usersResponse.data);
+    setNextCursor(usersResponse.headers['x-next-cursor'] || null);
+  };
+
   const loadData = async () => {
     try {
-      const usersResponse = await api.get('/users');
-      setUsers(usersResponse.data);
-      
-      const coopsResponse = await api.get('/cooperatives');
-      setCooperatives(coopsResponse.data);
+      await loadUsers();
     } catch (error) {
       toast.error('Failed to load users');
     }
     setLoading(false);
   };
 
+  const handleLoadMore = async () => {
+    try {
+      await loadUsers(nextCursor);
+    } catch (error) {
+      toast.error('Failed to load users');
+    }
+  };
+
   const handleOpenDialog = (user = null) => {
     if (user) {
       setIsEditing(true);
@@ -96,6 +130,19 @@ const UserManagement = ({ api }) => {
     }
   };
 
+  const handleBulkImport = async () => {
+    setBulkSubmitting(true);
+    try {
+      const response = await api.post('/users/bulk', { csv: bulkCsv });
+      setBulkResult(response.data);
+      toast.success(`${response.data.created} users created`);
+      loadData();
+    } catch (error) {
+      toast.error(error.response?.data?.detail || 'Bulk import failed');
+    }
+    setBulkSubmitting(false);
+  };
+
   const handleDelete = async (userId) => {
     if (!window.confirm('Are you sure you want to delete this user?')) {
       return;
@@ -119,11 +166,6 @@ const UserManagement = ({ api }) => {
     return colors[role] || 'bg-gray-100 text-gray-700';
   };
 
-  const filteredUsers = users.filter(user => 
-    user.email.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    user.name.toLowerCase().includes(searchTerm.toLowerCase())
-  );
-
   if (loading) {
     return <div className="flex items-center justify-center min-h-screen">Loading...</div>;
   }
@@ -138,12 +180,18 @@ const UserManagement = ({ api }) => {
                 <Users className="w-5 h-5" />
                 User Management
               </CardTitle>
-              <CardDescription>{users.length} users total</CardDescription>
+              <CardDescription>{users.length}{nextCursor ? '+' : ''} users{searchTerm ? ' matching' : ''}</CardDescription>
+            </div>
+            <div className="flex gap-2">
+              <Button variant="outline" onClick={() => { setBulkResult(null); setIsBulkOpen(true); }}>
+                <Upload className="w-4 h-4 mr-2" />
+                Bulk Import
+              </Button>
+              <Button onClick={() => handleOpenDialog()} className="bg-emerald-600 hover:bg-emerald-700">
+                <Plus className="w-4 h-4 mr-2" />
+                Add User
+              </Button>
             </div>
-            <Button onClick={() => handleOpenDialog()} className="bg-emerald-600 hover:bg-emerald-700">
-              <Plus className="w-4 h-4 mr-2" />
-              Add User
-            </Button>
           </div>
         </CardHeader>
         <CardContent className="space-y-4">
@@ -151,7 +199,7 @@ const UserManagement = ({ api }) => {
           <div className="relative">
             <Search className="absolute left-3 top-3 w-4 h-4 text-gray-400" />
             <Input 
-              placeholder="Search users by name or email..."
+              placeholder="Search users by name or email prefix..."
               value={searchTerm}
               onChange={(e) => setSearchTerm(e.target.value)}
               className="pl-10"
@@ -160,10 +208,10 @@ const UserManagement = ({ api }) => {
 
           {/* Users List */}
           <div className="space-y-3">
-            {filteredUsers.length === 0 ? (
+            {users.length === 0 ? (
               <p className="text-center text-gray-500 py-8">No users found</p>
             ) : (
-              filteredUsers.map((user) => {
+              users.map((user) => {
                 const coop = cooperatives.find(c => c.id === user.cooperative_id);
                 return (
                   <Card key={user.id} className="border border-gray-200">
@@ -208,6 +256,13 @@ const UserManagement = ({ api }) => {
               })
             )}
           </div>
+          {nextCursor && (
+            <div className="flex justify-center">
+              <Button variant="outline" onClick={handleLoadMore}>
+                Load more
+              </Button>
+            </div>
+          )}
         </CardContent>
       </Card>
 
@@ -301,6 +356,48 @@ const UserManagement = ({ api }) => {
           </form>
         </DialogContent>
       </Dialog>
+
+      {/* Bulk Import Dialog */}
+      <Dialog open={isBulkOpen} onOpenChange={setIsBulkOpen}>
+        <DialogContent className="max-w-2xl">
+          <DialogHeader>
+            <DialogTitle>Bulk Import Users</DialogTitle>
+            <DialogDescription>
+              Paste CSV with columns email, name, role (officer, manager or farmer), password and optionally cooperative_id
+            </DialogDescription>
+          </DialogHeader>
+          <div className="space-y-4">
+            <Textarea
+              value={bulkCsv}
+              onChange={(e) => setBulkCsv(e.target.value)}
+              rows={10}
+              className="font-mono text-sm"
+            />
+            {bulkResult && (
+              <div className="space-y-2">
+                <p className="text-sm text-gray-700">
+                  {bulkResult.created} created, {bulkResult.duplicate} skipped as duplicates, {bulkResult.invalid} invalid
+                </p>
+                <div className="max-h-40 overflow-y-auto space-y-1">
+                  {bulkResult.results.filter(row => row.status !== 'created').map(row => (
+                    <p key={row.row} className="text-xs text-red-600">
+                      Row {row.row + 1} ({row.email || 'no email'}): {row.detail}
+                    </p>
+                  ))}
+                </div>
+              </div>
+            )}
+            <div className="flex justify-end gap-2">
+              <Button type="button" variant="outline" onClick={() => setIsBulkOpen(false)}>
+                Close
+              </Button>
+              <Button onClick={handleBulkImport} disabled={bulkSubmitting} className="bg-emerald-600 hover:bg-emerald-700">
+                {bulkSubmitting ? 'Importing...' : 'Import'}
+              </Button>
+            </div>
+          </div>
+        </DialogContent>
+      </Dialog>
     </div>
   );
 };
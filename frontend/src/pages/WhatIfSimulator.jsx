@@ -49,7 +49,19 @@ const WhatIfSimulator = ({ user, setUser, api }) => {
 
   const loadCooperativeData = async (coopId) => {
     try {
-      // Get recent production logs to calculate averages
+      // Prefill from the next-period forecast when there is enough history
+      const forecastResponse = await api.get(`/forecast?cooperative_id=${coopId}&periods=1`);
+      const forecast = forecastResponse.data.forecasts[0];
+      if (forecast && !forecast.insufficient_history) {
+        setInputs(prev => ({
+          ...prev,
+          current_loss_percent: Math.round(forecast.post_harvest_loss_percent[0].value * 10) / 10,
+          avg_production_kg: Math.round(forecast.total_production[0].value)
+        }));
+        return;
+      }
+
+      // Otherwise fall back to averaging recent production logs
       const response = await api.get(`/production-logs?cooperative_id=${coopId}`);
       if (response.data.length > 0) {
         const logs = response.data.slice(0, 10);
@@ -0,0 +1,115 @@
+"""
+Microbenchmark harness with a stored baseline.
+
+Every timed round of a benchmark is paired with a round of a fixed
+pure-Python calibration workload run right before it, and the benchmark is
+scored by the median of the two rounds' ratio. Machine speed, CPU frequency
+changes and noisy neighbours affect both halves of a pair alike, so a baseline
+saved on one machine stays meaningful on another. A benchmark fails when its
+score is more than BENCH_TOLERANCE above the baseline.
+"""
+import gc
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+import pytest
+
+BENCH_ENABLED = os.environ.get('DIMS_BENCHMARKS', '').lower() in ('1', 'true', 'yes')
+BENCH_SAVE = os.environ.get('BENCH_SAVE', '').lower() in ('1', 'true', 'yes')
+BENCH_TOLERANCE = float(os.environ.get('BENCH_TOLERANCE', '0.25'))
+BENCH_BASELINE = Path(os.environ.get('BENCH_BASELINE', Path(__file__).with_name('baseline.json')))
+BENCH_ROUNDS = int(os.environ.get('BENCH_ROUNDS', '15'))
+BENCH_MIN_ROUND_SECONDS = float(os.environ.get('BENCH_MIN_ROUND_SECONDS', '0.01'))
+
+
+def calibration_workload():
+    """Interpreter-bound reference work: dict building, string formatting, float sums"""
+    rows = [{"id": f"row-{i}", "value": i * 0.5} for i in range(2000)]
+    return sum(row["value"] for row in rows if row["id"][-1] != "7")
+
+
+def calls_per_round(func) -> int:
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= BENCH_MIN_ROUND_SECONDS:
+            return number
+        number *= 2
+
+
+def timed_round(func, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+
+def measure(func) -> tuple:
+    """(fastest per-call seconds, median ratio to the calibration workload) over BENCH_ROUNDS paired rounds"""
+    func()  # warm caches and lazy imports
+    # As in timeit: collections triggered by earlier allocations would land in random rounds
+    gc.collect()
+    gc.disable()
+    try:
+        number = calls_per_round(func)
+        calibration_number = calls_per_round(calibration_workload)
+        seconds, ratios = [], []
+        for _ in range(BENCH_ROUNDS):
+            calibration = timed_round(calibration_workload, calibration_number)
+            seconds.append(timed_round(func, number))
+            ratios.append(seconds[-1] / calibration)
+        return min(seconds), statistics.median(ratios)
+    finally:
+        gc.enable()
+
+
+class BenchmarkSession:
+    def __init__(self):
+        self.baseline = json.loads(BENCH_BASELINE.read_text())['benchmarks'] if BENCH_BASELINE.exists() else {}
+        self.results = {}
+
+    def run(self, name: str, func) -> float:
+        seconds, relative = measure(func)
+        self.results[name] = {"seconds": seconds, "relative": relative}
+        expected = self.baseline.get(name, {}).get('relative')
+        if expected and not BENCH_SAVE and relative > expected * (1 + BENCH_TOLERANCE):
+            pytest.fail(
+                f"{name} regressed {relative / expected - 1:+.0%} against the baseline "
+                f"({seconds * 1e6:.1f}us, tolerance {BENCH_TOLERANCE:.0%})"
+            )
+        return seconds
+
+    def save(self):
+        BENCH_BASELINE.write_text(json.dumps({"benchmarks": {**self.baseline, **self.results}}, indent=2, sort_keys=True) + "\n")
+
+
+_sessions = []
+
+
+@pytest.fixture(scope="session")
+def benchmark_session():
+    session = BenchmarkSession()
+    _sessions.append(session)
+    yield session
+    if BENCH_SAVE:
+        session.save()
+
+
+def pytest_terminal_summary(terminalreporter):
+    for session in _sessions:
+        terminalreporter.section("benchmarks (fastest round, change vs baseline)")
+        for name, result in sorted(session.results.items()):
+            expected = session.baseline.get(name, {}).get('relative')
+            change = f"{result['relative'] / expected - 1:+6.1%}" if expected else "new"
+            terminalreporter.write_line(f"{name:<44} {result['seconds'] * 1e6:12.1f}us  {change:>7}")
+
+
+@pytest.fixture
+def bench(benchmark_session, request):
+    """bench(func) times func() and checks it against the baseline under the test's name"""
+    return lambda func: benchmark_session.run(request.node.name, func)
@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+import server
+
+from .conftest import BENCH_ENABLED
+
+pytestmark = pytest.mark.skipif(not BENCH_ENABLED, reason="set DIMS_BENCHMARKS=1 to run microbenchmarks")
+
+OFFICER = {"id": "officer-1", "email": "officer@dims.com", "name": "Officer", "role": "officer"}
+N_LOGS = 1000
+N_COOPS = 50
+
+
+def make_logs(n, coop_id="coop-0"):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"log-{coop_id}-{i}", "cooperative_id": coop_id, "date": (start + timedelta(hours=i)).isoformat(),
+            "batch_period": f"Week {i % 52 + 1}", "total_production": 1000.0 + i % 97, "grade_a_percent": 70.0 + i % 20,
+            "grade_b_percent": 30.0 - i % 20, "post_harvest_loss_percent": 4.0 + i % 11,
+            "post_harvest_loss_kg": 40.0 + i % 11, "energy_use": ("Low", "Medium", "High")[i % 3],
+            "has_nonconformity": i % 10 == 0, "anomaly_flags": [], "created_at": start.isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+def make_ncs(n, coop_id="coop-0"):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"nc-{i}", "cooperative_id": coop_id, "date": (start + timedelta(hours=i)).isoformat(),
+            "category": ("quality", "safety", "environmental")[i % 3], "severity": server.SEVERITY_LEVELS[i % 4],
+            "description": "Moisture above specification", "corrective_action": "Re-dry batch",
+            "status": ("open", "in_progress", "closed")[i % 3], "assigned_to": "qa@example.com",
+            "closed_date": (start + timedelta(hours=i + 48)).isoformat() if i % 3 == 2 else None,
+            "created_at": start.isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def stand_in_db(fake_db, monkeypatch):
+    """Cooperatives with a few logs and issues each, looked up by id / cooperative without scanning"""
+    coops = [{"id": f"coop-{i}", "name": f"Coop {i}"} for i in range(N_COOPS)]
+    fake_db.add("users", [OFFICER], index="id")
+    fake_db.add("cooperatives", coops)
+    fake_db.add("production_logs", [log for coop in coops for log in make_logs(10, coop["id"])], index="cooperative_id")
+    fake_db.add("nonconformities", [nc for coop in coops for nc in make_ncs(5, coop["id"])], index="cooperative_id")
+    monkeypatch.setattr(server, "single_flight", server.SingleFlight())
+    monkeypatch.setattr(server, "KPI_RESULT_TTL_SECONDS", 0.0)
+    monkeypatch.setattr(server, "columnar_store", server.ColumnarLogStore(False, 0))
+    return fake_db
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_create_access_token(bench):
+    bench(lambda: server.create_access_token({"sub": OFFICER["id"], "email": OFFICER["email"]}))
+
+
+def test_get_current_user(bench, stand_in_db, loop):
+    token = server.create_access_token({"sub": OFFICER["id"], "email": OFFICER["email"]})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    bench(lambda: loop.run_until_complete(server.get_current_user(credentials)))
+
+
+def test_loss_reduction_scenario(bench, loop):
+    scenario = server.ScenarioRequest(
+        cooperative_id="coop-0", current_loss_percent=12.5, target_loss_percent=6.0,
+        price_per_kg=3.2, avg_production_kg=15000.0,
+    )
+    bench(lambda: loop.run_until_complete(server.calculate_loss_reduction_scenario(scenario, current_user=OFFICER)))
+
+
+def test_overview_kpis(bench, stand_in_db, loop):
+    bench(lambda: loop.run_until_complete(server.compute_overview_kpis()))
+
+
+def test_columnar_breakdown(bench):
+    columns = server.LogColumns()
+    for log in make_logs(20000):
+        columns.upsert(log, 0)
+    bench(lambda: server.columnar_breakdown({"coop-0": columns}, "month", None, None, 5.0, None, None))
+
+
+def test_validate_production_logs(bench):
+    adapter = TypeAdapter(List[server.ProductionLog])
+    logs = make_logs(N_LOGS)
+    bench(lambda: adapter.validate_python(logs))
+
+
+def test_serialize_production_logs(bench):
+    adapter = TypeAdapter(List[server.ProductionLog])
+    logs = adapter.validate_python(make_logs(N_LOGS))
+    bench(lambda: adapter.dump_json(logs))
+
+
+def test_validate_and_serialize_nonconformities(bench):
+    adapter = TypeAdapter(List[server.Nonconformity])
+    ncs = make_ncs(N_LOGS)
+    bench(lambda: adapter.dump_json(adapter.validate_python(ncs)))
+
+
+def test_sparse_production_log_response(bench):
+    logs = make_logs(N_LOGS)
+    fields = server.parse_fields("date,total_production,post_harvest_loss_percent", server.ProductionLog)
+    bench(lambda: server.sparse_response(logs, server.ProductionLog, fields))
+
+
+def test_production_log_date_conversion(bench, stand_in_db, loop):
+    stand_in_db.add("production_logs", make_logs(N_LOGS))
+    bench(lambda: loop.run_until_complete(server.get_production_logs(current_user=OFFICER)))
+
+
+def test_nonconformity_date_conversion(bench, stand_in_db, loop):
+    stand_in_db.add("nonconformities", make_ncs(N_LOGS))
+    bench(lambda: loop.run_until_complete(server.get_nonconformities(current_user=OFFICER)))
+
+
+def test_user_directory_page(bench, stand_in_db, loop):
+    users = [
+        {"id": f"u{i}", "email": f"farmer{i}@coop.org", "name": f"Farmer {i}", "role": "farmer",
+         "timestamp": "2025-01-01T00:00:00+00:00", **server.user_search_fields(f"farmer{i}@coop.org", f"Farmer {i}")}
+        for i in range(100)
+    ]
+    stand_in_db.add("users", users)
+    bench(lambda: loop.run_until_complete(server.get_users(Response(), current_user=OFFICER)))
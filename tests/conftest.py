@@ -0,0 +1,25 @@
+"""
+Shared test setup: the backend is imported as `server` with a local MongoDB
+URL (Motor connects lazily, so no server is needed), and `fake_db` swaps in
+the in-memory database from fakes.py.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "dims_test")
+
+import server  # noqa: E402
+
+from .fakes import FakeDB  # noqa: E402
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(server, "db", db)
+    return db
@@ -0,0 +1,452 @@
+"""
+In-memory stand-in for the Motor database.
+
+Collections keep plain dicts and evaluate the subset of MongoDB queries and
+updates the server sends (equality, comparison, $in, $or/$and, $regex,
+$exists; $set, $inc, $unset, $push, $max/$min, $setOnInsert). Every call is
+recorded in FakeDB.calls as (collection, method, filter) so tests can assert
+on the queries a route makes.
+"""
+import asyncio
+import copy
+import re
+import uuid
+from types import SimpleNamespace
+
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+MISSING = object()
+
+
+def get_path(doc, path):
+    for part in path.split('.'):
+        if not isinstance(doc, dict) or part not in doc:
+            return MISSING
+        doc = doc[part]
+    return doc
+
+
+def set_path(doc, path, value):
+    *parents, leaf = path.split('.')
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[leaf] = value
+
+
+def unset_path(doc, path):
+    *parents, leaf = path.split('.')
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(leaf, None)
+
+
+def equals(value, expected):
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return (None if value is MISSING else value) == expected
+
+
+def compare(value, op, operand, options=""):
+    if op == "$exists":
+        return (value is not MISSING) == bool(operand)
+    if op == "$ne":
+        return not equals(value, operand)
+    if op == "$in":
+        return any(equals(value, candidate) for candidate in operand)
+    if op == "$nin":
+        return not any(equals(value, candidate) for candidate in operand)
+    if value is MISSING or value is None:
+        return False
+    if op == "$regex":
+        flags = re.IGNORECASE if "i" in options else 0
+        return isinstance(value, str) and re.search(operand, value, flags) is not None
+    if op in ("$gt", "$gte", "$lt", "$lte"):
+        try:
+            return {"$gt": value > operand, "$gte": value >= operand, "$lt": value < operand, "$lte": value <= operand}[op]
+        except TypeError:
+            return False
+    raise NotImplementedError(f"query operator {op}")
+
+
+def matches(doc, query):
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            value = get_path(doc, key)
+            options = condition.get("$options", "")
+            if not all(compare(value, op, operand, options) for op, operand in condition.items() if op != "$options"):
+                return False
+        elif not equals(get_path(doc, key), condition):
+            return False
+    return True
+
+
+def project(doc, projection):
+    """Shallow copy of the projected top-level fields"""
+    if not projection:
+        return dict(doc)
+    included = {field.split('.')[0] for field, keep in projection.items() if keep and field != "_id"}
+    if included:
+        fields = included | ({"_id"} if projection.get("_id", 1) else set())
+        return {field: value for field, value in doc.items() if field in fields}
+    excluded = {field for field, keep in projection.items() if not keep}
+    return {field: value for field, value in doc.items() if field not in excluded}
+
+
+def sort_docs(docs, keys):
+    for field, direction in reversed(keys):
+        def key(doc, field=field):
+            value = get_path(doc, field)
+            return (0, "") if value is MISSING or value is None else (1, value)
+        docs = sorted(docs, key=key, reverse=direction == -1)
+    return docs
+
+
+def sort_keys(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return list(key_or_list)
+
+
+def apply_update(doc, update, inserting=False):
+    if isinstance(update, list):
+        raise NotImplementedError("pipeline updates")
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            current = get_path(doc, path)
+            if op in ("$set", "$setOnInsert"):
+                set_path(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                unset_path(doc, path)
+            elif op == "$inc":
+                set_path(doc, path, (0 if current is MISSING else current) + value)
+            elif op == "$max":
+                set_path(doc, path, value if current is MISSING else max(current, value))
+            elif op == "$min":
+                set_path(doc, path, value if current is MISSING else min(current, value))
+            elif op == "$push":
+                items = list([] if current is MISSING else current)
+                spec = value if isinstance(value, dict) and "$each" in value else {"$each": [value]}
+                items += copy.deepcopy(spec["$each"])
+                if "$sort" in spec:
+                    items = sort_docs(items, list(spec["$sort"].items()))
+                if "$slice" in spec:
+                    items = items[:spec["$slice"]] if spec["$slice"] >= 0 else items[spec["$slice"]:]
+                set_path(doc, path, items)
+            else:
+                raise NotImplementedError(f"update operator {op}")
+
+
+class FakeCursor:
+    def __init__(self, collection, docs, projection):
+        self.collection = collection
+        self.docs = docs
+        self.projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = sort_keys(key_or_list, direction)
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def _results(self):
+        docs = sort_docs(self.docs, self._sort) if self._sort else self.docs
+        docs = docs[self._skip:self._skip + self._limit] if self._limit else docs[self._skip:]
+        return [project(doc, self.projection) for doc in docs]
+
+    async def to_list(self, length=None):
+        await self.collection.database.pause()
+        results = self._results()
+        return results if length is None else results[:length]
+
+    async def __aiter__(self):
+        for doc in self._results():
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, database, name, docs=(), unique=(), index=None):
+        self.database = database
+        self.name = name
+        self.docs = [dict(doc) for doc in docs]
+        self.unique = tuple(unique)
+        # Equality lookups on this field skip the scan (for benchmarks)
+        self.index = index
+        self._by_index = None
+
+    # ----- reads -----
+
+    def _record(self, method, query):
+        self.database.calls.append((self.name, method, query))
+
+    def _candidates(self, query):
+        if self.index and query and self.index in query and not isinstance(query[self.index], dict):
+            if self._by_index is None:
+                self._by_index = {}
+                for doc in self.docs:
+                    self._by_index.setdefault(doc.get(self.index), []).append(doc)
+            return self._by_index.get(query[self.index], [])
+        return self.docs
+
+    def _matching(self, query):
+        return [doc for doc in self._candidates(query) if matches(doc, query)]
+
+    def find(self, filter=None, projection=None, session=None, **kwargs):
+        self._record("find", filter or {})
+        cursor = FakeCursor(self, self._matching(filter), projection)
+        if "sort" in kwargs:
+            cursor.sort(kwargs["sort"])
+        if "limit" in kwargs:
+            cursor.limit(kwargs["limit"])
+        return cursor
+
+    async def find_one(self, filter=None, projection=None, session=None, sort=None, **kwargs):
+        self._record("find_one", filter or {})
+        await self.database.pause()
+        docs = self._matching(filter)
+        if sort:
+            docs = sort_docs(docs, sort_keys(sort))
+        return project(docs[0], projection) if docs else None
+
+    async def count_documents(self, filter, limit=0, session=None, **kwargs):
+        self._record("count_documents", filter)
+        await self.database.pause()
+        count = len(self._matching(filter))
+        return min(count, limit) if limit else count
+
+    async def distinct(self, key, filter=None, session=None):
+        self._record("distinct", filter or {})
+        await self.database.pause()
+        values = []
+        for doc in self._matching(filter):
+            value = get_path(doc, key)
+            for item in (value if isinstance(value, list) else [value]):
+                if item is not MISSING and item not in values:
+                    values.append(item)
+        return values
+
+    # ----- writes -----
+
+    def _changed(self):
+        self._by_index = None
+
+    def _check_unique(self, doc, replacing=None):
+        for field in self.unique:
+            if any(other is not doc and other is not replacing and other.get(field) == doc.get(field) for other in self.docs):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {field}_1")
+
+    def _insert(self, doc):
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", uuid.uuid4().hex)
+        self._check_unique(doc)
+        self.docs.append(doc)
+        self._changed()
+        return doc["_id"]
+
+    async def insert_one(self, doc, session=None, **kwargs):
+        self._record("insert_one", None)
+        await self.database.pause()
+        return SimpleNamespace(inserted_id=self._insert(doc))
+
+    async def insert_many(self, docs, ordered=True, session=None, **kwargs):
+        self._record("insert_many", None)
+        await self.database.pause()
+        inserted, errors = [], []
+        for index, doc in enumerate(docs):
+            try:
+                inserted.append(self._insert(doc))
+            except DuplicateKeyError as exc:
+                errors.append({"index": index, "code": 11000, "errmsg": str(exc), "op": doc})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=inserted)
+
+    def _update(self, filter, update, upsert, many):
+        docs = self._matching(filter)
+        if not many:
+            docs = docs[:1]
+        for doc in docs:
+            before = copy.deepcopy(doc)
+            apply_update(doc, update)
+            try:
+                self._check_unique(doc)
+            except DuplicateKeyError:
+                doc.clear()
+                doc.update(before)
+                raise
+        upserted_id = None
+        if not docs and upsert:
+            doc = {key: value for key, value in filter.items() if not key.startswith("$") and not isinstance(value, dict)}
+            apply_update(doc, update, inserting=True)
+            upserted_id = self._insert(doc)
+        self._changed()
+        return SimpleNamespace(matched_count=len(docs), modified_count=len(docs), upserted_id=upserted_id)
+
+    async def update_one(self, filter, update, upsert=False, session=None, **kwargs):
+        self._record("update_one", filter)
+        await self.database.pause()
+        return self._update(filter, update, upsert, many=False)
+
+    async def update_many(self, filter, update, upsert=False, session=None, **kwargs):
+        self._record("update_many", filter)
+        await self.database.pause()
+        return self._update(filter, update, upsert, many=True)
+
+    async def replace_one(self, filter, replacement, upsert=False, session=None, **kwargs):
+        self._record("replace_one", filter)
+        await self.database.pause()
+        docs = self._matching(filter)[:1]
+        for doc in docs:
+            _id = doc.get("_id")
+            doc.clear()
+            doc.update(copy.deepcopy(replacement))
+            doc["_id"] = _id
+        if not docs and upsert:
+            self._insert(replacement)
+        self._changed()
+        return SimpleNamespace(matched_count=len(docs), modified_count=len(docs))
+
+    def _delete(self, filter, many):
+        docs = self._matching(filter)
+        if not many:
+            docs = docs[:1]
+        self.docs = [doc for doc in self.docs if not any(doc is deleted for deleted in docs)]
+        self._changed()
+        return docs
+
+    async def delete_one(self, filter, session=None, **kwargs):
+        self._record("delete_one", filter)
+        await self.database.pause()
+        return SimpleNamespace(deleted_count=len(self._delete(filter, many=False)))
+
+    async def delete_many(self, filter, session=None, **kwargs):
+        self._record("delete_many", filter)
+        await self.database.pause()
+        return SimpleNamespace(deleted_count=len(self._delete(filter, many=True)))
+
+    async def find_one_and_update(self, filter, update, projection=None, upsert=False,
+                                  return_document=ReturnDocument.BEFORE, session=None, sort=None, **kwargs):
+        self._record("find_one_and_update", filter)
+        await self.database.pause()
+        docs = self._matching(filter)
+        if sort:
+            docs = sort_docs(docs, sort_keys(sort))
+        if docs:
+            before = project(docs[0], projection)
+            updated = copy.deepcopy(docs[0])
+            apply_update(updated, update)
+            self._check_unique(updated, replacing=docs[0])
+            docs[0].clear()
+            docs[0].update(updated)
+            self._changed()
+            return project(docs[0], projection) if return_document == ReturnDocument.AFTER else before
+        if upsert:
+            result = self._update(filter, update, upsert=True, many=False)
+            created = next(doc for doc in self.docs if doc.get("_id") == result.upserted_id)
+            return project(created, projection) if return_document == ReturnDocument.AFTER else None
+        return None
+
+    async def find_one_and_delete(self, filter, projection=None, session=None, **kwargs):
+        self._record("find_one_and_delete", filter)
+        await self.database.pause()
+        deleted = self._delete(filter, many=False)
+        return project(deleted[0], projection) if deleted else None
+
+    async def bulk_write(self, requests, ordered=True, session=None, **kwargs):
+        self._record("bulk_write", [(getattr(request, "_filter", None), getattr(request, "_doc", None)) for request in requests])
+        await self.database.pause()
+        for request in requests:
+            if isinstance(request, InsertOne):
+                self._insert(request._doc)
+            elif isinstance(request, (UpdateOne, UpdateMany)):
+                self._update(request._filter, request._doc, request._upsert, many=isinstance(request, UpdateMany))
+            elif isinstance(request, ReplaceOne):
+                await self.replace_one(request._filter, request._doc, upsert=request._upsert)
+            elif isinstance(request, (DeleteOne, DeleteMany)):
+                self._delete(request._filter, many=isinstance(request, DeleteMany))
+        return SimpleNamespace(acknowledged=True)
+
+    async def create_index(self, keys, **kwargs):
+        return keys if isinstance(keys, str) else "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    async def drop_index(self, name):
+        self._record("drop_index", name)
+
+    async def estimated_document_count(self):
+        self._record("estimated_document_count", {})
+        return len(self.docs)
+
+    async def drop(self, session=None):
+        self._record("drop", {})
+        self.database._collections.pop(self.name, None)
+
+    async def rename(self, new_name, dropTarget=False, session=None):
+        self._record("rename", {"to": new_name})
+        if new_name in self.database._collections and not dropTarget:
+            raise OperationFailure(f"target namespace {new_name} exists")
+        self.database._collections.pop(self.name, None)
+        self.database._collections[new_name] = self
+        self.name = new_name
+
+
+class FakeDB:
+    """Collections are created on first use; `latency` makes every call yield to the event loop for that long"""
+
+    def __init__(self, latency: float = 0.0, **collections):
+        self.latency = latency
+        self.calls = []
+        self._collections = {}
+        for name, docs in collections.items():
+            self.add(name, docs)
+
+    def add(self, name, docs=(), **options) -> FakeCollection:
+        self._collections[name] = FakeCollection(self, name, docs, **options)
+        return self._collections[name]
+
+    def __getitem__(self, name) -> FakeCollection:
+        if name not in self._collections:
+            self.add(name)
+        return self._collections[name]
+
+    def __getattr__(self, name) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def pause(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def queries(self, method=None, collection=None) -> list:
+        """Filters of the recorded calls, optionally only those of one method and/or collection"""
+        return [
+            query for name, called, query in self.calls
+            if (method is None or called == method) and (collection is None or name == collection)
+        ]
@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import server
+
+
+def test_rate_limits_fill_in_anonymous_and_auth():
+    limits = server.parse_rate_limits("officer:20/60, farmer:5")
+
+    assert limits == {
+        "officer": (20.0, 60.0), "farmer": (5.0, 5.0),
+        "anonymous": server.DEFAULT_ANONYMOUS_RATE_LIMIT, "auth": server.DEFAULT_AUTH_RATE_LIMIT,
+    }
+
+
+def test_unknown_role_uses_anonymous_limit(monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMITS", server.parse_rate_limits("officer:20/60"))
+    admission = server.AdmissionControl()
+
+    waits = [admission.take_token("user-1", "auditor") for _ in range(11)]
+
+    assert waits[:10] == [0.0] * 10 and waits[10] > 0
+    assert admission.rate_limited == {"officer": 0, "anonymous": 0, "auth": 0, "auditor": 1}
+
+
+@pytest.fixture
+def gated(monkeypatch):
+    admission = server.AdmissionControl()
+    admission.routes = {"/api/slow": server.RouteGate(1)}
+    monkeypatch.setattr(server, "admission", admission)
+    monkeypatch.setattr(server, "ADMISSION_ENABLED", True)
+    return admission
+
+
+def request(path="/api/slow", headers=None):
+    return SimpleNamespace(method="GET", url=SimpleNamespace(path=path), headers=headers or {}, client=SimpleNamespace(host="10.0.0.1"))
+
+
+def test_anonymous_callers_are_keyed_on_the_forwarded_address(monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CLIENT_IP_HEADER", "x-forwarded-for")
+    monkeypatch.setattr(server, "ADMISSION_TRUSTED_PROXIES", 1)
+    admission = server.AdmissionControl()
+    forwarded = {"x-forwarded-for": "1.2.3.4, 203.0.113.7"}  # the first hop is client-supplied
+
+    assert asyncio.run(admission.identify(request("/api/cooperatives", forwarded))) == ("ip:203.0.113.7", "anonymous")
+    assert asyncio.run(admission.identify(request("/api/auth/login", forwarded))) == ("auth:203.0.113.7", "auth")
+    assert asyncio.run(admission.identify(request("/api/auth/login"))) == ("auth:10.0.0.1", "auth")
+
+
+def test_logins_do_not_drain_the_anonymous_bucket():
+    admission = server.AdmissionControl()
+    rate, burst = server.RATE_LIMITS["auth"]
+
+    for _ in range(int(burst)):
+        assert admission.take_token("auth:10.0.0.1", "auth") == 0.0
+
+    assert admission.take_token("auth:10.0.0.1", "auth") > 0
+    assert admission.take_token("ip:10.0.0.1", "anonymous") == 0.0
+
+
+def test_requests_queued_at_a_route_gate_count_as_in_flight(gated, monkeypatch):
+    monkeypatch.setattr(server, "MAX_IN_FLIGHT_REQUESTS", 2)
+    middleware = server.AdmissionControlMiddleware(app=None)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def slow(_):
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(middleware.dispatch(request(), slow))
+        second = asyncio.create_task(middleware.dispatch(request(), slow))
+        await asyncio.sleep(0.01)
+        in_flight, waiting = gated.in_flight, gated.routes["/api/slow"].waiting
+        # The queued request fills the last slot, so the process sheds the next one
+        shed = await middleware.dispatch(request("/api/other"), slow)
+        release.set()
+        return in_flight, waiting, shed, await first, await second
+
+    in_flight, waiting, shed, first, second = asyncio.run(run())
+
+    assert (in_flight, waiting) == (2, 1)
+    assert shed.status_code == 503 and gated.shed_overload == 1
+    assert (first, second) == ("done", "done")
+    assert gated.in_flight == 0 and gated.routes["/api/slow"].in_flight == 0
@@ -0,0 +1,130 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import server
+
+VALUES = [5.0, 7.5, 4.0, 12.0, 6.5, 5.5, 9.0]
+
+
+def fold(values):
+    state = server.empty_metric_state()
+    for value in values:
+        state = server.metric_state_add(state, value)
+    return state
+
+
+def assert_same_state(actual, expected):
+    assert actual['n'] == expected['n']
+    for key in ("mean", "m2", "ewma", "ewm_var"):
+        assert actual[key] == pytest.approx(expected[key], abs=1e-9), key
+
+
+def test_add_tracks_mean_variance_and_ewma():
+    alpha = server.ANOMALY_EWMA_ALPHA
+    state = fold(VALUES)
+
+    ewma, ewm_var = VALUES[0], 0.0
+    for value in VALUES[1:]:
+        delta = value - ewma
+        ewma += alpha * delta
+        ewm_var = (1 - alpha) * (ewm_var + alpha * delta * delta)
+    assert state['n'] == len(VALUES)
+    assert state['mean'] == pytest.approx(np.mean(VALUES))
+    assert state['m2'] / (state['n'] - 1) == pytest.approx(np.var(VALUES, ddof=1))
+    assert (state['ewma'], state['ewm_var']) == (pytest.approx(ewma), pytest.approx(ewm_var))
+
+
+def test_remove_undoes_add_for_welford_only():
+    state = server.metric_state_remove(fold(VALUES), VALUES[3])
+    without = fold(VALUES[:3] + VALUES[4:])
+
+    assert state['n'] == without['n']
+    assert state['mean'] == pytest.approx(without['mean'])
+    assert state['m2'] == pytest.approx(without['m2'])
+    assert state['ewma'] == fold(VALUES)['ewma']
+
+
+def test_remove_last_observation_resets_moments():
+    state = server.metric_state_remove(fold([4.0]), 4.0)
+
+    assert (state['n'], state['mean'], state['m2']) == (0, 0.0, 0.0)
+
+
+def test_vectorised_states_match_sequential_adds():
+    other = [20.0, 18.0, 25.0]
+    values = np.array(VALUES + other)
+    coop_index = np.array([0] * len(VALUES) + [2] * len(other))
+
+    first, empty, last = server.compute_metric_states(values, coop_index, 3)
+
+    assert_same_state(first, fold(VALUES))
+    assert_same_state(last, fold(other))
+    assert (empty['n'], empty['ewma']) == (0, None)
+
+
+@pytest.fixture
+def stats_db(fake_db):
+    metric = "post_harvest_loss_percent"
+    fake_db.add("production_logs", [
+        {"id": f"log-{i}", "cooperative_id": "coop-1", "created_at": f"2025-01-{i + 1:02d}T00:00:00+00:00", metric: value}
+        for i, value in enumerate(VALUES)
+    ])
+    fake_db.add("production_log_archive", [])
+    fake_db.add("production_stats", [{"cooperative_id": "coop-1", "version": 1, "metrics": {metric: fold(VALUES)}}])
+    return fake_db
+
+
+def test_refresh_recomputes_ewma_after_editing_a_past_log(stats_db):
+    metric = "post_harvest_loss_percent"
+    edited = VALUES[:2] + [30.0] + VALUES[3:]
+    stats_db.production_logs.docs[2][metric] = 30.0
+    asyncio.run(server.record_anomaly_observation("coop-1", {metric: 30.0}, old_values={metric: VALUES[2]}))
+
+    asyncio.run(server.refresh_anomaly_ewma("coop-1"))
+
+    stats, = stats_db.production_stats.docs
+    assert_same_state(stats['metrics'][metric], fold(edited))
+    assert stats['version'] == 3
+
+
+def test_forget_retries_after_a_conflicting_write(stats_db, monkeypatch):
+    metric = "post_harvest_loss_percent"
+    collection = stats_db.production_stats
+    update_one = collection.update_one
+    attempts = []
+
+    async def conflicting_update_one(filter, update, **kwargs):
+        if not attempts:
+            # Another writer bumps the version between our read and write
+            collection.docs[0]['version'] += 1
+        attempts.append(filter['version'])
+        return await update_one(filter, update, **kwargs)
+    monkeypatch.setattr(collection, "update_one", conflicting_update_one)
+
+    asyncio.run(server.forget_anomaly_observation("coop-1", {metric: VALUES[-1]}))
+
+    assert attempts == [1, 2]
+    assert collection.docs[0]['metrics'][metric]['n'] == len(VALUES) - 1
+
+
+def test_update_coerces_metrics_before_scoring(stats_db):
+    metric = "post_harvest_loss_percent"
+    stats_db.production_logs.docs[-1].update({
+        "date": "2025-01-07T00:00:00+00:00", "batch_period": "2025-W02", "total_production": 900.0,
+        "grade_a_percent": 70.0, "grade_b_percent": 25.0, "post_harvest_loss_kg": 80.0,
+        "energy_use": "Low", "has_nonconformity": False,
+    })
+    update = server.ProductionLogUpdate.model_validate({metric: "7.5", "corrective_action": None})
+
+    log = asyncio.run(server.update_production_log("log-6", update, current_user={"id": "o", "role": "officer"}))
+
+    assert log.post_harvest_loss_percent == 7.5
+    assert stats_db.production_logs.docs[-1][metric] == 7.5
+    assert stats_db.production_stats.docs[0]['metrics'][metric]['n'] == len(VALUES)
+
+
+def test_update_rejects_non_numeric_metrics():
+    with pytest.raises(server.ValidationError):
+        server.ProductionLogUpdate.model_validate({"post_harvest_loss_percent": "a lot"})
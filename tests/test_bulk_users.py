@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+OFFICER = {"id": "officer-1", "role": "officer"}
+
+
+@pytest.fixture
+def users_db(fake_db, monkeypatch):
+    fake_db.add("users", [{"email": "taken@example.com"}])
+    monkeypatch.setattr(server, "hash_password", lambda password: f"hashed:{password}")
+    fake_db.pool_calls = []
+
+    async def run_inline(func, *args):
+        fake_db.pool_calls.append(len(args[0]))
+        return func(*args)
+
+    monkeypatch.setattr(server.job_scheduler, "run_in_process_pool", run_inline)
+    return fake_db
+
+
+def test_bulk_create_reports_every_row(users_db):
+    request = server.BulkUserRequest(
+        users=[
+            {"email": "a@example.com", "name": "A", "role": "farmer", "password": "pa"},
+            {"email": "taken@example.com", "name": "T", "role": "farmer", "password": "pt"},
+            {"email": "not-an-email", "name": "N", "role": "farmer", "password": "pn"},
+        ],
+        csv="email,name,role,password,cooperative_id\n"
+            "b@example.com,B,manager,pb,coop-1\n"
+            "a@example.com,A again,farmer,px,\n"
+            "c@example.com,C,admin,pc,\n",
+    )
+
+    response = asyncio.run(server.bulk_create_users(request, current_user=OFFICER))
+
+    assert (response["created"], response["duplicate"], response["invalid"]) == (2, 2, 2)
+    assert [result["status"] for result in response["results"]] == [
+        "created", "duplicate", "invalid", "created", "duplicate", "invalid",
+    ]
+    assert [method for _, method, _ in users_db.calls] == ["distinct", "insert_many"]
+    created = {doc["email"]: doc for doc in users_db.users.docs if "id" in doc}
+    assert created["b@example.com"]["password"] == "hashed:pb"
+    assert created["b@example.com"]["cooperative_id"] == "coop-1"
+    assert created["a@example.com"]["cooperative_id"] is None
+    assert sum(users_db.pool_calls) == 2
+
+
+def test_bulk_create_is_officer_only(users_db):
+    request = server.BulkUserRequest(users=[{"email": "a@example.com", "name": "A", "role": "farmer", "password": "p"}])
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.bulk_create_users(request, current_user={"id": "m", "role": "manager"}))
+    assert exc.value.status_code == 403
+
+
+def test_csv_requires_core_columns():
+    with pytest.raises(HTTPException) as exc:
+        server.parse_bulk_user_csv("email,name\nx@example.com,X\n")
+    assert "password, role" in exc.value.detail
+
+
+def test_concurrent_registration_is_reported_as_duplicate(users_db, monkeypatch):
+    users = users_db.add("users", [{"email": "taken@example.com"}], unique=("email",))
+    distinct = users.distinct
+
+    async def stale_distinct(key, filter=None, session=None):
+        existing = await distinct(key, filter)
+        # Someone registers b@ between the existence check and the insert
+        users.docs.append({"email": "b@example.com"})
+        return existing
+    monkeypatch.setattr(users, "distinct", stale_distinct)
+    request = server.BulkUserRequest(users=[
+        {"email": f"{name}@example.com", "name": name, "role": "farmer", "password": "p"} for name in ("a", "b", "c")
+    ])
+
+    response = asyncio.run(server.bulk_create_users(request, current_user=OFFICER))
+
+    assert (response["created"], response["duplicate"]) == (2, 1)
+    assert response["results"][1] == {"row": 1, "email": "b@example.com", "status": "duplicate",
+                                      "detail": "Email already registered"}
+    assert sorted(doc["email"] for doc in users.docs if "id" in doc) == ["a@example.com", "c@example.com"]
+
+
+def test_update_user_reports_a_concurrent_email_change(users_db, monkeypatch):
+    users = users_db.add("users", [
+        {"id": "u-1", "email": "one@example.com", "name": "One"},
+        {"id": "u-2", "email": "two@example.com", "name": "Two"},
+    ], unique=("email",))
+
+    async def stale_find_one(filter=None, projection=None, **kwargs):
+        return None  # the other user changed their address after this check
+    monkeypatch.setattr(users, "find_one", stale_find_one)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.update_user("u-1", {"email": "two@example.com"}, current_user=OFFICER))
+
+    assert (exc.value.status_code, exc.value.detail) == (400, "Email already in use")
+    assert users.docs[0]["email"] == "one@example.com"
+
+
+def test_unique_email_index_refuses_to_replace_the_old_one_over_duplicates(fake_db, monkeypatch):
+    users = fake_db.add("users")
+
+    async def conflicting_create_index(keys, **kwargs):
+        raise server.OperationFailure("Index already exists with different options", code=85)
+    monkeypatch.setattr(users, "create_index", conflicting_create_index)
+
+    async def duplicates(limit=10):
+        return ["twice@example.com"]
+    monkeypatch.setattr(server, "duplicate_user_emails", duplicates)
+
+    with pytest.raises(RuntimeError, match="twice@example.com"):
+        asyncio.run(server.ensure_unique_user_email_index())
+    assert fake_db.queries("drop_index") == []
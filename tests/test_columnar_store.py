@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+def make_log(log_id, coop_id="coop-1", day=1, production=100.0, loss=5.0, energy="Low"):
+    return {
+        "id": log_id, "cooperative_id": coop_id, "date": f"2025-01-{day:02d}T00:00:00+00:00",
+        "total_production": production, "grade_a_percent": 80.0, "grade_b_percent": 20.0,
+        "post_harvest_loss_percent": loss, "post_harvest_loss_kg": production * loss / 100, "energy_use": energy,
+    }
+
+
+@pytest.fixture
+def store(fake_db, monkeypatch):
+    logs = [make_log(f"a{i}", "coop-a", day=i + 1, energy=["Low", "High"][i % 2]) for i in range(6)]
+    logs += [make_log(f"b{i}", "coop-b", day=i + 1, production=50.0, loss=20.0, energy="Medium") for i in range(3)]
+    fake_db.add("production_logs", [{"_id": f"oid-{log['id']}", **log} for log in logs])
+    monkeypatch.setattr(server, "single_flight", server.SingleFlight())
+    store = server.ColumnarLogStore(True, 10 * 1024 * 1024)
+    monkeypatch.setattr(server, "columnar_store", store)
+    return store
+
+
+def test_remove_keeps_arrays_dense():
+    columns = server.LogColumns(capacity=2)
+    for i in range(5):
+        columns.upsert(make_log(f"log-{i}", day=i + 1, production=float(i)), 0)
+
+    assert columns.remove("log-1")
+    assert not columns.remove("log-1")
+
+    assert columns.size == 4
+    assert sorted(columns.rows.values()) == list(range(4))
+    assert sorted(columns.column("total_production")) == [0.0, 2.0, 3.0, 4.0]
+    assert [columns.ids[row] for row in columns.latest(2)] == ["log-4", "log-3"]
+
+
+def test_lazy_load_and_write_hooks(store):
+    async def run():
+        columns = await store.columns("coop-a")
+        assert await store.columns("coop-a") is columns
+        store.upsert(make_log("a9", "coop-a", day=20, production=999.0))
+        store.upsert(make_log("c1", "coop-c"))  # not loaded: ignored
+        store.remove("coop-a", ["a0"])
+        store.apply_change({"operationType": "delete", "documentKey": {"_id": "oid-a1"}})
+        return columns
+
+    columns = asyncio.run(run())
+
+    assert len(server.db.queries("find")) == 1
+    assert columns.size == 5
+    assert "a0" not in columns.rows and "a1" not in columns.rows
+    assert columns.column("total_production")[columns.latest(1)][0] == 999.0
+    assert "coop-c" not in store._columns
+
+
+def test_breakdown_groups_by_energy_and_cooperative(store):
+    async def load():
+        return {coop_id: await store.columns(coop_id) for coop_id in ("coop-a", "coop-b")}
+
+    columns = asyncio.run(load())
+
+    by_energy = server.columnar_breakdown(columns, "energy_use", None, None, None, None, None)
+    assert [(group['key'], group['logs']) for group in by_energy] == [("High", 3), ("Low", 3), ("Medium", 3)]
+
+    by_coop = server.columnar_breakdown(columns, "cooperative", None, None, 10.0, None, None)
+    assert by_coop == [{
+        "key": "coop-b", "logs": 3, "total_production": 150.0, "loss_kg": 30.0,
+        "avg_loss_percent": 20.0, "avg_grade_a_percent": 80.0,
+    }]
+
+    by_month = server.columnar_breakdown(columns, "month", "2025-01-03T00:00:00+00:00", None, None, None, ["Low"])
+    assert [(group['key'], group['logs']) for group in by_month] == [("2025-01", 2)]
+
+
+def test_budget_evicts_least_recently_used(store):
+    store.max_bytes = 2 * server.LogColumns().nbytes + 6 * server.COLUMNAR_ROW_OVERHEAD_BYTES
+
+    async def run():
+        await store.columns("coop-a")
+        await store.columns("coop-b")
+
+    asyncio.run(run())
+
+    assert list(store._columns) == ["coop-b"]
+    assert store.evictions == 1
@@ -0,0 +1,55 @@
+import asyncio
+
+from fastapi.routing import serialize_response
+
+import server
+
+MANAGER = {"id": "manager-1", "role": "manager", "cooperative_id": "coop-1"}
+FARMER = {"id": "farmer-1", "role": "farmer", "cooperative_id": "coop-1"}
+INTERNAL = {"updated_seq": 41, "updated_at": "2025-06-02T00:00:00+00:00"}
+
+
+def dashboard(view, user):
+    route = next(route for route in server.app.routes if getattr(route, "path", None) == "/api/dashboard")
+    content = asyncio.run(server.get_dashboard(view=view, current_user=user))
+    return asyncio.run(serialize_response(field=route.response_field, response_content=content))
+
+
+COOPERATIVE = {"id": "coop-1", "name": "Green Valley", "country": "Ghana", "product": "Cocoa",
+               "status": "active", "created_at": "2025-01-01T00:00:00+00:00", **INTERNAL}
+
+
+def test_dashboard_strips_internal_fields(fake_db):
+    fake_db.add("cooperatives", [COOPERATIVE])
+    fake_db.add("nonconformities", [{
+        "id": "nc-1", "cooperative_id": "coop-1", "date": "2025-06-01T00:00:00+00:00", "category": "quality",
+        "severity": "high", "severity_rank": 3, "description": "Mould", "corrective_action": "Re-dry",
+        "status": "open", "created_at": "2025-06-01T00:00:00+00:00", **INTERNAL,
+    }])
+
+    payload = dashboard("issues", MANAGER)
+
+    assert set(payload) == {"role", "view", "nonconformities", "cooperatives"}
+    nc, = payload["nonconformities"]
+    assert set(nc) == set(server.Nonconformity.model_fields)
+    assert nc["assigned_to"] is None
+    assert set(payload["cooperatives"][0]) == set(server.Cooperative.model_fields)
+
+
+def test_farmer_home_keeps_logs_public_fields(fake_db):
+    fake_db.add("cooperatives", [COOPERATIVE])
+    fake_db.add("production_logs", [{
+        "id": "log-1", "cooperative_id": "coop-1", "date": "2025-06-01T00:00:00+00:00", "batch_period": "Week 22",
+        "total_production": 100.0, "grade_a_percent": 80.0, "grade_b_percent": 20.0,
+        "post_harvest_loss_percent": 5.0, "post_harvest_loss_kg": 5.0, "energy_use": "Low",
+        "has_nonconformity": False, "anomaly_flags": ["grade_a_percent"],
+        "created_at": "2025-06-01T00:00:00+00:00", **INTERNAL,
+    }])
+
+    payload = dashboard("home", FARMER)
+
+    assert set(payload) == {"role", "view", "cooperative", "production_logs"}
+    assert set(payload["cooperative"]) == set(server.Cooperative.model_fields)
+    log, = payload["production_logs"]
+    assert "updated_seq" not in log and "updated_at" not in log
+    assert log["anomaly_flags"] == ["grade_a_percent"]
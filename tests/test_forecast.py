@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import server
+
+OFFICER = {"id": "officer-1", "role": "officer"}
+
+
+def seasonal(t):
+    return 100 + 2 * t + 5 * np.sin(2 * np.pi * t / server.FORECAST_SEASON_LENGTH)
+
+
+def test_fit_recovers_trend_and_season_with_padding():
+    length = 12
+    t = np.arange(length, dtype=float)
+    y = np.zeros((2, length, 1))
+    mask = np.ones((2, length))
+    y[0, :, 0] = seasonal(t)
+    # Second series is shorter and right-aligned; its padding must not bias the fit
+    y[1, 4:, 0] = seasonal(t[4:])
+    mask[1, :4] = 0
+
+    beta, sigma, cov = server.fit_forecast_batch(y, mask)
+
+    for c in range(2):
+        assert beta[c, :, 0] == pytest.approx([100, 2, 5, 0], abs=1e-3)  # the ridge term shrinks slightly
+        assert sigma[c, 0] == pytest.approx(0, abs=1e-3)
+    assert cov.shape == (2, 4, 4)
+
+
+@pytest.fixture
+def forecast_db(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "_forecast_cache", {})
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    fake_db.add("production_logs", [
+        {"id": f"log-{i}", "cooperative_id": "coop-1", "date": (start + timedelta(days=7 * i)).isoformat(),
+         "total_production": float(seasonal(i)), "post_harvest_loss_percent": 10.0}
+        for i in range(12)
+    ] + [
+        {"id": "short-1", "cooperative_id": "coop-2", "date": start.isoformat(),
+         "total_production": 50.0, "post_harvest_loss_percent": 5.0}
+    ])
+    return fake_db
+
+
+def forecast(cooperative_id="coop-1"):
+    return asyncio.run(server.get_forecast(periods=2, cooperative_id=cooperative_id, current_user=OFFICER))
+
+
+def test_refit_reads_only_the_latest_history_window(forecast_db, monkeypatch):
+    monkeypatch.setattr(server, "FORECAST_HISTORY", 8)
+
+    result, = forecast()['forecasts']
+
+    assert result['history_points'] == 8
+    assert result['total_production'][0]['date'] == "2025-03-26T00:00:00+00:00"
+    assert forecast_db.queries("find", "production_logs") == [{"cooperative_id": "coop-1"}]
+
+
+def test_forecast_extrapolates_weekly_cadence(forecast_db):
+    result, = forecast()['forecasts']
+
+    assert (result['history_points'], result['cadence_days']) == (12, 7.0)
+    first = result['total_production'][0]
+    assert first['value'] == pytest.approx(seasonal(12), abs=0.01)
+    assert first['date'] == "2025-03-26T00:00:00+00:00"
+
+
+def test_short_history_is_cached_as_insufficient(forecast_db):
+    assert forecast("coop-2")['forecasts'] == [{"cooperative_id": "coop-2", "insufficient_history": True}]
+    assert forecast("coop-2")['refitted'] == 0
+
+
+def test_cached_fit_is_reused_until_invalidated_or_expired(forecast_db, monkeypatch):
+    assert forecast()['refitted'] == 1
+    assert forecast()['refitted'] == 0
+
+    server.invalidate_forecast("coop-1")
+    assert forecast()['refitted'] == 1
+
+    monkeypatch.setattr(server, "FORECAST_CACHE_TTL_SECONDS", 0)
+    assert forecast()['refitted'] == 1
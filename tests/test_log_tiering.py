@@ -0,0 +1,166 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+OFFICER = {"id": "officer-1", "role": "officer"}
+MANAGER = {"id": "manager-1", "role": "manager", "cooperative_id": "coop-2"}
+
+
+def make_log(log_id, month, day, production=100.0, loss=5.0, coop_id="coop-1"):
+    return {
+        "id": log_id, "cooperative_id": coop_id, "date": f"2025-{month:02d}-{day:02d}T00:00:00+00:00",
+        "batch_period": f"Week {day}", "total_production": production, "grade_a_percent": 80.0,
+        "grade_b_percent": 20.0, "post_harvest_loss_percent": loss, "post_harvest_loss_kg": production * loss / 100,
+        "energy_use": "Low", "has_nonconformity": False, "created_at": f"2025-{month:02d}-{day:02d}T00:00:00+00:00",
+    }
+
+
+@pytest.fixture
+def tiered_db(fake_db, monkeypatch):
+    """Logs for January to March 2025, with the hot tier starting in March"""
+    fake_db.add("production_logs", [
+        make_log("jan-1", 1, 5, loss=2.0), make_log("jan-2", 1, 20, production=300.0, loss=6.0),
+        make_log("feb-1", 2, 3, loss=4.0), make_log("feb-2", 2, 10), make_log("feb-3", 2, 25, loss=8.0),
+        make_log("mar-1", 3, 2, production=50.0),
+    ])
+    fake_db.add("nonconformities", [
+        {"id": "nc-1", "cooperative_id": "coop-1", "production_log_id": "feb-2", "category": "quality",
+         "severity": "low", "status": "open", "date": "2025-02-10T00:00:00+00:00"},
+    ])
+
+    async def standalone():
+        return False
+
+    monkeypatch.setattr(server, "supports_transactions", standalone)
+    monkeypatch.setattr(server, "hot_tier_start", lambda now=None: datetime(2025, 3, 1, tzinfo=timezone.utc))
+    monkeypatch.setattr(server, "LOG_ARCHIVE_COMPRESSION", "none")
+    return fake_db
+
+
+def archived_ids(db):
+    return sorted(log_id for block in db.production_log_archive.docs for log_id in block["log_ids"])
+
+
+def summary(db, month):
+    return next(doc for doc in db.production_log_monthly.docs if doc["month"] == month)
+
+
+def test_totals_roll_up_into_monthly_figures():
+    logs = [make_log("a", 1, 1, production=100.0, loss=2.0), make_log("b", 1, 2, production=300.0, loss=6.0)]
+
+    totals = server.production_totals(logs)
+
+    assert totals["logs"] == 2
+    assert totals["loss_kg"] == 20.0
+    assert server.monthly_figures(totals) == {
+        "logs": 2, "total_production": 400.0, "loss_kg": 20.0, "avg_loss_percent": 4.0,
+        "grade_mix": {"a": 80.0, "b": 20.0},
+    }
+    assert server.add_totals(totals, totals)["total_production"] == 800.0
+    assert server.monthly_figures(server.production_totals([]))["grade_mix"] is None
+
+
+def test_hot_tier_starts_on_a_month_boundary(monkeypatch):
+    monkeypatch.setattr(server, "LOG_HOT_DAYS", 30)
+    monkeypatch.setattr(server, "STATS_WINDOW_DAYS", 60)
+    assert server.hot_tier_start(datetime(2025, 5, 17, 9, 30, tzinfo=timezone.utc)) == datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+
+def test_tiering_moves_complete_months_without_changing_the_monthly_series(tiered_db):
+    before = asyncio.run(server.get_cooperative_monthly("coop-1", current_user=OFFICER))
+
+    result = asyncio.run(server.tier_production_logs())
+
+    assert (result["archived_logs"], result["months"]) == (5, 2)
+    assert [log["id"] for log in tiered_db.production_logs.docs] == ["mar-1"]
+    assert archived_ids(tiered_db) == ["feb-1", "feb-2", "feb-3", "jan-1", "jan-2"]
+    assert summary(tiered_db, "2025-01")["baseline_logs"] == [
+        {"date": "2025-01-05T00:00:00+00:00", "loss_percent": 2.0},
+        {"date": "2025-01-20T00:00:00+00:00", "loss_percent": 6.0},
+    ]
+    after = asyncio.run(server.get_cooperative_monthly("coop-1", current_user=OFFICER))
+    assert [{**month, "archived": None} for month in after] == [{**month, "archived": None} for month in before]
+    assert [month["archived"] for month in after] == [True, True, False]
+
+    # A second run finds nothing left to move
+    assert asyncio.run(server.tier_production_logs())["archived_logs"] == 0
+
+
+def test_late_log_for_an_archived_month_is_added_to_its_summary(tiered_db):
+    asyncio.run(server.tier_production_logs())
+    tiered_db.production_logs.docs.append(make_log("jan-late", 1, 28, production=100.0, loss=10.0))
+
+    asyncio.run(server.tier_production_logs())
+
+    january = summary(tiered_db, "2025-01")
+    assert (january["logs"], january["total_production"], january["avg_loss_percent"]) == (3, 500.0, 6.0)
+    assert len([block for block in tiered_db.production_log_archive.docs if block["month"] == "2025-01"]) == 2
+
+
+def test_deleting_an_archived_log_rewrites_its_block_and_summary(tiered_db):
+    asyncio.run(server.tier_production_logs())
+
+    asyncio.run(server.delete_production_log("feb-2", current_user=OFFICER))
+
+    assert archived_ids(tiered_db) == ["feb-1", "feb-3", "jan-1", "jan-2"]
+    february = summary(tiered_db, "2025-02")
+    remaining = [make_log("feb-1", 2, 3, loss=4.0), make_log("feb-3", 2, 25, loss=8.0)]
+    assert {key: february[key] for key in server.archived_month_summary(remaining)} == server.archived_month_summary(remaining)
+    assert tiered_db.nonconformities.docs == []
+    assert [doc["id"] for doc in tiered_db.sync_tombstones.docs] == ["nc-1", "feb-2"]
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.delete_production_log("feb-2", current_user=OFFICER))
+    assert exc.value.status_code == 404
+
+
+def test_archived_logs_are_read_only_and_scoped_to_their_cooperative(tiered_db):
+    asyncio.run(server.tier_production_logs())
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.update_production_log("jan-1", server.ProductionLogUpdate(total_production=1.0), current_user=OFFICER))
+    assert exc.value.status_code == 409
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.delete_production_log("jan-1", current_user=MANAGER))
+    assert exc.value.status_code == 403
+    assert "jan-1" in archived_ids(tiered_db)
+
+
+def test_bulk_delete_covers_archived_and_hot_logs(tiered_db):
+    asyncio.run(server.tier_production_logs())
+    request = server.ProductionLogRangeDelete(
+        cooperative_id="coop-1",
+        start_date=datetime(2025, 1, 10, tzinfo=timezone.utc),
+        end_date=datetime(2025, 3, 5, tzinfo=timezone.utc),
+    )
+
+    response = asyncio.run(server.bulk_delete_production_logs(request, current_user=OFFICER))
+
+    assert (response["deleted_logs"], response["archived_logs"], response["deleted_nonconformities"]) == (5, 4, 1)
+    assert archived_ids(tiered_db) == ["jan-1"]
+    assert tiered_db.production_logs.docs == []
+    assert [doc["month"] for doc in tiered_db.production_log_monthly.docs] == ["2025-01"]
+    assert summary(tiered_db, "2025-01")["logs"] == 1
+
+
+def test_deleting_a_log_removes_its_issues_first(tiered_db):
+    tiered_db.nonconformities.docs.append(
+        {"id": "nc-2", "cooperative_id": "coop-1", "production_log_id": "mar-1", "category": "quality",
+         "severity": "low", "status": "open", "date": "2025-03-02T00:00:00+00:00"}
+    )
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.delete_production_log("mar-1", current_user=MANAGER))
+    assert exc.value.status_code == 403
+    assert [doc["id"] for doc in tiered_db.nonconformities.docs] == ["nc-1", "nc-2"]
+
+    asyncio.run(server.delete_production_log("mar-1", current_user=OFFICER))
+
+    assert [doc["id"] for doc in tiered_db.nonconformities.docs] == ["nc-1"]
+    deletes = [name for name, method, _ in tiered_db.calls if method in ("delete_many", "find_one_and_delete")]
+    assert deletes[-2:] == ["nonconformities", "production_logs"]
@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import pytest
+from pymongo import WriteConcern
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+import server
+
+# e.g. mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0
+REPLICA_SET_URL = os.environ.get("DIMS_TEST_REPLICA_SET_URL")
+
+
+def test_default_handle_reads_from_primary():
+    assert server.db.read_preference == Primary()
+
+
+def test_analytics_handle_prefers_secondaries_with_bounded_staleness():
+    preference = server.analytics_db().read_preference
+    assert preference == SecondaryPreferred(max_staleness=server.ANALYTICS_MAX_STALENESS_SECONDS)
+
+
+def test_override_applies_only_inside_its_context():
+    token = server.read_preference_override.set("primary")
+    try:
+        assert server.analytics_db().read_preference == Primary()
+    finally:
+        server.read_preference_override.reset(token)
+    assert server.analytics_read_mode() == server.ANALYTICS_READ_PREFERENCE
+
+
+def test_unknown_configured_mode_is_rejected():
+    assert server.check_read_preference("nearest") == "nearest"
+    with pytest.raises(ValueError, match="secondaryPreferred"):
+        server.check_read_preference("secondary_preferred")
+
+
+@pytest.mark.skipif(not REPLICA_SET_URL, reason="set DIMS_TEST_REPLICA_SET_URL to a three-node replica set")
+def test_analytics_reads_are_served_by_a_secondary(monkeypatch):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def run():
+        client = AsyncIOMotorClient(REPLICA_SET_URL)
+        db = client[f"dims_read_preference_{os.getpid()}"]
+        monkeypatch.setattr(server, "db", db)
+        try:
+            # Wait for all three members so any secondary can answer
+            await db.with_options(write_concern=WriteConcern(w=3)).cooperatives.insert_one({"id": "coop-1"})
+            primary = client.primary
+
+            cursor = server.analytics_db().cooperatives.find({"id": "coop-1"})
+            assert len(await cursor.to_list(None)) == 1
+            assert cursor.address != primary
+
+            token = server.read_preference_override.set("primary")
+            try:
+                cursor = server.analytics_db().cooperatives.find({"id": "coop-1"})
+                await cursor.to_list(None)
+                assert cursor.address == primary
+            finally:
+                server.read_preference_override.reset(token)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    asyncio.run(run())
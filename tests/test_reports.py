@@ -0,0 +1,158 @@
+import asyncio
+import io
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def sample_data():
+    logs = [
+        {"date": f"2025-0{month}-0{day}T00:00:00+00:00", "batch_period": f"Week {day}", "total_production": 100.0,
+         "grade_a_percent": 80.0, "grade_b_percent": 20.0, "post_harvest_loss_percent": 5.0,
+         "post_harvest_loss_kg": 5.0, "energy_use": "Low", "has_nonconformity": False}
+        for month in (4, 5) for day in (1, 2)
+    ]
+    nonconformities = [
+        {"date": "2025-04-01T00:00:00+00:00", "category": "quality", "severity": "high", "status": "closed",
+         "description": "Moisture above spec", "corrective_action": "Re-dry", "closed_date": "2025-04-05T00:00:00+00:00"},
+        {"date": "2025-05-02T00:00:00+00:00", "category": "safety", "severity": "low", "status": "open",
+         "description": "Missing gloves", "corrective_action": "Restock", "closed_date": None},
+    ]
+    return {
+        "cooperative": {"id": "coop-1", "name": "Green Valley", "product": "Coffee"},
+        "period": "2025-Q2",
+        "generated_at": "2025-07-01T00:00:00+00:00",
+        "data_version": "0" * 32,
+        "logs": logs,
+        "nonconformities": nonconformities,
+    }
+
+
+@pytest.mark.parametrize("period, start, end", [
+    ("2025", utc(2025, 1, 1), utc(2026, 1, 1)),
+    ("2025-Q4", utc(2025, 10, 1), utc(2026, 1, 1)),
+    ("2025-02", utc(2025, 2, 1), utc(2025, 3, 1)),
+    ("2025-12", utc(2025, 12, 1), utc(2026, 1, 1)),
+])
+def test_parse_report_period(period, start, end):
+    assert server.parse_report_period(period) == (start, end)
+
+
+@pytest.mark.parametrize("period", ["25", "2025-Q0", "2025-13", "2025-1", "Q1-2025"])
+def test_parse_report_period_rejects_malformed(period):
+    with pytest.raises(ValueError):
+        server.parse_report_period(period)
+
+
+def test_months_between_spans_year_end():
+    assert server.months_between(utc(2025, 11, 1), utc(2026, 2, 1)) == ["2025-11", "2025-12", "2026-01"]
+
+
+def test_summary_groups_by_month_and_standard():
+    summary = server.summarize_report_data(sample_data())
+
+    assert summary['totals']['logs'] == 4
+    assert summary['totals']['total_production'] == 400.0
+    assert [row['month'] for row in summary['monthly']] == ["2025-04", "2025-05"]
+    assert summary['energy_use'] == {"Low": 4, "Medium": 0, "High": 0}
+    quality, environmental, safety = summary['standards']
+    assert (quality['closed'], quality['avg_resolution_days'], quality['closure_rate']) == (1, 4.0, 100.0)
+    assert environmental['nonconformities'] == 0 and environmental['closure_rate'] is None
+    assert (safety['open'], safety['by_severity']) == (1, {"low": 1})
+
+
+def test_summary_treats_naive_issue_dates_as_utc():
+    data = sample_data()
+    data['nonconformities'][0]['date'] = "2025-04-01T00:00:00"
+
+    quality = server.summarize_report_data(data)['standards'][0]
+
+    assert quality['avg_resolution_days'] == 4.0
+
+
+def test_render_xlsx():
+    openpyxl = pytest.importorskip("openpyxl")
+
+    workbook = openpyxl.load_workbook(io.BytesIO(server.render_report("xlsx", sample_data())))
+
+    assert workbook.sheetnames == ["Summary", "Monthly", "Production Logs", "Nonconformities"]
+    assert workbook["Production Logs"].max_row == 5
+    assert workbook["Nonconformities"].max_row == 3
+
+
+def test_render_pdf():
+    pytest.importorskip("reportlab")
+
+    content = server.render_report("pdf", sample_data())
+
+    assert content.startswith(b"%PDF")
+
+
+class FakeBucket:
+    def __init__(self):
+        self.files = {}
+        self.deleted = []
+
+    async def upload_from_stream(self, filename, source, metadata=None):
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = source.read()
+        return file_id
+
+    async def delete(self, file_id):
+        self.deleted.append(file_id)
+
+
+@pytest.fixture
+def report_db(fake_db, monkeypatch):
+    data = sample_data()
+    fake_db.add("cooperatives", [data['cooperative']])
+    fake_db.add("production_logs", [
+        {"id": f"log-{i}", "cooperative_id": "coop-1", **log} for i, log in enumerate(reversed(data['logs']))
+    ] + [
+        {"id": "log-march", "cooperative_id": "coop-1", **data['logs'][0], "date": "2025-03-31T00:00:00+00:00"},
+        {"id": "log-other", "cooperative_id": "coop-2", **data['logs'][0]},
+    ])
+    fake_db.add("nonconformities", [{"id": f"nc-{i}", "cooperative_id": "coop-1", **nc} for i, nc in enumerate(data['nonconformities'])])
+    fake_db.add("reports", [{"id": "report-1", "cooperative_id": "coop-1", "period": "2025-Q2", "format": "xlsx",
+                             "records": 6, "data_version": "0" * 32, "filename": "green-valley-2025-Q2.xlsx"}])
+    monkeypatch.setattr(server, "REPORT_CURSOR_BATCH_SIZE", 2)
+    return fake_db
+
+
+def test_collect_stages_rows_in_date_order(report_db, tmp_path):
+    report = report_db.reports.docs[0]
+
+    header = asyncio.run(server.collect_report_data(report, tmp_path))
+
+    assert set(header) == {"cooperative", "period", "generated_at", "data_version"}
+    logs = server.read_report_rows(tmp_path / "logs.jsonl")
+    assert [log['date'] for log in logs] == [log['date'] for log in sample_data()['logs']]
+    assert set(logs[0]) == set(server.REPORT_LOG_PROJECTION) - {"_id"}
+    assert len(server.read_report_rows(tmp_path / "nonconformities.jsonl")) == 2
+
+
+def test_generate_report_stores_artifact_in_gridfs(report_db, monkeypatch):
+    openpyxl = pytest.importorskip("openpyxl")
+    bucket = FakeBucket()
+    monkeypatch.setattr(server, "report_artifacts", lambda: bucket)
+
+    async def run_inline(func, *args):
+        return func(*args)
+    monkeypatch.setattr(server.job_scheduler, "run_in_process_pool", run_inline)
+    report_db.reports.docs.append({"id": "report-0", "cooperative_id": "coop-1", "period": "2025-Q2", "format": "xlsx",
+                                   "data_version": "1" * 32, "status": "succeeded", "artifact_id": "file-old"})
+
+    asyncio.run(server.generate_report(dict(report_db.reports.docs[0])))
+
+    report, = report_db.reports.docs
+    assert (report['status'], report['artifact_id']) == ("succeeded", "file-1")
+    assert "content" not in report and report['size'] == len(bucket.files["file-1"])
+    assert openpyxl.load_workbook(io.BytesIO(bucket.files["file-1"]))["Production Logs"].max_row == 5
+    assert bucket.deleted == ["file-old"]
+    assert "artifact_id" not in server.serialize_report(report)
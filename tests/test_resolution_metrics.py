@@ -0,0 +1,138 @@
+import asyncio
+
+import server
+
+
+def make_nc(status="open", closed_date=None, category="quality", severity="high"):
+    return {
+        "cooperative_id": "coop-1", "category": category, "severity": severity, "status": status,
+        "date": "2025-03-01T12:00:00+00:00", "closed_date": closed_date,
+    }
+
+
+def increments(db):
+    """The $inc of every bulk-written resolution_metrics update, per bulk_write call"""
+    return [[(key, update["$inc"]) for key, update in ops] for ops in db.queries("bulk_write", "resolution_metrics")]
+
+
+def test_contribution_of_open_and_closed_issues():
+    key, counters = server.resolution_contribution(make_nc())
+    assert key == {"cooperative_id": "coop-1", "category": "quality", "severity": "high"}
+    assert counters == {"open": 1, "open_by_day.2025-03-01": 1}
+
+    _, counters = server.resolution_contribution(make_nc("closed", "2025-03-05T00:00:00+00:00"))
+    assert counters == {"closed": 1, "closed_days_sum": 3.5, "buckets.3": 1}
+
+
+def test_naive_dates_are_treated_as_utc():
+    nc = {**make_nc("closed", "2025-03-02T12:00:00+00:00"), "date": "2025-03-01T12:00:00"}
+    _, counters = server.resolution_contribution(nc)
+    assert counters["closed_days_sum"] == 1.0
+
+
+def test_reopen_moves_issue_from_histogram_back_to_open(fake_db):
+    closed = make_nc("closed", "2025-03-05T00:00:00+00:00")
+    reopened = {**closed, "status": "open", "closed_date": None}
+
+    asyncio.run(server.record_resolution_changes([(closed, reopened)]))
+
+    [[(key, inc)]] = increments(fake_db)
+    assert key["severity"] == "high"
+    assert inc == {"closed": -1, "closed_days_sum": -3.5, "buckets.3": -1, "open": 1, "open_by_day.2025-03-01": 1}
+
+
+def test_recategorising_moves_counters_between_keys(fake_db):
+    before = make_nc()
+    after = {**before, "severity": "low"}
+
+    asyncio.run(server.record_resolution_changes([(before, after)]))
+
+    writes = {key["severity"]: inc for key, inc in increments(fake_db)[0]}
+    assert writes == {
+        "high": {"open": -1, "open_by_day.2025-03-01": -1},
+        "low": {"open": 1, "open_by_day.2025-03-01": 1},
+    }
+
+
+def test_unchanged_contribution_writes_nothing(fake_db):
+    nc = make_nc()
+    asyncio.run(server.record_resolution_changes([(nc, {**nc, "description": "edited"})]))
+    assert increments(fake_db) == []
+
+
+def test_rebuild_replaces_the_metrics_collection(fake_db):
+    fake_db.add("nonconformities", [
+        make_nc(),
+        make_nc("closed", "2025-03-05T00:00:00+00:00"),
+        make_nc(severity="low"),
+    ])
+    fake_db.add("resolution_metrics", [{"cooperative_id": "coop-1", "category": "safety", "severity": "high", "open": 4}])
+
+    result = asyncio.run(server.rebuild_resolution_metrics())
+
+    assert result == {"keys": 2, "replaced": 1, "replayed": 0}
+    docs = {doc["severity"]: doc for doc in fake_db.resolution_metrics.docs}
+    assert set(docs) == {"high", "low"}
+    assert (docs["high"]["open"], docs["high"]["closed"], docs["high"]["buckets"]) == (1, 1, {"3": 1})
+    assert [method for _, method, _ in fake_db.calls if method in ("drop", "rename")] == ["drop", "rename"]
+    assert server.RESOLUTION_METRICS_STAGING not in fake_db._collections
+
+
+def test_rebuild_replays_changes_made_while_it_scanned(fake_db, monkeypatch):
+    issues = fake_db.add("nonconformities", [
+        {**make_nc(), "id": "nc-1", "updated_seq": 1},
+        {**make_nc(), "id": "nc-2", "updated_seq": 2},
+    ])
+    scanned = [dict(doc) for doc in issues.docs]
+    # Once the scan has read both issues, nc-1 is closed and nc-3 opened; their
+    # increments land on the live collection that the rename replaces
+    closed = {**scanned[0], "status": "closed", "closed_date": "2025-03-05T00:00:00+00:00", "updated_seq": 3}
+    created = {**make_nc(severity="low"), "id": "nc-3", "updated_seq": 4}
+    asyncio.run(server.record_resolution_changes([(scanned[0], closed), (None, created)]))
+    issues.docs = [closed, scanned[1], created]
+    find = issues.find
+
+    def stale_scan(filter=None, projection=None, **kwargs):
+        cursor = find(filter, projection, **kwargs)
+        cursor._results = lambda: [dict(doc) for doc in scanned]
+        return cursor
+    monkeypatch.setattr(issues, "find", stale_scan)
+
+    result = asyncio.run(server.rebuild_resolution_metrics())
+
+    assert result["replayed"] == 2
+    docs = {doc["severity"]: doc for doc in fake_db.resolution_metrics.docs}
+    assert (docs["high"]["open"], docs["high"]["closed"], docs["high"]["buckets"]) == (1, 1, {"3": 1})
+    assert docs["low"]["open"] == 1
+
+
+def test_replay_skips_transitions_the_scan_already_saw():
+    closed = {**make_nc("closed", "2025-03-05T00:00:00+00:00"), "id": "nc-1", "updated_seq": 5}
+    before = {**make_nc(), "id": "nc-1", "updated_seq": 4}
+    entries = [
+        server.resolution_journal_entry(before, closed, None),
+        server.resolution_journal_entry(None, {**make_nc(), "id": "nc-2", "updated_seq": 6}, None),
+        server.resolution_journal_entry({**make_nc(), "id": "nc-2", "updated_seq": 6}, None, None),
+    ]
+    metrics = {}
+    server.add_resolution_contribution(metrics, closed)
+
+    # nc-1 was scanned after its close; nc-2 came and went without being scanned
+    assert server.replay_resolution_journal(metrics, {"nc-1": 5}, entries) == 2
+    doc, = metrics.values()
+    assert (doc["open"], doc["closed"], doc["open_by_day"]) == (0, 1, {"2025-03-01": 0})
+
+
+def test_histogram_percentiles_interpolate_within_buckets():
+    buckets = [0] * (len(server.RESOLUTION_BUCKET_DAYS) + 1)
+    buckets[0] = 2  # [0, 1] days
+    buckets[4] = 2  # (5, 7] days
+
+    assert server.histogram_percentile(buckets, 0.5) == 1.0
+    assert server.histogram_percentile(buckets, 0.75) == 6.0
+    assert server.histogram_percentile([0] * len(buckets), 0.5) is None
+    assert server.histogram_count_within(buckets, 6) == 3.0
+
+
+def test_parse_sla_days():
+    assert server.parse_sla_days("critical:2, high:7,") == {"critical": 2.0, "high": 7.0}
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import server
+
+from .fakes import FakeDB
+
+OFFICER = {"id": "officer-1", "role": "officer"}
+CONCURRENT_CALLERS = 25
+N_COOPS = 3
+
+
+@pytest.fixture
+def counting_db(monkeypatch):
+    coops = [{"id": f"coop-{i}", "name": f"Coop {i}"} for i in range(N_COOPS)]
+    # Latency keeps concurrent callers overlapping
+    db = FakeDB(
+        latency=0.01,
+        cooperatives=coops,
+        production_logs=[
+            {"cooperative_id": coop["id"], "total_production": 100.0, "post_harvest_loss_percent": 5.0,
+             "grade_a_percent": 80.0, "date": f"2025-01-0{d + 1}"}
+            for coop in coops for d in range(3)
+        ],
+        nonconformities=[{"cooperative_id": coop["id"], "status": "open"} for coop in coops],
+    )
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "single_flight", server.SingleFlight())
+    monkeypatch.setattr(server, "KPI_RESULT_TTL_SECONDS", 0.0)
+    return db
+
+
+def called(db):
+    return [(collection, method) for collection, method, _ in db.calls]
+
+
+def test_concurrent_overview_requests_share_one_set_of_queries(counting_db):
+    async def burst():
+        return await asyncio.gather(*(
+            server.get_overview_kpis(current_user=OFFICER) for _ in range(CONCURRENT_CALLERS)
+        ))
+
+    results = asyncio.run(burst())
+
+    assert called(counting_db).count(("cooperatives", "find")) == 1
+    assert called(counting_db).count(("production_logs", "find")) == N_COOPS
+    assert called(counting_db).count(("nonconformities", "count_documents")) == N_COOPS
+    assert all(result == results[0] for result in results)
+    assert results[0][0]["kpis"]["total_production_last_week"] == 300.0
+    assert server.single_flight.computed == 1 + N_COOPS
+    assert server.single_flight.coalesced == CONCURRENT_CALLERS - 1
+
+
+def test_concurrent_cooperative_kpis_share_one_computation(counting_db):
+    async def burst():
+        return await asyncio.gather(*(
+            server.get_cooperative_kpis("coop-0", current_user=OFFICER) for _ in range(CONCURRENT_CALLERS)
+        ))
+
+    results = asyncio.run(burst())
+
+    assert called(counting_db) == [("production_logs", "find"), ("nonconformities", "count_documents")]
+    assert all(result == results[0] for result in results)
+
+
+def test_sequential_requests_recompute_without_ttl(counting_db):
+    async def twice():
+        await server.get_cooperative_kpis("coop-0", current_user=OFFICER)
+        await server.get_cooperative_kpis("coop-0", current_user=OFFICER)
+
+    asyncio.run(twice())
+
+    assert called(counting_db).count(("production_logs", "find")) == 2
+
+
+def test_result_ttl_serves_later_requests(counting_db, monkeypatch):
+    monkeypatch.setattr(server, "KPI_RESULT_TTL_SECONDS", 60.0)
+
+    async def twice():
+        await server.get_cooperative_kpis("coop-0", current_user=OFFICER)
+        await server.get_cooperative_kpis("coop-0", current_user=OFFICER)
+        server.invalidate_cooperative_stats("coop-0")
+        await server.get_cooperative_kpis("coop-0", current_user=OFFICER)
+
+    asyncio.run(twice())
+
+    assert called(counting_db).count(("production_logs", "find")) == 2
+    assert server.single_flight.cached == 1
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    flight = server.SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def run():
+        results = await asyncio.gather(
+            *(flight.do(("key",), failing, ttl=60) for _ in range(5)), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        with pytest.raises(RuntimeError):
+            await flight.do(("key",), failing, ttl=60)
+
+    asyncio.run(run())
+
+    assert len(calls) == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    flight = server.SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(flight.do(("key",), slow))
+        second = asyncio.create_task(flight.do(("key",), slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "done"
+    assert flight.computed == 1
@@ -0,0 +1,38 @@
+import asyncio
+
+import server
+
+OFFICER = {"id": "officer-1", "role": "officer"}
+
+
+def make_log(log_id):
+    return server.ProductionLog(
+        id=log_id, cooperative_id="coop-1", date="2025-01-01T00:00:00+00:00", batch_period="Week 1",
+        total_production=100.0, grade_a_percent=70.0, grade_b_percent=30.0, post_harvest_loss_percent=5.0,
+        post_harvest_loss_kg=5.0, energy_use="Low", has_nonconformity=False,
+    )
+
+
+def test_upload_only_sync_acknowledges_hot_deleted_and_archived_ids(fake_db, monkeypatch):
+    fake_db.add("production_logs", [{"id": "hot"}])
+    fake_db.add("sync_tombstones", [{"collection": "production_logs", "id": "deleted"}])
+    fake_db.add("production_log_archive", [{"cooperative_id": "coop-1", "log_ids": ["archived", "other"]}])
+    created = []
+
+    async def create(log, current_user):
+        created.append(log.id)
+
+    monkeypatch.setattr(server, "create_production_log", create)
+    request = server.SyncRequest(
+        production_logs=[make_log(log_id) for log_id in ("hot", "deleted", "archived", "new")], download=False
+    )
+
+    response = asyncio.run(server.sync(request, current_user=OFFICER))
+
+    assert response == {"uploaded": {
+        "production_logs": {"created": ["new"], "existing": ["hot", "deleted", "archived"], "rejected": []},
+        "nonconformities": {"created": [], "existing": [], "rejected": []},
+    }}
+    assert created == ["new"]
+    # Upload-only: the sync counter (and with it the cursor) is left alone
+    assert not fake_db.queries(collection="counters")
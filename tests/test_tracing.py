@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+import server
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class CommandEvent:
+    def __init__(self, name, command, request_id, failure=None):
+        self.command_name = name
+        self.command = command
+        self.database_name = "dims"
+        self.request_id = request_id
+        self.connection_id = ("db.internal", 27017)
+        self.duration_micros = 2500
+        self.failure = failure
+
+
+def test_incoming_traceparent_is_continued_and_its_sampled_flag_honoured(monkeypatch):
+    monkeypatch.setattr(server, "TRACING_SAMPLE_RATE", 0.0)
+
+    root = server.start_trace("GET /api/x", TRACEPARENT, {})
+    assert (root.trace.trace_id, root.parent_id) == ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7")
+    assert server.start_trace("GET /api/x", TRACEPARENT[:-2] + "00", {}) is None
+    assert server.start_trace("GET /api/x", "garbage", {}) is None
+
+
+def test_spans_nest_and_export_root_last(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "TRACING_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(server, "TRACING_SAMPLE_RATE", 1.0)
+    tracer = server.MongoCommandTracer()
+
+    root = server.start_trace("POST /api/auth/login", None, {"http.method": "POST"})
+    with root:
+        with server.trace_span("bcrypt.verify") as bcrypt_span:
+            tracer.started(CommandEvent("find", {"find": "users"}, 1))
+            tracer.succeeded(CommandEvent("find", {"find": "users"}, 1))
+        tracer.started(CommandEvent("getMore", {"getMore": 7, "collection": "users"}, 2))
+        tracer.failed(CommandEvent("getMore", {}, 2, failure={"errmsg": "cursor killed"}))
+    server.export_trace(root)
+
+    spans = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    by_name = {span["name"]: span for span in spans}
+    assert spans[-1]["name"] == "POST /api/auth/login"
+    assert by_name["mongodb.find"]["parent_span_id"] == bcrypt_span.span_id
+    assert by_name["mongodb.find"]["duration_ms"] == 2.5
+    assert by_name["mongodb.find"]["attributes"]["db.mongodb.collection"] == "users"
+    assert by_name["mongodb.getMore"]["attributes"]["db.mongodb.collection"] == "users"
+    assert by_name["mongodb.getMore"]["status"] == {"code": "ERROR", "message": "cursor killed"}
+    assert by_name["bcrypt.verify"]["parent_span_id"] == root.span_id
+    assert server.current_span.get() is None
+
+
+def test_untraced_work_records_nothing():
+    tracer = server.MongoCommandTracer()
+    with server.trace_span("bcrypt.hash") as span:
+        tracer.started(CommandEvent("find", {"find": "users"}, 1))
+    assert span is None
+    assert tracer._in_flight == {}
+
+
+def test_span_cap_counts_dropped_spans(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "TRACING_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(server, "TRACING_MAX_SPANS", 2)
+
+    root = server.start_trace("GET /api/x", TRACEPARENT, {})
+    with root:
+        for _ in range(5):
+            with server.trace_span("pydantic.validate"):
+                pass
+    server.export_trace(root)
+
+    spans = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert len(spans) == 3
+    assert spans[-1]["attributes"]["dims.dropped_spans"] == 3
+
+
+@pytest.fixture(autouse=True)
+def no_leaked_span():
+    yield
+    assert server.current_span.get() is None
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from starlette.responses import Response
+
+import server
+
+OFFICER = {"id": "officer-1", "role": "officer"}
+
+
+def make_user(i, name):
+    email = f"user{i}@example.com"
+    return {"id": f"u{i:02d}", "email": email, "name": name, "role": "farmer",
+            "timestamp": "2025-01-01T00:00:00+00:00", **server.user_search_fields(email, name)}
+
+
+@pytest.fixture
+def directory(fake_db):
+    fake_db.add("users", [make_user(i, name) for i, name in enumerate(["bea", "Ama", "Kofi: Jr", "ama", "Yaw"])])
+    return fake_db
+
+
+def test_pages_follow_name_order_with_cursor_header(directory):
+    async def walk():
+        names, cursor = [], None
+        while True:
+            response = Response()
+            page = await server.get_users(response, cursor=cursor, limit=2, current_user=OFFICER)
+            names += [user["name"] for user in page]
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return names
+
+    assert asyncio.run(walk()) == ["Ama", "ama", "bea", "Kofi: Jr", "Yaw"]
+
+
+def test_prefix_search_uses_lowercased_fields(directory):
+    asyncio.run(server.get_users(Response(), q="Ko.fi", role="farmer", current_user=OFFICER))
+    asyncio.run(server.get_users(Response(), q="User1@Ex", current_user=OFFICER))
+
+    by_name, by_email = directory.queries("find")
+    # Names only, so the prefix is a range of the (role, name_lower, id) index the page is sorted on
+    assert by_name == {"$and": [{"role": "farmer"}, {"name_lower": {"$regex": r"^ko\.fi"}}]}
+    assert by_email == {"email_lower": {"$regex": "^user1@ex"}}
+
+
+def test_sparse_fields_keep_cursor_header(directory):
+    response = asyncio.run(server.get_users(Response(), limit=4, fields="name", current_user=OFFICER))
+
+    assert [user["name"] for user in json.loads(response.body)] == ["Ama", "ama", "bea", "Kofi: Jr"]
+    assert server.parse_user_cursor(response.headers["X-Next-Cursor"]) == ("kofi: jr", "u02")
+
+
+def test_directory_is_officer_only(directory):
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.get_users(Response(), current_user={"id": "m", "role": "manager"}))
+    assert exc.value.status_code == 403
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def make_nc(nc_id, severity, day, status="open"):
+    return {
+        "id": nc_id, "cooperative_id": "coop-1", "date": f"2025-03-{day:02d}T00:00:00+00:00",
+        "category": "quality", "severity": severity, "severity_rank": server.SEVERITY_RANKS[severity],
+        "description": "d", "corrective_action": "c", "status": status, "assigned_to": "qa@example.com",
+    }
+
+
+def test_keyset_pages_cover_queue_in_severity_then_age_order(fake_db):
+    docs = [
+        make_nc("a", "low", 1), make_nc("b", "critical", 9), make_nc("c", "high", 3), make_nc("d", "high", 3),
+        make_nc("e", "high", 2, status="in_progress"), make_nc("f", "critical", 1, status="closed"),
+    ]
+    fake_db.add("nonconformities", docs)
+
+    async def walk():
+        ids, cursor = [], None
+        while True:
+            page = await server.get_work_queue("qa@example.com", "open,in_progress", cursor, 2)
+            ids += [nc.id for nc in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids
+
+    assert asyncio.run(walk()) == ["b", "e", "c", "d", "a"]
+
+
+def test_cursor_round_trips_dates_with_colons():
+    assert server.parse_queue_cursor("4:2025-03-01T00:00:00+00:00:abc") == (4, "2025-03-01T00:00:00+00:00", "abc")
+    assert server.parse_queue_cursor(None) is None
+    with pytest.raises(HTTPException):
+        server.parse_queue_cursor("high:2025-03-01:abc")